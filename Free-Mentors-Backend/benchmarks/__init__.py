@@ -0,0 +1,129 @@
+"""
+Benchmarks for the GraphQL API.
+
+Each module is a script run from the backend directory, e.g.::
+
+    python -m benchmarks.async_view --mongomock
+
+By default they use the MongoDB configured in settings (a local mongod);
+``--mongomock`` swaps in an in-memory mongomock client instead.
+"""
+import functools
+import os
+import sys
+import threading
+from collections import Counter
+
+from pymongo import monitoring
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts Mongo commands by name, e.g. {'find': 3, 'update': 1}."""
+
+    def __init__(self):
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return Counter(self.counts)
+
+    def started(self, event):
+        self.count(event.command_name)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+commands = CommandCounter()
+
+# mongomock never talks to a server, so its collection methods are counted
+# under the name of the command pymongo would send for them
+MONGOMOCK_COMMANDS = {
+    'find': 'find',
+    'find_one': 'find',
+    'aggregate': 'aggregate',
+    'count_documents': 'count',
+    'estimated_document_count': 'count',
+    'insert_one': 'insert',
+    'insert_many': 'insert',
+    'update_one': 'update',
+    'update_many': 'update',
+    'replace_one': 'update',
+    'bulk_write': 'bulkWrite',
+    'find_one_and_update': 'findAndModify',
+    'delete_one': 'delete',
+    'delete_many': 'delete',
+}
+
+
+def _count_mongomock_commands():
+    from mongomock.collection import Collection
+
+    depth = threading.local()
+
+    def counted(name, method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            # Only the outermost call is a command; mongomock calls itself internally
+            outermost = not getattr(depth, 'value', 0)
+            if outermost:
+                commands.count(name)
+            depth.value = getattr(depth, 'value', 0) + 1
+            try:
+                return method(*args, **kwargs)
+            finally:
+                depth.value -= 1
+        return wrapper
+
+    for method_name, command_name in MONGOMOCK_COMMANDS.items():
+        setattr(Collection, method_name, counted(command_name, getattr(Collection, method_name)))
+
+
+def setup(mongomock=False):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mentor_app.settings')
+
+    # Listeners only apply to clients created afterwards; settings' clients are created lazily
+    monitoring.register(commands)
+
+    import django
+    django.setup()
+
+    if mongomock:
+        import mongoengine
+        import mongomock as mongomock_module
+        from django.conf import settings
+
+        from mentor_app.mongo import SECONDARY_ALIAS
+
+        # Separate mongomock clients don't share data, so read_only() falls back to the primary
+        mongoengine.disconnect(SECONDARY_ALIAS)
+        mongoengine.disconnect()
+        mongoengine.connect(
+            db=settings.MONGO_DB_NAME,
+            host='mongodb://localhost',
+            mongo_client_class=mongomock_module.MongoClient,
+        )
+        _count_mongomock_commands()
+
+
+def token_for(user):
+    # The same token tokenAuth issues, role claims included
+    from users.utils import issue_token
+
+    return issue_token(user)
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
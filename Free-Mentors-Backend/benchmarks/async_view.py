@@ -0,0 +1,103 @@
+"""
+Requests/sec of the sync /graphql/ view against the async /graphql/async/ view.
+
+Both run in-process: the sync view through Django's test Client from a pool
+of threads, the async view through AsyncClient on one event loop, with the
+same concurrency and a query whose top-level fields are independent.
+
+    python -m benchmarks.async_view --mentors 200 --requests 500 --concurrency 20
+"""
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks import setup, token_for
+
+QUERY = """
+{
+  me { id firstName }
+  mentors(first: 20) { edges { node { id firstName expertise } } }
+  allSessions(first: 20) { edges { node { id topic mentor { firstName } } } }
+}
+"""
+
+
+def seed(mentor_count):
+    from users.models import User
+    from mentorship.models import MentorshipSession
+
+    User.objects(email__startswith='bench-').delete()
+    admin = User(
+        first_name='Bench', last_name='Admin', email='bench-admin@example.com', address='-',
+        password='!', user_type='admin', is_staff=True,
+    ).save()
+    mentors = [
+        User(
+            first_name=f'Mentor{i}', last_name='Bench', email=f'bench-mentor{i}@example.com', address='-',
+            password='!', user_type='mentor', expertise='python',
+        )
+        for i in range(mentor_count)
+    ]
+    User.objects.insert(mentors)
+    MentorshipSession.objects.insert([
+        MentorshipSession(mentor=mentor, mentee=admin, topic=f'Topic {i}')
+        for i, mentor in enumerate(mentors)
+    ])
+    return admin
+
+
+def run_sync(body, token, total, concurrency):
+    from django.test import Client
+
+    def one(_):
+        response = Client().post(
+            '/graphql/', body, content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {token}'
+        )
+        assert response.status_code == 200, response.content
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    return total / (time.perf_counter() - started)
+
+
+async def run_async(body, token, total, concurrency):
+    from django.test import AsyncClient
+
+    client = AsyncClient()
+    remaining = iter(range(total))
+
+    async def worker():
+        for _ in remaining:
+            response = await client.post(
+                '/graphql/async/', body, content_type='application/json', authorization=f'Bearer {token}'
+            )
+            assert response.status_code == 200, response.content
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return total / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mentors', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--mongomock', action='store_true', help='use an in-memory mongomock client')
+    args = parser.parse_args()
+
+    setup(mongomock=args.mongomock)
+    token = token_for(seed(args.mentors))
+    body = json.dumps({'query': QUERY})
+
+    sync_rps = run_sync(body, token, args.requests, args.concurrency)
+    async_rps = asyncio.run(run_async(body, token, args.requests, args.concurrency))
+    print(f'sync  /graphql/        {sync_rps:8.1f} req/s')
+    print(f'async /graphql/async/  {async_rps:8.1f} req/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+"""
+Encode time and bytes on the wire of one large allSessions response.
+
+Seeds --sessions sessions, fetches them as one `allSessions(first: N)` page
+through /graphql/, and then measures, on that response:
+
+  * encoding it with graphene-django's json.dumps (before), the stdlib
+    encoder and orjson (mentor_app.encoding)
+  * its size and compression time as identity, gzip and brotli
+  * the whole request through Django's test Client, before (stdlib, no
+    compression) and after (GRAPHQL_JSON_ENCODER=auto, compression on)
+
+    python -m benchmarks.encoding --mongomock
+    MONGO_DB_NAME=free_mentors_bench python -m benchmarks.encoding --sessions 10000
+
+Seeding drops the users and sessions collections, so against a real mongod
+the database name must contain "bench".
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from benchmarks import setup, token_for
+
+QUERY = '''
+query($first: Int!) {
+  allSessions(first: $first) {
+    edges { node { id topic questions status createdAt mentor { id firstName lastName } mentee { id firstName lastName } } }
+  }
+}
+'''
+
+
+def seed(session_count, user_count, rng):
+    from bson import ObjectId
+    from mentorship.models import MentorshipSession
+    from users.models import User
+
+    users, sessions = User._get_collection(), MentorshipSession._get_collection()
+    users.drop()
+    sessions.drop()
+    people = [
+        {
+            '_id': ObjectId(),
+            'first_name': f'Bench{i}',
+            'last_name': 'Ünïcode' if i % 7 == 0 else 'User',
+            'email': f'encoding{i}@bench.example',
+            'password': '-',
+            'address': '-',
+            'user_type': 'mentor' if i % 4 == 0 else 'mentee',
+            'is_staff': i == 0,
+        }
+        for i in range(user_count)
+    ]
+    users.insert_many(people)
+    mentors = [person['_id'] for person in people if person['user_type'] == 'mentor']
+    mentees = [person['_id'] for person in people if person['user_type'] == 'mentee']
+    started = datetime.utcnow()
+    sessions.insert_many([
+        {
+            'mentor': rng.choice(mentors),
+            'mentee': rng.choice(mentees),
+            'topic': f'Session topic {i % 50}',
+            'questions': 'How do I get better at system design and code review? ' * rng.randint(1, 3),
+            'status': rng.choice(['pending', 'approved', 'declined', 'completed']),
+            'created_at': started - timedelta(minutes=i),
+            'updated_at': started,
+        }
+        for i in range(session_count)
+    ])
+    return User._from_son(people[0])
+
+
+def timed(function, repeat):
+    # Median seconds of `repeat` calls, and the last result
+    samples, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), result
+
+
+def configure(encoder, compression):
+    from django.conf import settings
+    from mentor_app import encoding
+
+    settings.GRAPHQL_JSON_ENCODER = encoder
+    settings.RESPONSE_COMPRESSION = dict(settings.RESPONSE_COMPRESSION, ENABLED=compression)
+    encoding._encoder = None
+
+
+def request(client, token, sessions, accept_encoding):
+    return client.post(
+        '/graphql/',
+        json.dumps({'query': QUERY, 'variables': {'first': sessions}}),
+        content_type='application/json',
+        HTTP_AUTHORIZATION=f'Bearer {token}',
+        HTTP_ACCEPT_ENCODING=accept_encoding,
+    )
+
+
+def run(args):
+    from django.conf import settings
+    from django.test import Client
+    from mentor_app import compression, encoding
+
+    staff = seed(args.sessions, args.users, random.Random(args.seed))
+    token = token_for(staff)
+    settings.GRAPHQL_MAX_PAGE_SIZE = args.sessions
+    settings.GRAPHQL_COST = dict(settings.GRAPHQL_COST, MAX_COST=10 ** 9)
+    client = Client()
+
+    configure('json', False)
+    response = request(client, token, args.sessions, '')
+    payload = json.loads(response.content)
+    if 'errors' in payload:
+        raise RuntimeError(f"allSessions failed: {payload['errors']}")
+    rows = len(payload['data']['allSessions']['edges'])
+
+    encoders = {'graphene_json': lambda: json.dumps(payload, separators=(",", ":")).encode('utf-8')}
+    encoders['json'] = lambda: encoding.StdlibEncoder().dumps(payload)
+    if encoding.orjson is not None:
+        encoders['orjson'] = lambda: encoding.OrjsonEncoder().dumps(payload)
+    encode = {}
+    for name, function in encoders.items():
+        seconds, body = timed(function, args.repeat)
+        encode[name] = {'ms': round(seconds * 1000, 2), 'bytes': len(body)}
+
+    body = encoders['orjson' if 'orjson' in encoders else 'json']()
+    options = compression.compression_settings()
+    wire = {'identity': {'ms': 0, 'bytes': len(body)}}
+    for coding in compression.available_encodings():
+        seconds, compressed = timed(lambda: compression.compress(coding, body, options), args.repeat)
+        wire[coding] = {'ms': round(seconds * 1000, 2), 'bytes': len(compressed)}
+
+    end_to_end = {}
+    for name, encoder, compress, accept in (
+        ('before', 'json', False, ''),
+        ('after_gzip', 'auto', True, 'gzip'),
+        ('after_br', 'auto', True, 'br, gzip'),
+    ):
+        configure(encoder, compress)
+        seconds, response = timed(lambda: request(client, token, args.sessions, accept), args.requests)
+        end_to_end[name] = {
+            'ms': round(seconds * 1000, 1),
+            'bytes': len(response.content),
+            'content_encoding': response.get('Content-Encoding', 'identity'),
+        }
+
+    return {'rows': rows, 'encode': encode, 'wire': wire, 'request': end_to_end}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=10000)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=20, help='timed encodes and compressions of each kind')
+    parser.add_argument('--requests', type=int, default=5, help='timed requests of each kind')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--mongomock', action='store_true', help='use an in-memory mongomock client')
+    parser.add_argument('--output', default='benchmark-results-encoding.json')
+    args = parser.parse_args()
+
+    setup(mongomock=args.mongomock)
+    from django.conf import settings
+
+    if not args.mongomock and 'bench' not in settings.MONGO_DB_NAME:
+        parser.error(f'refusing to drop collections in {settings.MONGO_DB_NAME!r}; set MONGO_DB_NAME to a *bench* database')
+
+    results = {
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'backend': 'mongomock' if args.mongomock else 'mongod',
+        'config': vars(args),
+        **run(args),
+    }
+    with open(args.output, 'w') as output:
+        json.dump(results, output, indent=2)
+
+    print(f"allSessions response with {results['rows']} rows")
+    for name, entry in results['encode'].items():
+        print(f"  encode {name:<14} {entry['ms']:>8} ms  {entry['bytes']:>10} bytes")
+    for name, entry in results['wire'].items():
+        print(f"  wire   {name:<14} {entry['ms']:>8} ms  {entry['bytes']:>10} bytes")
+    for name, entry in results['request'].items():
+        print(f"  request {name:<13} {entry['ms']:>8} ms  {entry['bytes']:>10} bytes ({entry['content_encoding']})")
+    print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,360 @@
+"""
+Load and latency benchmark for /graphql/ with a fixed mix of operations.
+
+Seeds users, sessions and reviews at the given volumes, then replays the same
+pseudo-random sequence of operations through Django's test Client (threads)
+and through the in-process ASGI client (AsyncClient). Reports throughput,
+p50/p95/p99 latency and the Mongo commands one request of each operation
+sends, and writes everything to JSON so runs can be compared across commits.
+
+    MONGO_DB_NAME=free_mentors_bench python -m benchmarks.load \\
+        --users 100000 --sessions 1000000 --reviews 300000 --output before.json
+    python -m benchmarks.load --mongomock --users 2000 --sessions 10000 --reviews 3000
+
+Seeding drops the users, sessions and reviews collections, so against a real
+mongod the database name must contain "bench". --reuse skips seeding.
+"""
+import argparse
+import asyncio
+import io
+import json
+import random
+import subprocess
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from benchmarks import commands, percentile, setup, token_for
+
+PASSWORD = 'bench-password'
+
+# Share of each operation in the mix
+MIX = {
+    'login': 5,
+    'mentors': 35,
+    'userSessions': 20,
+    'mentorReviews': 25,
+    'createSession': 10,
+    'createReview': 5,
+}
+
+QUERIES = {
+    'login': 'mutation($email: String!, $password: String!) { tokenAuth(email: $email, password: $password) { token } }',
+    'mentors': '{ mentors(first: 20) { edges { node { id firstName lastName expertise averageRating } } } }',
+    'userSessions': '{ userSessions { id topic status mentor { firstName } mentee { firstName } } }',
+    'mentorReviews': 'query($mentorId: String!) { mentorReviews(mentorId: $mentorId) { id rating content } }',
+    'createSession': (
+        'mutation($mentorId: ID!) { createSession(mentorId: $mentorId, topic: "Bench", questions: "?") '
+        '{ session { id } } }'
+    ),
+    'createReview': (
+        'mutation($sessionId: String!) { createReview(sessionId: $sessionId, rating: 4, content: "Bench") '
+        '{ review { id } } }'
+    ),
+}
+
+BATCH = 10000
+
+
+def _batches(documents):
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) == BATCH:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def seed(rng, user_count, session_count, review_count, mentor_share):
+    """
+    Inserts the documents with raw bulk inserts. A quarter of the completed
+    sessions are left without a review so createReview has something to review.
+    """
+    from django.core.management import call_command
+    from bson import ObjectId
+    from mentorship.models import MentorshipSession
+    from reviews.models import Review
+    from users import hashing
+    from users.models import User
+
+    for document in (User, MentorshipSession, Review):
+        document.drop_collection()
+
+    # One real hash shared by everyone, so login does a genuine bcrypt check
+    password = hashing.hash_password(PASSWORD)
+    now = datetime.utcnow()
+    mentor_count = max(1, int(user_count * mentor_share))
+    user_ids = [ObjectId() for _ in range(user_count)]
+    mentor_ids, mentee_ids = user_ids[:mentor_count], user_ids[mentor_count:] or user_ids[:1]
+
+    users = User._get_collection()
+    for batch in _batches(
+        {
+            '_id': user_id,
+            'first_name': f'User{i}',
+            'last_name': 'Bench',
+            'email': f'bench-user{i}@example.com',
+            'password': password,
+            'address': '-',
+            'bio': rng.choice(['Backend engineer', 'Designer and illustrator', 'Data scientist', '']),
+            'occupation': rng.choice(['Engineer', 'Designer', 'Analyst']),
+            'expertise': rng.choice(['python', 'react', 'mongodb', 'design', 'machine learning']),
+            'user_type': 'mentor' if i < mentor_count else 'mentee',
+            'is_staff': False,
+        }
+        for i, user_id in enumerate(user_ids)
+    ):
+        users.insert_many(batch, ordered=False)
+
+    # Enough completed sessions for every review plus some left to review
+    completed_share = min(1.0, review_count * 4 / 3 / session_count) if session_count else 0
+    sessions = []
+    for i in range(session_count):
+        created = now - timedelta(minutes=i)
+        sessions.append({
+            '_id': ObjectId(),
+            'mentor': rng.choice(mentor_ids),
+            'mentee': rng.choice(mentee_ids),
+            'topic': f'Topic {i}',
+            'questions': '?',
+            'status': 'completed' if rng.random() < completed_share else rng.choice(['pending', 'approved', 'declined']),
+            'created_at': created,
+            'updated_at': created,
+        })
+    for batch in _batches(sessions):
+        MentorshipSession._get_collection().insert_many(batch, ordered=False)
+
+    completed = [session for session in sessions if session['status'] == 'completed']
+    for batch in _batches(
+        {
+            'session': session['_id'],
+            'rating': rng.randint(1, 5),
+            'content': 'Bench review',
+            'is_visible': rng.random() < 0.95,
+            'created_at': session['created_at'],
+            'updated_at': session['created_at'],
+        }
+        for session in completed[:review_count]
+    ):
+        Review._get_collection().insert_many(batch, ordered=False)
+
+    call_command('ensure_indexes', stdout=io.StringIO())
+    call_command('rebuild_rating_summaries', stdout=io.StringIO())
+
+
+def load_population(sample_size):
+    """Users the operations run as, sampled from an already seeded database."""
+    from mentorship.models import MentorshipSession
+    from reviews.models import Review
+    from users.models import User
+
+    # The first users in _id order, so reruns against the same data pick the same people
+    users = User._get_collection()
+    mentors = list(users.find({'user_type': 'mentor'}, {'email': True}).sort('_id', 1).limit(sample_size))
+    mentees = list(users.find({'user_type': 'mentee'}, {'email': True}).sort('_id', 1).limit(sample_size))
+
+    # Completed sessions nobody has reviewed yet
+    reviewed = Review._get_collection().distinct('session')
+    reviewable = [
+        (session['mentee'], session['_id'])
+        for session in MentorshipSession._get_collection().find(
+            {'status': 'completed', '_id': {'$nin': reviewed}}, {'mentee': True}
+        ).sort('_id', 1).limit(sample_size * 10)
+    ]
+    return mentors, mentees, reviewable
+
+
+def build_requests(rng, count, mentors, mentees, reviewable):
+    """The operation sequence, as (operation, body, authorization) triples."""
+    from users.models import User
+
+    tokens = {}
+
+    def authorization(user_id):
+        if user_id not in tokens:
+            tokens[user_id] = f'Bearer {token_for(User(id=user_id))}'
+        return tokens[user_id]
+
+    names, weights = zip(*MIX.items())
+    reviewable = list(reviewable)
+    rng.shuffle(reviewable)
+    requests = []
+    while len(requests) < count:
+        name = rng.choices(names, weights)[0]
+        mentor, mentee = rng.choice(mentors), rng.choice(mentees)
+        variables, user_id = {}, mentee['_id']
+        if name == 'login':
+            variables, user_id = {'email': mentee['email'], 'password': PASSWORD}, None
+        elif name == 'mentorReviews':
+            variables = {'mentorId': str(mentor['_id'])}
+        elif name == 'createSession':
+            variables = {'mentorId': str(mentor['_id'])}
+        elif name == 'createReview':
+            if not reviewable:
+                continue
+            user_id, session_id = reviewable.pop()
+            variables = {'sessionId': str(session_id)}
+        body = json.dumps({'query': QUERIES[name], 'variables': variables})
+        requests.append((name, body, authorization(user_id) if user_id else None))
+    return requests
+
+
+def _check(status_code, content):
+    if status_code != 200:
+        return False
+    payload = json.loads(content)
+    return not payload.get('errors')
+
+
+def run_django(requests, path, concurrency):
+    from django.test import Client
+
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+
+    def one(request):
+        name, body, authorization = request
+        headers = {'HTTP_AUTHORIZATION': authorization} if authorization else {}
+        started = time.perf_counter()
+        response = Client().post(path, body, content_type='application/json', **headers)
+        elapsed = time.perf_counter() - started
+        return name, elapsed, _check(response.status_code, response.content)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for name, elapsed, ok in pool.map(one, requests):
+            samples[name].append(elapsed)
+            errors[name] += not ok
+    return summarize(samples, errors, time.perf_counter() - started)
+
+
+async def run_asgi(requests, path, concurrency):
+    from django.test import AsyncClient
+
+    client = AsyncClient()
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+    remaining = iter(requests)
+
+    async def worker():
+        for name, body, authorization in remaining:
+            headers = {'authorization': authorization} if authorization else {}
+            started = time.perf_counter()
+            response = await client.post(path, body, content_type='application/json', **headers)
+            samples[name].append(time.perf_counter() - started)
+            errors[name] += not _check(response.status_code, response.content)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(samples, errors, time.perf_counter() - started)
+
+
+def summarize(samples, errors, elapsed):
+    total = sum(len(values) for values in samples.values())
+    return {
+        'requests': total,
+        'seconds': round(elapsed, 3),
+        'throughput': round(total / elapsed, 1) if elapsed else 0.0,
+        'operations': {
+            name: {
+                'count': len(values),
+                'errors': errors[name],
+                'p50_ms': round(percentile(values, 0.50) * 1000, 2),
+                'p95_ms': round(percentile(values, 0.95) * 1000, 2),
+                'p99_ms': round(percentile(values, 0.99) * 1000, 2),
+            }
+            for name, values in sorted(samples.items())
+        },
+    }
+
+
+def command_counts(requests, path):
+    """Mongo commands sent by one request of each operation, run one at a time."""
+    from django.test import Client
+
+    counts = {}
+    for name, body, authorization in requests:
+        if name in counts:
+            continue
+        headers = {'HTTP_AUTHORIZATION': authorization} if authorization else {}
+        before = commands.snapshot()
+        Client().post(path, body, content_type='application/json', **headers)
+        counts[name] = dict(commands.snapshot() - before)
+    return counts
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--sessions', type=int, default=100000)
+    parser.add_argument('--reviews', type=int, default=30000)
+    parser.add_argument('--mentor-share', type=float, default=0.1)
+    parser.add_argument('--requests', type=int, default=2000, help='requests per client')
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--path', default='/graphql/')
+    parser.add_argument('--seed', type=int, default=42, help='random seed for data and the operation sequence')
+    parser.add_argument('--reuse', action='store_true', help='keep the already seeded data')
+    parser.add_argument('--mongomock', action='store_true', help='use an in-memory mongomock client')
+    parser.add_argument('--output', default='benchmark-results.json')
+    args = parser.parse_args()
+
+    setup(mongomock=args.mongomock)
+    from django.conf import settings
+
+    if not args.reuse and not args.mongomock and 'bench' not in settings.MONGO_DB_NAME:
+        parser.error(f'refusing to drop collections in {settings.MONGO_DB_NAME!r}; set MONGO_DB_NAME to a *bench* database')
+    if args.reuse and args.mongomock:
+        parser.error('--reuse needs a real mongod, mongomock starts empty')
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    if not args.reuse:
+        seed(rng, args.users, args.sessions, args.reviews, args.mentor_share)
+    seed_seconds = time.perf_counter() - started
+
+    mentors, mentees, reviewable = load_population(sample_size=1000)
+    # Every run gets its own reviewable sessions so no review is created twice
+    probe_requests = build_requests(rng, 200, mentors, mentees, reviewable[0::3])
+    django_requests = build_requests(rng, args.requests, mentors, mentees, reviewable[1::3])
+    asgi_requests = build_requests(rng, args.requests, mentors, mentees, reviewable[2::3])
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'backend': 'mongomock' if args.mongomock else 'mongod',
+        'config': vars(args),
+        'seed_seconds': round(seed_seconds, 1),
+        'mix': MIX,
+        'mongo_commands': command_counts(probe_requests, args.path),
+        'django': run_django(django_requests, args.path, args.concurrency),
+        'asgi': asyncio.run(run_asgi(asgi_requests, args.path, args.concurrency)),
+    }
+
+    with open(args.output, 'w') as output:
+        json.dump(results, output, indent=2, default=str)
+
+    for client in ('django', 'asgi'):
+        print(f"{client}: {results[client]['throughput']} req/s")
+        for name, stats in results[client]['operations'].items():
+            print(
+                f"  {name:<14} n={stats['count']:<6} err={stats['errors']:<4} "
+                f"p50={stats['p50_ms']:>8}ms p95={stats['p95_ms']:>8}ms p99={stats['p99_ms']:>8}ms"
+            )
+    print(f'Mongo commands per request: {json.dumps(results["mongo_commands"])}')
+    print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+Build time, memory and query latency of the recommendedMentors index.
+
+Builds users.recommend.MentorIndex over --mentors synthetic mentor profiles
+(words drawn from a Zipf-like vocabulary, so a few terms are in most profiles
+and most terms in few), then times --queries rankings of synthetic mentee
+profiles with session topics, and --updates single mentor updates as
+UpdateUser makes them. Everything runs in memory; Mongo is not used.
+
+    python -m benchmarks.recommend --mentors 100000
+"""
+import argparse
+import itertools
+import json
+import random
+import time
+from datetime import datetime
+
+from benchmarks import percentile, setup
+
+TOPICS = (
+    'python django react typescript data science machine learning cloud devops kubernetes security '
+    'design product management leadership career interviews startups marketing finance writing'
+).split()
+
+
+class Profiles:
+    def __init__(self, vocabulary, seed):
+        self.random = random.Random(seed)
+        self.words = TOPICS + [f'word{i}' for i in range(vocabulary)]
+        # Zipf-like: the n-th word is drawn with weight 1/n
+        self.cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(self.words) + 1)))
+
+    def text(self, length):
+        return ' '.join(self.random.choices(self.words, cum_weights=self.cum_weights, k=length))
+
+    def mentor(self):
+        from bson import ObjectId
+
+        return {
+            '_id': ObjectId(),
+            'expertise': self.text(3),
+            'occupation': self.text(2),
+            'bio': self.text(self.random.randint(10, 40)),
+        }
+
+    def mentee_query(self, sessions):
+        from users.recommend import mentor_fields
+
+        fields = mentor_fields({'expertise': self.text(3), 'occupation': self.text(2), 'bio': self.text(20)})
+        for _ in range(sessions):
+            fields.append((self.text(4), 2))
+            fields.append((self.text(15), 1))
+        return fields
+
+
+def index_bytes(index):
+    state = index._state
+    arrays = [*state['main'], *state['tail'], state['live'], state['df'], state['row_terms'], state['row_starts']]
+    return sum(array.nbytes for array in arrays)
+
+
+def run(args):
+    from users.recommend import MentorIndex
+
+    profiles = Profiles(args.vocabulary, args.seed)
+    mentors = [profiles.mentor() for _ in range(args.mentors)]
+    batches = [mentors[i:i + args.batch_size] for i in range(0, len(mentors), args.batch_size)]
+
+    started = time.perf_counter()
+    index = MentorIndex.build(batches, features=args.features, max_query_terms=args.max_query_terms)
+    build_seconds = time.perf_counter() - started
+
+    queries = [profiles.mentee_query(args.sessions) for _ in range(args.queries)]
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        index.search(query, args.first)
+        latencies.append(time.perf_counter() - started)
+
+    update_latencies = []
+    for _ in range(args.updates):
+        mentor = dict(profiles.random.choice(mentors), bio=profiles.text(20))
+        started = time.perf_counter()
+        index.upsert([mentor])
+        update_latencies.append(time.perf_counter() - started)
+
+    # Queries again, now that the changed mentors sit in the unsorted tail
+    tail_latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        index.search(query, args.first)
+        tail_latencies.append(time.perf_counter() - started)
+
+    def summary(samples):
+        return {
+            'p50_ms': round(percentile(samples, 0.5) * 1000, 3),
+            'p99_ms': round(percentile(samples, 0.99) * 1000, 3),
+            'max_ms': round(max(samples) * 1000, 3) if samples else 0,
+        }
+
+    return {
+        'mentors': len(index),
+        'entries': int(len(index._state['main'][0]) + len(index._state['tail'][0])),
+        'build_seconds': round(build_seconds, 2),
+        'index_mb': round(index_bytes(index) / 2 ** 20, 1),
+        'query': summary(latencies),
+        'update': summary(update_latencies),
+        'query_after_updates': summary(tail_latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mentors', type=int, default=100000)
+    parser.add_argument('--vocabulary', type=int, default=20000, help='distinct synthetic words')
+    parser.add_argument('--features', type=int, default=2 ** 18, help='hash buckets, a power of two')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--sessions', type=int, default=10, help='past sessions per mentee query')
+    parser.add_argument('--max-query-terms', type=int, default=32)
+    parser.add_argument('--first', type=int, default=20)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--updates', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark-results-recommend.json')
+    args = parser.parse_args()
+
+    setup()
+    results = {
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'config': vars(args),
+        **run(args),
+    }
+    with open(args.output, 'w') as output:
+        json.dump(results, output, indent=2)
+
+    print(
+        f"{results['mentors']} mentors ({results['entries']} entries) indexed in {results['build_seconds']}s, "
+        f"{results['index_mb']} MB"
+    )
+    for name in ('query', 'update', 'query_after_updates'):
+        timing = results[name]
+        print(f"{name}: p50={timing['p50_ms']}ms p99={timing['p99_ms']}ms max={timing['max_ms']}ms")
+    print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+"""
+How many idle sessionUpdated subscribers one worker can hold.
+
+Opens --subscribers WebSocket connections against the ASGI application
+in-process (no sockets, so this measures the server's own cost per connection:
+memory and event loop work, not the kernel's), each authenticated as one of
+--users users and subscribed to sessionUpdated. Then reports the memory held
+per subscriber and how long one session change takes to reach its mentee's
+subscribers and, through the staff channel, --staff staff subscribers.
+
+    python -m benchmarks.subscriptions --mongomock --subscribers 10000
+    MONGO_DB_NAME=free_mentors_bench python -m benchmarks.subscriptions --subscribers 50000
+
+Against a real mongod the users collection is dropped, so the database name
+must contain "bench".
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+
+from benchmarks import percentile, setup, token_for
+
+SUBSCRIPTION = 'subscription { sessionUpdated { id status } }'
+
+
+def rss_bytes():
+    # Current resident set size; falls back to the peak where /proc is missing
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Client:
+    """One WebSocket connection driven through the ASGI interface."""
+
+    def __init__(self, application):
+        self.incoming = asyncio.Queue()
+        self.received = asyncio.Queue()
+        scope = {'type': 'websocket', 'path': '/graphql/', 'subprotocols': ['graphql-transport-ws']}
+        self.task = asyncio.ensure_future(application(scope, self.incoming.get, self.received.put))
+        self.incoming.put_nowait({'type': 'websocket.connect'})
+
+    def send(self, message):
+        self.incoming.put_nowait({'type': 'websocket.receive', 'text': json.dumps(message)})
+
+    async def receive(self):
+        event = await self.received.get()
+        if event['type'] != 'websocket.send':
+            return event
+        return json.loads(event['text'])
+
+    async def subscribe(self, token):
+        accepted = await self.receive()
+        if accepted['type'] != 'websocket.accept':
+            raise RuntimeError(f'connection refused: {accepted}')
+        self.send({'type': 'connection_init', 'payload': {'Authorization': f'Bearer {token}'}})
+        ack = await self.receive()
+        if ack.get('type') != 'connection_ack':
+            raise RuntimeError(f'connection_init failed: {ack}')
+        self.send({'type': 'subscribe', 'id': '1', 'payload': {'query': SUBSCRIPTION}})
+
+    def close(self):
+        self.incoming.put_nowait({'type': 'websocket.disconnect', 'code': 1000})
+
+
+def seed_users(count, staff):
+    from bson import ObjectId
+    from users.models import User
+
+    collection = User._get_collection()
+    collection.drop()
+    users = [
+        {
+            '_id': ObjectId(),
+            'first_name': 'Bench',
+            'last_name': str(i),
+            'email': f'subscriber{i}@bench.example',
+            'password': '-',
+            'address': '-',
+            'user_type': 'admin' if i < staff else 'mentee',
+            'is_staff': i < staff,
+        }
+        for i in range(count)
+    ]
+    collection.insert_many(users)
+    return [User._from_son(user) for user in users]
+
+
+async def wait_for_subscribers(expected, timeout=60):
+    from mentor_app.pubsub import get_broker
+
+    deadline = time.monotonic() + timeout
+    while get_broker().subscriber_count() < expected:
+        if time.monotonic() > deadline:
+            raise RuntimeError(f'only {get_broker().subscriber_count()} of {expected} subscribed')
+        await asyncio.sleep(0.05)
+
+
+async def deliver(clients, document, expected):
+    """Seconds from publishing `document` until each of `expected` clients got it."""
+    from mentor_app import pubsub
+
+    started = time.perf_counter()
+    pubsub.publish('mentorship_sessions', [document])
+
+    async def first_event(client):
+        message = await client.receive()
+        if message.get('type') != 'next':
+            raise RuntimeError(f'unexpected message {message}')
+        return time.perf_counter() - started
+
+    return await asyncio.gather(*(first_event(clients[index]) for index in expected))
+
+
+async def run(args, users):
+    from bson import ObjectId
+    from mentor_app.asgi import application
+
+    tokens = [token_for(user) for user in users]
+    baseline = rss_bytes()
+    started = time.perf_counter()
+
+    clients = []
+    for i in range(args.subscribers):
+        client = Client(application)
+        clients.append(client)
+        await client.subscribe(tokens[i % len(tokens)])
+    await wait_for_subscribers(args.subscribers)
+    setup_seconds = time.perf_counter() - started
+    held = rss_bytes() - baseline
+
+    # Let the loop go idle, then see how much CPU the idle subscribers cost
+    await asyncio.sleep(1)
+    cpu_started = time.process_time()
+    await asyncio.sleep(args.idle_seconds)
+    idle_cpu = (time.process_time() - cpu_started) / args.idle_seconds
+
+    # One user's session changing reaches that user's connections and every staff connection
+    mentee = users[args.staff % len(users)]
+    targets = [i for i in range(args.subscribers) if users[i % len(users)].id == mentee.id or i % len(users) < args.staff]
+    latencies = []
+    for _ in range(args.events):
+        document = {'_id': ObjectId(), 'mentor': ObjectId(), 'mentee': mentee.id, 'topic': 'Bench', 'status': 'approved'}
+        latencies.extend(await deliver(clients, document, targets))
+
+    for client in clients:
+        client.close()
+    await asyncio.gather(*(client.task for client in clients), return_exceptions=True)
+
+    return {
+        'subscribers': args.subscribers,
+        'setup_seconds': round(setup_seconds, 2),
+        'rss_held_mb': round(held / 2 ** 20, 1),
+        'rss_per_subscriber_kb': round(held / args.subscribers / 1024, 2),
+        'idle_cpu_share': round(idle_cpu, 4),
+        'delivery': {
+            'recipients_per_event': len(targets),
+            'events': args.events,
+            'p50_ms': round(percentile(latencies, 0.5) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+            'max_ms': round(max(latencies) * 1000, 2) if latencies else 0,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--subscribers', type=int, default=10000)
+    parser.add_argument('--users', type=int, default=1000, help='distinct users the subscribers log in as')
+    parser.add_argument('--staff', type=int, default=10, help='how many of those users are staff')
+    parser.add_argument('--events', type=int, default=20, help='session changes to deliver')
+    parser.add_argument('--idle-seconds', type=float, default=5)
+    parser.add_argument('--mongomock', action='store_true', help='use an in-memory mongomock client')
+    parser.add_argument('--output', default='benchmark-results-subscriptions.json')
+    args = parser.parse_args()
+
+    setup(mongomock=args.mongomock)
+    from django.conf import settings
+
+    if not args.mongomock and 'bench' not in settings.MONGO_DB_NAME:
+        parser.error(f'refusing to drop users in {settings.MONGO_DB_NAME!r}; set MONGO_DB_NAME to a *bench* database')
+    if settings.SUBSCRIPTIONS.get('BROKER', 'local') != 'local':
+        parser.error('run with SUBSCRIPTIONS_BROKER=local; the benchmark publishes in-process')
+    if args.subscribers > settings.SUBSCRIPTIONS['MAX_CONNECTIONS']:
+        settings.SUBSCRIPTIONS['MAX_CONNECTIONS'] = args.subscribers
+
+    users = seed_users(args.users, args.staff)
+    results = {
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+        'backend': 'mongomock' if args.mongomock else 'mongod',
+        'config': vars(args),
+        **asyncio.run(run(args, users)),
+    }
+    with open(args.output, 'w') as output:
+        json.dump(results, output, indent=2)
+
+    print(
+        f"{results['subscribers']} subscribers in {results['setup_seconds']}s, "
+        f"{results['rss_held_mb']} MB ({results['rss_per_subscriber_kb']} KB each), "
+        f"idle CPU {results['idle_cpu_share']:.1%}"
+    )
+    delivery = results['delivery']
+    print(
+        f"one change -> {delivery['recipients_per_event']} subscribers: "
+        f"p50={delivery['p50_ms']}ms p99={delivery['p99_ms']}ms max={delivery['max_ms']}ms"
+    )
+    print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
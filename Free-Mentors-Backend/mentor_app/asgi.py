@@ -2,6 +2,14 @@
 ASGI config for mentor_app project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP goes to Django; WebSocket connections to /graphql/ carry GraphQL
+subscriptions (mentor_app/subscriptions.py).
+
+Django 3.2's ASGI handler iterates streaming responses on the event loop, so
+the blocking Mongo cursor behind an export (/export/...) would stall every
+other connection of the worker for as long as the export runs.
+StreamingASGIHandler reads those bodies in a worker thread instead, a chunk
+at a time, so exports still stream with flat memory.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -9,8 +17,63 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mentor_app.settings')
 
-application = get_asgi_application()
+
+def _read_chunk(parts, size):
+    # The next parts of a streaming body joined up to about `size` bytes, b'' at the end
+    chunk = bytearray()
+    for part in parts:
+        chunk += part
+        if len(chunk) >= size:
+            break
+    return bytes(chunk)
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """ASGIHandler that reads streaming response bodies off the event loop."""
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+
+        # Django still sends the headers and the closing message and closes the
+        # response; the body goes out right before that closing message
+        parts = iter(response)
+        response.streaming_content = ()
+
+        async def send_body(message):
+            if message['type'] == 'http.response.body' and not message.get('more_body'):
+                read = sync_to_async(_read_chunk, thread_sensitive=False)
+                while True:
+                    chunk = await read(parts, self.chunk_size)
+                    if not chunk:
+                        break
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send(message)
+
+        await super().send_response(response, send_body)
+
+
+django.setup(set_prefix=False)
+django_application = StreamingASGIHandler()
+
+# Imported after Django is set up, the schema needs the apps loaded
+from mentor_app.subscriptions import GraphQLWebSocketApp  # noqa: E402
+
+websocket_application = GraphQLWebSocketApp()
+
+WEBSOCKET_PATHS = ('/graphql/', '/graphql')
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        if scope['path'] in WEBSOCKET_PATHS:
+            return await websocket_application(scope, receive, send)
+        await receive()  # websocket.connect
+        return await send({'type': 'websocket.close', 'code': 1000})
+    return await django_application(scope, receive, send)
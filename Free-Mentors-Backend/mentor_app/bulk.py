@@ -0,0 +1,68 @@
+# mentor_app/bulk.py
+import graphene
+from bson import ObjectId
+from bson.errors import InvalidId
+from django.conf import settings
+from graphql import GraphQLError
+from pymongo.errors import BulkWriteError
+
+
+class BulkItemResult(graphene.ObjectType):
+    """Outcome of one item of a bulk mutation, in the order the ids were given."""
+
+    id = graphene.ID()
+    success = graphene.Boolean()
+    error = graphene.String()
+
+
+def parse_ids(ids):
+    """
+    Returns ({id: ObjectId}, {id: error}) for the given id strings. Duplicates
+    are reported once per occurrence but only written once.
+    """
+    maximum = getattr(settings, 'GRAPHQL_MAX_BULK_SIZE', 10000)
+    if len(ids) > maximum:
+        raise GraphQLError(f'At most {maximum} ids can be changed in one request')
+
+    object_ids, errors = {}, {}
+    for id in ids:
+        try:
+            object_ids[id] = ObjectId(id)
+        except (InvalidId, TypeError):
+            errors[id] = 'Invalid ID'
+    return object_ids, errors
+
+
+def bulk_write(collection, ids, operations, errors, object_ids, written, not_found='Not found'):
+    """
+    Sends `operations` ({id: pymongo write}) in one unordered bulk_write and
+    returns (results for every id in `ids`, number of documents modified).
+    Items in `errors` ({id: message}) failed their checks and were not sent.
+
+    The result only counts matches for the whole batch, so `written` is a
+    filter that only documents written by this request match, typically
+    {'updated_at': now}. When fewer documents matched than operations were
+    sent (deleted or changed since the checks), it finds the ids that matched
+    nothing, and those get `not_found` as their error.
+    """
+    keys = list(operations)
+    matched = modified = 0
+    if keys:
+        try:
+            result = collection.bulk_write([operations[key] for key in keys], ordered=False)
+            matched, modified = result.matched_count, result.modified_count
+        except BulkWriteError as e:
+            matched, modified = e.details.get('nMatched', 0), e.details.get('nModified', 0)
+            for error in e.details['writeErrors']:
+                errors[keys[error['index']]] = error['errmsg']
+
+    sent = [key for key in keys if key not in errors]
+    if matched < len(sent):
+        query = dict(written, _id={'$in': [object_ids[key] for key in sent]})
+        found = {document['_id'] for document in collection.find(query, {'_id': True})}
+        for key in sent:
+            if object_ids[key] not in found:
+                errors[key] = not_found
+
+    results = [BulkItemResult(id=id, success=id not in errors, error=errors.get(id)) for id in ids]
+    return results, modified
@@ -0,0 +1,117 @@
+# mentor_app/compression.py
+"""
+Response compression negotiated from Accept-Encoding: brotli when the client
+accepts it and the brotli package is installed, otherwise gzip.
+
+Only the content types in RESPONSE_COMPRESSION['CONTENT_TYPES'] are touched
+(GraphQL results and exports), and only bodies of at least MIN_SIZE bytes,
+below which the headers and CPU cost more than they save. Streamed exports
+are compressed chunk by chunk as they are sent.
+"""
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+try:
+    import brotli
+except ImportError:  # optional, see requirements.txt
+    brotli = None
+
+
+def compression_settings():
+    options = getattr(settings, 'RESPONSE_COMPRESSION', {})
+    return {
+        'ENABLED': options.get('ENABLED', True),
+        'MIN_SIZE': options.get('MIN_SIZE', 1024),
+        'GZIP_LEVEL': options.get('GZIP_LEVEL', 6),
+        'BROTLI_QUALITY': options.get('BROTLI_QUALITY', 4),
+        'CONTENT_TYPES': options.get('CONTENT_TYPES', ('application/json', 'application/x-ndjson', 'text/csv')),
+    }
+
+
+def available_encodings():
+    # In order of preference
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate(accept_encoding):
+    """The encoding to answer `accept_encoding` with, or None for identity."""
+    weights = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                continue
+        weights[coding.strip().lower()] = quality
+
+    best, best_quality = None, 0
+    for coding in available_encodings():
+        quality = weights.get(coding, weights.get('*', 0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def _compressor(coding, options):
+    # (compress, flush) functions of a fresh compressor for `coding`
+    if coding == 'br':
+        compressor = brotli.Compressor(quality=options['BROTLI_QUALITY'])
+        return compressor.process, compressor.finish
+    compressor = zlib.compressobj(options['GZIP_LEVEL'], zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress, compressor.flush
+
+
+def compress(coding, content, options):
+    compress_chunk, flush = _compressor(coding, options)
+    return compress_chunk(content) + flush()
+
+
+def compress_stream(coding, chunks, options):
+    compress_chunk, flush = _compressor(coding, options)
+    for chunk in chunks:
+        compressed = compress_chunk(chunk)
+        if compressed:  # the compressor buffers small chunks until it has a block
+            yield compressed
+    yield flush()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """See the module docstring and RESPONSE_COMPRESSION in settings."""
+
+    def process_response(self, request, response):
+        options = compression_settings()
+        if not options['ENABLED'] or response.has_header('Content-Encoding') or response.status_code in (204, 304):
+            return response
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type not in options['CONTENT_TYPES']:
+            return response
+        if not response.streaming and len(response.content) < options['MIN_SIZE']:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if coding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compress_stream(coding, response.streaming_content, options)
+            if response.has_header('Content-Length'):
+                del response['Content-Length']
+        else:
+            compressed = compress(coding, response.content, options)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        if response.has_header('ETag') and not response['ETag'].startswith('W/'):
+            # The bytes changed, so a strong validator no longer holds
+            response['ETag'] = 'W/' + response['ETag']
+        response['Content-Encoding'] = coding
+        return response
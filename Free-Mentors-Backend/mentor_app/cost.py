@@ -0,0 +1,166 @@
+# mentor_app/cost.py
+import graphene
+from django.conf import settings
+from graphql import (
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    GraphQLList,
+    InlineFragmentNode,
+    get_named_type,
+    get_nullable_type,
+    is_composite_type,
+    value_from_ast,
+)
+
+# Weight of one resolution of each field, before list multipliers. Fields not
+# listed here cost 1 if they resolve to an object (a possible Mongo read) and
+# 0 if they resolve to a scalar. Tune with the `cost` reported in responses.
+DEFAULT_WEIGHTS = {
+    # users/schema.py
+    'Query.users': 2,
+    'Query.mentors': 2,
+    'Query.searchMentors': 5,  # text index scan + ranking
+    'Query.mentor': 1,
+    'Query.recommendedMentors': 3,  # profile + sessions + mentors, ranking in memory
+    'Query.me': 1,
+    'Mutation.createUser': 10,  # bcrypt
+    'Mutation.createAdmin': 10,  # bcrypt
+    'Mutation.tokenAuth': 10,  # bcrypt
+    'Mutation.updateUser': 2,
+    'Mutation.changeToMentor': 2,
+    'Mutation.changeToMentorBulk': 10,
+    # mentorship/schema.py
+    'Query.allSessions': 2,
+    'Query.userSessions': 2,
+    'MentorshipSessionType.mentor': 1,
+    'MentorshipSessionType.mentee': 1,
+    'Mutation.createSession': 2,
+    'Mutation.updateSessionStatus': 2,
+    'Mutation.updateSessionStatusBulk': 10,
+    # reviews/schema.py
+    'Query.allReviews': 2,
+    'Query.mentorReviews': 3,  # sessions lookup + reviews
+    'ReviewType.session': 1,
+    'Mutation.createReview': 3,
+    'Mutation.updateReviewVisibility': 2,
+    'Mutation.updateReviewVisibilityBulk': 15,  # + rating summaries
+    # mentor_app/schema.py
+    'Query.adminStats': 5,  # may refresh the rollups first
+    # connections
+    'UserConnection.totalCount': 5,
+    'MentorshipSessionConnection.totalCount': 5,
+    'ReviewConnection.totalCount': 5,
+}
+
+
+def cost_settings():
+    options = {
+        'MAX_COST': 5000,
+        'BUDGET_PER_MINUTE': None,
+        'ASSUMED_LIST_SIZE': 50,
+        'WEIGHTS': {},
+    }
+    options.update(getattr(settings, 'GRAPHQL_COST', {}))
+    options['WEIGHTS'] = {**DEFAULT_WEIGHTS, **options['WEIGHTS']}
+    return options
+
+
+def _is_connection(graphql_type):
+    graphene_type = getattr(graphql_type, 'graphene_type', None)
+    return isinstance(graphene_type, type) and issubclass(graphene_type, graphene.relay.Connection)
+
+
+def _is_edge(graphql_type):
+    # Relay edge types are generated per connection, so recognise them by shape
+    return 'node' in graphql_type.fields and 'cursor' in graphql_type.fields
+
+
+class CostCalculator:
+    """
+    Static cost of one operation: the sum over every field of its weight times
+    the number of times it can be resolved. Connections multiply their
+    selection by `first`/`last` (or the default page size), other lists by
+    ASSUMED_LIST_SIZE. Aliases and fragments are counted as often as they appear.
+    """
+
+    def __init__(self, schema, document, variables=None):
+        self.schema = schema
+        self.variables = variables or {}
+        self.fragments = {
+            definition.name.value: definition
+            for definition in document.definitions
+            if isinstance(definition, FragmentDefinitionNode)
+        }
+        options = cost_settings()
+        self.weights = options['WEIGHTS']
+        self.assumed_list_size = options['ASSUMED_LIST_SIZE']
+        self.page_size = getattr(settings, 'GRAPHQL_PAGE_SIZE', 20)
+        self.max_page_size = getattr(settings, 'GRAPHQL_MAX_PAGE_SIZE', 100)
+
+    def operation_cost(self, operation):
+        root_type = self.schema.get_root_type(operation.operation)
+        return self.selection_cost(operation.selection_set, root_type, 1, set())
+
+    def selection_cost(self, selection_set, parent_type, multiplier, visited, page_size=None):
+        total = 0
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                total += self.field_cost(selection, parent_type, multiplier, visited, page_size)
+            elif isinstance(selection, InlineFragmentNode):
+                fragment_type = parent_type
+                if selection.type_condition is not None:
+                    fragment_type = self.schema.get_type(selection.type_condition.name.value)
+                total += self.selection_cost(selection.selection_set, fragment_type, multiplier, visited, page_size)
+            elif isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                fragment = self.fragments.get(name)
+                if fragment is None or name in visited:
+                    continue
+                fragment_type = self.schema.get_type(fragment.type_condition.name.value)
+                total += self.selection_cost(
+                    fragment.selection_set, fragment_type, multiplier, visited | {name}, page_size
+                )
+        return total
+
+    def field_cost(self, node, parent_type, multiplier, visited, page_size):
+        name = node.name.value
+        if name.startswith('__'):
+            return 0  # introspection and __typename
+        field = parent_type.fields.get(name)
+        if field is None:
+            return 0
+
+        named_type = get_named_type(field.type)
+        # edges/node/pageInfo are plain attribute reads, the Mongo work is on the connection field
+        wrapper = _is_connection(parent_type) or _is_edge(parent_type)
+        default_weight = 1 if is_composite_type(named_type) and not wrapper else 0
+        total = multiplier * self.weights.get(f'{parent_type.name}.{name}', default_weight)
+
+        if node.selection_set is None:
+            return total
+        if _is_connection(named_type):
+            # first/last only multiply the connection's edges, not totalCount/pageInfo
+            return total + self.selection_cost(
+                node.selection_set, named_type, multiplier, visited, self.page_size_of(node, field)
+            )
+
+        if isinstance(get_nullable_type(field.type), GraphQLList):
+            multiplier *= page_size if _is_connection(parent_type) and page_size else self.assumed_list_size
+        return total + self.selection_cost(node.selection_set, named_type, multiplier, visited)
+
+    def page_size_of(self, node, field):
+        sizes = [self.argument_value(node, field, arg) for arg in ('first', 'last') if arg in field.args]
+        sizes = [size for size in sizes if size is not None]
+        # Resolvers reject negative first/last, but they must never make a cost negative
+        return max(0, min(max(sizes), self.max_page_size)) if sizes else self.page_size
+
+    def argument_value(self, node, field, name):
+        for argument in node.arguments or ():
+            if argument.name.value == name:
+                return value_from_ast(argument.value, field.args[name].type, self.variables)
+        return None
+
+
+def operation_cost(schema, document, operation, variables=None):
+    return CostCalculator(schema, document, variables).operation_cost(operation)
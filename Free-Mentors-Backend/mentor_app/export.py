@@ -0,0 +1,170 @@
+# mentor_app/export.py
+"""
+Streaming exports of sessions, reviews and users as NDJSON or CSV.
+
+Rows come from one server-side cursor read in `batch_size` chunks as raw
+pymongo documents, and the references of each chunk are resolved with a single
+`$in` query, so memory stays at about one batch however many rows there are.
+Rows are ordered by (updated_at, _id): an incremental pull passes the largest
+`updated_at` it has seen as `updated_since`.
+"""
+import csv
+import datetime
+
+from bson import ObjectId
+
+from mentorship.models import MentorshipSession
+from reviews.models import Review
+from users.models import User
+
+from . import encoding
+from .mongo import read_only
+
+EXPORT_SORT = ('updated_at', 'id')
+
+
+def _sessions(rows):
+    people = _load(User, {row.get(field) for row in rows for field in ('mentor', 'mentee')}, ('email',))
+    for row in rows:
+        yield {
+            'id': row['_id'],
+            'mentor_id': row.get('mentor'),
+            'mentor_email': people.get(row.get('mentor'), {}).get('email'),
+            'mentee_id': row.get('mentee'),
+            'mentee_email': people.get(row.get('mentee'), {}).get('email'),
+            'topic': row.get('topic'),
+            'questions': row.get('questions'),
+            'status': row.get('status'),
+            'created_at': row.get('created_at'),
+            'updated_at': row.get('updated_at'),
+        }
+
+
+def _reviews(rows):
+    sessions = _load(MentorshipSession, {row.get('session') for row in rows}, ('mentor', 'mentee'))
+    for row in rows:
+        session = sessions.get(row.get('session'), {})
+        yield {
+            'id': row['_id'],
+            'session_id': row.get('session'),
+            'mentor_id': session.get('mentor'),
+            'mentee_id': session.get('mentee'),
+            'rating': row.get('rating'),
+            'content': row.get('content'),
+            'is_visible': row.get('is_visible'),
+            'created_at': row.get('created_at'),
+            'updated_at': row.get('updated_at'),
+        }
+
+
+def _users(rows):
+    # Never the password hash
+    for row in rows:
+        yield {
+            'id': row['_id'],
+            'email': row.get('email'),
+            'first_name': row.get('first_name'),
+            'last_name': row.get('last_name'),
+            'user_type': row.get('user_type'),
+            'is_staff': row.get('is_staff', False),
+            'address': row.get('address'),
+            'bio': row.get('bio'),
+            'occupation': row.get('occupation'),
+            'expertise': row.get('expertise'),
+            'created_at': row['_id'].generation_time.replace(tzinfo=None),
+            'updated_at': row.get('updated_at'),
+        }
+
+
+# name -> (document, fields read, row builder, CSV columns)
+EXPORTS = {
+    'sessions': (
+        MentorshipSession,
+        ('mentor', 'mentee', 'topic', 'questions', 'status', 'created_at', 'updated_at'),
+        _sessions,
+        ('id', 'mentor_id', 'mentor_email', 'mentee_id', 'mentee_email', 'topic', 'questions', 'status',
+         'created_at', 'updated_at'),
+    ),
+    'reviews': (
+        Review,
+        ('session', 'rating', 'content', 'is_visible', 'created_at', 'updated_at'),
+        _reviews,
+        ('id', 'session_id', 'mentor_id', 'mentee_id', 'rating', 'content', 'is_visible', 'created_at', 'updated_at'),
+    ),
+    'users': (
+        User,
+        ('email', 'first_name', 'last_name', 'user_type', 'is_staff', 'address', 'bio', 'occupation', 'expertise',
+         'updated_at'),
+        _users,
+        ('id', 'email', 'first_name', 'last_name', 'user_type', 'is_staff', 'address', 'bio', 'occupation',
+         'expertise', 'created_at', 'updated_at'),
+    ),
+}
+
+
+def _load(document, ids, fields):
+    ids = [id for id in ids if id is not None]
+    if not ids:
+        return {}
+    collection = document._get_collection()
+    return {row['_id']: row for row in collection.find({'_id': {'$in': ids}}, {field: True for field in fields})}
+
+
+def parse_since(value):
+    """`updated_since` as a naive UTC datetime (how they are stored); ValueError if malformed."""
+    since = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if since.tzinfo is not None:
+        since = since.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return since
+
+
+def export_rows(name, updated_since=None, batch_size=1000):
+    """Every row of export `name`, as dicts of raw values, one batch in memory at a time."""
+    document, fields, build, _ = EXPORTS[name]
+    queryset = read_only(document)
+    if updated_since is not None:
+        changed = {'updated_at': {'$gte': updated_since}}
+        if document is User:
+            # Users saved before updated_at existed only have their creation time
+            changed = {'$or': [changed, {
+                'updated_at': {'$exists': False},
+                '_id': {'$gte': ObjectId.from_datetime(updated_since)},
+            }]}
+        queryset = queryset.filter(__raw__=changed)
+    cursor = queryset.only(*fields).order_by(*EXPORT_SORT).as_pymongo().no_cache().batch_size(batch_size)
+
+    batch = []
+    for row in cursor:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield from build(batch)
+            batch = []
+    if batch:
+        yield from build(batch)
+
+
+def _value(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime.datetime):
+        return value.isoformat() + ('Z' if value.tzinfo is None else '')
+    return value
+
+
+def ndjson_lines(rows):
+    # ObjectIds and datetimes are left to the encoder, which writes them like _value
+    for row in rows:
+        yield encoding.dumps(row) + b'\n'
+
+
+class _Echo:
+    # csv.writer target handing each formatted line back instead of storing it
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows, columns):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(['' if row[column] is None else _value(row[column]) for column in columns])
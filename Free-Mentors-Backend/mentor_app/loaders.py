@@ -0,0 +1,121 @@
+# mentor_app/loaders.py
+import threading
+
+from bson import DBRef
+from mongoengine import Document, ReferenceField
+from .projection import projected_fields, selected_fields
+
+
+def reference_id(value):
+    # ReferenceFields hold a DBRef, a raw ObjectId or an already loaded document
+    if value is None:
+        return None
+    if isinstance(value, DBRef):
+        return value.id
+    if isinstance(value, Document):
+        return value.pk
+    return value
+
+
+class ReferenceLoader:
+    """
+    Request-scoped batch loader for one Document class, keyed by ObjectId.
+
+    List resolvers queue the ids they are about to expose; the first field
+    resolver that misses the cache loads every id queued for that field with
+    a single `$in` query, so a list costs one query per reference field
+    instead of one per row. Loads can be restricted to a projection, which
+    is part of the cache key so a narrow load never serves a wider selection.
+    Resolvers of one request may run in several threads (top-level fields on
+    the async endpoint, operations of a batch), so the loader is locked.
+    """
+
+    def __init__(self, context, document):
+        self.context = context
+        self.document = document
+        self._cache = {}
+        self._queued = {}
+        self._lock = threading.RLock()
+
+    def queue(self, keys, group=None):
+        with self._lock:
+            queued = self._queued.setdefault(group, set())
+            for key in keys:
+                key = reference_id(key)
+                if key is not None:
+                    queued.add(key)
+
+    def load(self, key, group=None, fields=None):
+        key = reference_id(key)
+        if key is None:
+            return None
+        with self._lock:
+            if (key, fields) not in self._cache:
+                self.queue([key], group)
+                self._dispatch(group, fields)
+            return self._cache.get((key, fields))
+
+    def prime(self, document, fields=None):
+        self._cache[(document.pk, fields)] = document
+
+    def _dispatch(self, group, fields):
+        keys = [key for key in self._queued.get(group, ()) if (key, fields) not in self._cache]
+        if not keys:
+            return
+
+        for key in keys:
+            self._cache[(key, fields)] = None
+        queryset = self.document.objects(id__in=keys)
+        if fields is not None:
+            queryset = queryset.only(*fields)
+        documents = list(queryset)
+        for document in documents:
+            self.prime(document, fields)
+
+        # Queue the references of what we just loaded so the next level of
+        # the selection (e.g. review -> session -> mentor) is batched as well
+        references = [
+            name for name, field in self.document._fields.items()
+            if isinstance(field, ReferenceField) and (fields is None or name in fields)
+        ]
+        queue_references(self.context, documents, *references)
+
+
+_loaders_lock = threading.Lock()
+
+
+def get_loader(context, document):
+    with _loaders_lock:
+        loaders = getattr(context, '_reference_loaders', None)
+        if loaders is None:
+            loaders = {}
+            setattr(context, '_reference_loaders', loaders)
+        if document not in loaders:
+            loaders[document] = ReferenceLoader(context, document)
+        return loaders[document]
+
+
+def queue_references(context, documents, *field_names):
+    """Queue the ids behind `field_names` on each document for batched loading."""
+    for name in field_names:
+        loader = None
+        keys = []
+        for document in documents:
+            if loader is None:
+                loader = get_loader(context, document._fields[name].document_type)
+            keys.append(document._data.get(name))
+        if loader is not None:
+            loader.queue(keys, group=name)
+
+
+def load_reference(root, info, field_name):
+    """
+    Resolve a ReferenceField through the request's loader instead of one
+    `get()` per row, fetching only the fields selected below it.
+    """
+    value = root._data.get(field_name)
+    if value is None or isinstance(value, Document):
+        return value
+    document = root._fields[field_name].document_type
+    fields = projected_fields(document, selected_fields(info))
+    return get_loader(info.context, document).load(value, group=field_name, fields=fields)
@@ -0,0 +1,193 @@
+# mentor_app/metrics.py
+"""
+In-process metrics in the Prometheus text format, served at /metrics.
+
+Every thread records into its own store, so recording takes no lock; a scrape
+adds the stores up. When a thread exits its store is added into the totals
+and dropped, so thread pools that come and go don't grow the registry. This module is imported from settings (for the Mongo
+listener), so it must not touch Django at import time.
+"""
+import bisect
+import threading
+import time
+import weakref
+
+from graphql import get_named_type, is_leaf_type
+from pymongo import monitoring
+
+RESOLVER_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# name -> (type, help, label names, buckets)
+METRICS = {
+    'graphql_resolver_duration_seconds': (
+        'histogram', 'Time spent in GraphQL field resolvers', ('field',), RESOLVER_BUCKETS,
+    ),
+    'graphql_resolver_errors_total': (
+        'counter', 'GraphQL field resolvers that raised', ('field',), None,
+    ),
+    'mongodb_command_duration_seconds': (
+        'histogram', 'MongoDB command round trips, as measured by pymongo', ('collection', 'command'), MONGO_BUCKETS,
+    ),
+    'mongodb_command_failures_total': (
+        'counter', 'MongoDB commands that failed', ('collection', 'command'), None,
+    ),
+}
+
+
+def _add(into, store):
+    # Adds the series of `store` into `into`
+    for key, value in list(store.items()):
+        if isinstance(value, list):
+            total = into.setdefault(key, [[0] * len(value[0]), 0.0, 0])
+            for i, count in enumerate(value[0]):
+                total[0][i] += count
+            total[1] += value[1]
+            total[2] += value[2]
+        else:
+            into[key] = into.get(key, 0) + value
+
+
+class _Owner:
+    # Lives in a thread's locals, so it is collected when the thread exits
+    pass
+
+
+class _Registry:
+    def __init__(self):
+        self._local = threading.local()
+        self._stores = {}  # id -> store of a live thread
+        self._totals = {}  # what exited threads recorded
+        self._lock = threading.Lock()  # not taken when recording, only on a thread's first and last record
+
+    def store(self):
+        store = getattr(self._local, 'store', None)
+        if store is None:
+            store = self._local.store = {}
+            owner = self._local.owner = _Owner()
+            with self._lock:
+                self._stores[id(store)] = store
+            weakref.finalize(owner, self._retire, id(store))
+        return store
+
+    def _retire(self, key):
+        with self._lock:
+            store = self._stores.pop(key, None)
+            if store is not None:
+                _add(self._totals, store)
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][3]
+        store = self.store()
+        series = store.get((name, labels))
+        if series is None:
+            # [per-bucket counts (non-cumulative), sum, count]
+            series = store[(name, labels)] = [[0] * len(buckets), 0.0, 0]
+        index = bisect.bisect_left(buckets, value)
+        if index < len(buckets):
+            series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+    def inc(self, name, labels, amount=1):
+        store = self.store()
+        store[(name, labels)] = store.get((name, labels), 0) + amount
+
+    def collect(self):
+        # Values are summed while other threads may be writing; a scrape can
+        # miss an in-flight update, it is never lost. The lock keeps a store
+        # being retired from being counted twice.
+        merged = {}
+        with self._lock:
+            _add(merged, self._totals)
+            for store in self._stores.values():
+                _add(merged, store)
+        return merged
+
+
+registry = _Registry()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}' if pairs else ''
+
+
+def render():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    merged = registry.collect()
+    lines = []
+    for name, (kind, help, label_names, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {help}')
+        lines.append(f'# TYPE {name} {kind}')
+        series = sorted((labels, value) for (metric, labels), value in merged.items() if metric == name)
+        for labels, value in series:
+            if kind == 'counter':
+                lines.append(f'{name}{_labels(label_names, labels)} {value}')
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{_labels(label_names, labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_bucket{_labels(label_names, labels, [("le", "+Inf")])} {count}')
+            lines.append(f'{name}_sum{_labels(label_names, labels)} {total}')
+            lines.append(f'{name}_count{_labels(label_names, labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+class ResolverMetricsMiddleware:
+    """
+    Graphene middleware timing field resolvers. Scalar fields below the root
+    are plain attribute reads and are skipped unless `leaves` is set, which
+    keeps the overhead to the fields that can do I/O.
+    """
+
+    leaves = False
+
+    def resolve(self, next, root, info, **kwargs):
+        if info.path.prev is not None and not self.leaves and is_leaf_type(get_named_type(info.return_type)):
+            return next(root, info, **kwargs)
+
+        field = f'{info.parent_type.name}.{info.field_name}'
+        started = time.perf_counter()
+        try:
+            result = next(root, info, **kwargs)
+        except Exception:
+            registry.inc('graphql_resolver_errors_total', (field,))
+            raise
+        finally:
+            registry.observe('graphql_resolver_duration_seconds', (field,), time.perf_counter() - started)
+        return result
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """pymongo listener recording command durations per collection and command."""
+
+    def __init__(self):
+        # started/succeeded for one command arrive on the thread that sent it
+        self._pending = threading.local()
+
+    def started(self, event):
+        pending = self._pending.__dict__
+        command = event.command
+        collection = command.get(event.command_name)
+        if event.command_name == 'getMore':
+            collection = command.get('collection')
+        pending[event.request_id] = collection if isinstance(collection, str) else ''
+
+    def _finish(self, event):
+        collection = self._pending.__dict__.pop(event.request_id, '')
+        labels = (collection, event.command_name)
+        registry.observe('mongodb_command_duration_seconds', labels, event.duration_micros / 1e6)
+        return labels
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        registry.inc('mongodb_command_failures_total', self._finish(event))
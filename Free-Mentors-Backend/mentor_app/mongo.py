@@ -0,0 +1,76 @@
+# mentor_app/mongo.py
+"""
+MongoDB connection aliases.
+
+Settings only *register* the connections; MongoEngine creates each MongoClient
+the first time a query needs it, so management commands and forked workers
+don't open sockets they never use. A client inherited across fork() is not
+safe to use, so the child drops it and lazily creates its own.
+
+Like mentor_app.metrics this is imported from settings, so nothing here may
+touch Django at import time.
+"""
+import os
+import threading
+
+from mongoengine import DEFAULT_CONNECTION_NAME, Document, register_connection
+from mongoengine import connection as mongoengine_connection
+from mongoengine.base.common import _document_registry
+from pymongo import ReadPreference
+
+# Alias read-only resolvers opt into with `read_only(Document)`. Reads may lag
+# behind the primary by the replication delay; writes and auth never use it.
+SECONDARY_ALIAS = 'secondary'
+
+_secondary_collections = {}
+_lock = threading.Lock()
+
+
+def register_connections(db, host, port, secondary_reads=True, **client_options):
+    """
+    Register the default (primary) alias and, if `secondary_reads`, the
+    secondaryPreferred alias. `client_options` go to every MongoClient
+    (maxPoolSize, minPoolSize, waitQueueTimeoutMS, compressors, listeners...).
+    """
+    register_connection(DEFAULT_CONNECTION_NAME, db=db, host=host, port=port, **client_options)
+    if secondary_reads:
+        register_connection(
+            SECONDARY_ALIAS, db=db, host=host, port=port,
+            read_preference=ReadPreference.SECONDARY_PREFERRED, **client_options
+        )
+
+
+def read_only(document):
+    """
+    A queryset on `document` reading from the secondary alias, or from the
+    primary when no secondary alias is registered. Built directly on the
+    collection, so unlike `.using()`/`switch_db` it never touches class state
+    other threads are using.
+    """
+    if SECONDARY_ALIAS not in mongoengine_connection._connection_settings:
+        return document.objects
+    name = document._get_collection_name()
+    collection = _secondary_collections.get(name)
+    if collection is None:
+        with _lock:
+            collection = _secondary_collections.get(name)
+            if collection is None:
+                collection = mongoengine_connection.get_db(SECONDARY_ALIAS)[name]
+                _secondary_collections[name] = collection
+    return document._meta['queryset_class'](document, collection)
+
+
+def forget_clients():
+    """Drop every MongoClient (without closing it); the next query creates a new one."""
+    for alias in list(mongoengine_connection._connections):
+        mongoengine_connection._connections.pop(alias, None)
+        mongoengine_connection._dbs.pop(alias, None)
+    for document in _document_registry.values():
+        if issubclass(document, Document) and not document._meta.get('abstract'):
+            document._disconnect()
+    _secondary_collections.clear()
+
+
+# Sockets and monitor threads of a client created before fork() belong to the
+# parent; the child must not use them
+os.register_at_fork(after_in_child=forget_clients)
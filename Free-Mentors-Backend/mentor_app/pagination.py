@@ -0,0 +1,142 @@
+# mentor_app/pagination.py
+import base64
+import datetime
+import json
+
+import graphene
+from bson import DBRef, ObjectId
+from bson.errors import InvalidId
+from django.conf import settings
+from graphql import GraphQLError
+from mongoengine import Document
+
+
+class CountableConnection(graphene.relay.Connection):
+    """Relay connection whose `totalCount` is only computed when it is selected."""
+
+    class Meta:
+        abstract = True
+
+    total_count = graphene.Int()
+
+    def resolve_total_count(root, info):
+        return root.queryset.count()
+
+
+def _encode_value(value):
+    if isinstance(value, DBRef):
+        value = value.id  # a reference field that wasn't dereferenced
+    elif isinstance(value, Document):
+        value = value.pk
+    if isinstance(value, datetime.datetime):
+        return {'$date': value.isoformat()}
+    if isinstance(value, ObjectId):
+        return {'$oid': str(value)}
+    return value
+
+
+def _decode_value(field, value):
+    if isinstance(value, dict):
+        if '$oid' in value:
+            return ObjectId(value['$oid'])
+        return datetime.datetime.fromisoformat(value['$date'])
+    if field == '_id':
+        return ObjectId(value)  # cursors issued before ObjectIds were tagged
+    if isinstance(value, (int, float, str)) or value is None:
+        return value
+    raise ValueError(value)
+
+
+def encode_cursor_values(values):
+    values = [_encode_value(value) for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+
+def encode_cursor(document, sort):
+    return encode_cursor_values([document._data.get('id' if field == '_id' else field) for field, _ in sort])
+
+
+def decode_cursor(cursor, sort):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if len(values) != len(sort):
+            raise ValueError(cursor)
+        return [_decode_value(field, value) for (field, _), value in zip(sort, values)]
+    except (ValueError, TypeError, KeyError, InvalidId):
+        raise GraphQLError('Invalid cursor')
+
+
+def keyset_filter(sort, values, forward):
+    # (a, b) > (x, y)  <=>  a > x OR (a == x AND b > y), honouring each field's direction
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        ascending = (direction == 1) == forward
+        clause = {prev_field: values[j] for j, (prev_field, _) in enumerate(sort[:i])}
+        clause[field] = {'$gt' if ascending else '$lt': values[i]}
+        clauses.append(clause)
+    return clauses[0] if len(clauses) == 1 else {'$or': clauses}
+
+
+def _any_at_or_beyond(queryset, sort, values, forward):
+    # Whether a row sorts at the cursor or past it (after it if `forward`), for
+    # hasPreviousPage/hasNextPage on the side of the cursor a page came from
+    at_cursor = {field: value for (field, _), value in zip(sort, values)}
+    beyond = keyset_filter(sort, values, forward)
+    return queryset.filter(__raw__={'$or': [beyond, at_cursor]}).only('id').first() is not None
+
+
+def page_size(size):
+    default = getattr(settings, 'GRAPHQL_PAGE_SIZE', 20)
+    maximum = getattr(settings, 'GRAPHQL_MAX_PAGE_SIZE', 100)
+    if size is None:
+        return default
+    if size < 0:
+        raise GraphQLError('Page size must be positive')
+    return min(size, maximum)
+
+
+def paginate(connection_type, queryset, sort=(('_id', 1),), first=None, after=None, last=None, before=None):
+    """
+    Keyset-paginate a MongoEngine queryset into `connection_type`.
+
+    `sort` is a sequence of `(db_field, direction)` pairs that must end on
+    `_id` so every cursor is unique. Pages are selected with range filters on
+    those fields rather than skip/offset, so the cost of a page does not grow
+    with its position in the collection.
+    """
+    if first is not None and last is not None:
+        raise GraphQLError('Pass either first or last, not both')
+    sort = list(sort)
+    backwards = last is not None
+    limit = page_size(last if backwards else first)
+
+    page = queryset
+    after_values = decode_cursor(after, sort) if after else None
+    before_values = decode_cursor(before, sort) if before else None
+    if after_values:
+        page = page.filter(__raw__=keyset_filter(sort, after_values, forward=True))
+    if before_values:
+        page = page.filter(__raw__=keyset_filter(sort, before_values, forward=False))
+
+    order = [('+' if (direction == 1) != backwards else '-') + ('id' if field == '_id' else field)
+             for field, direction in sort]
+    documents = list(page.order_by(*order).limit(limit + 1))
+
+    has_more = len(documents) > limit
+    documents = documents[:limit]
+    if backwards:
+        documents.reverse()
+
+    edges = [
+        connection_type.Edge(node=document, cursor=encode_cursor(document, sort))
+        for document in documents
+    ]
+    page_info = graphene.relay.PageInfo(
+        start_cursor=edges[0].cursor if edges else None,
+        end_cursor=edges[-1].cursor if edges else None,
+        has_previous_page=has_more if backwards else bool(after_values) and _any_at_or_beyond(queryset, sort, after_values, forward=False),
+        has_next_page=bool(before_values) and _any_at_or_beyond(queryset, sort, before_values, forward=True) if backwards else has_more,
+    )
+    connection = connection_type(edges=edges, page_info=page_info)
+    connection.queryset = queryset
+    return connection
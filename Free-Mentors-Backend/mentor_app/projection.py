@@ -0,0 +1,45 @@
+# mentor_app/projection.py
+from graphene.utils.str_converters import to_snake_case
+from graphql import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+
+def _collect(selection_set, fragments, selected):
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            children = selected.setdefault(selection.name.value, {})
+            if selection.selection_set is not None:
+                _collect(selection.selection_set, fragments, children)
+        elif isinstance(selection, InlineFragmentNode):
+            _collect(selection.selection_set, fragments, selected)
+        elif isinstance(selection, FragmentSpreadNode):
+            fragment = fragments.get(selection.name.value)
+            if fragment is not None:
+                _collect(fragment.selection_set, fragments, selected)
+    return selected
+
+
+def selected_fields(info, path=()):
+    """
+    Field names the client selected under the current field, as a nested dict
+    merged across fragments, e.g. {'firstName': {}, 'mentor': {'email': {}}}.
+    `path` walks into the selection, e.g. ('edges', 'node') for a connection.
+    """
+    selected = {}
+    for node in info.field_nodes:
+        if node.selection_set is not None:
+            _collect(node.selection_set, info.fragments, selected)
+    for name in path:
+        selected = selected.get(name, {})
+    return selected
+
+
+def projected_fields(document, selected, always=()):
+    # Only real document fields can be projected; computed GraphQL fields are ignored
+    names = {to_snake_case(name) for name in selected} | set(always) | {'id'}
+    return tuple(sorted(name for name in names if name in document._fields))
+
+
+def project(queryset, info, path=(), always=()):
+    """Restrict `queryset` to the document fields selected at `path` (plus `always`)."""
+    fields = projected_fields(queryset._document, selected_fields(info, path), always)
+    return queryset.only(*fields)
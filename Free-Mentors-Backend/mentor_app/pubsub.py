@@ -0,0 +1,194 @@
+# mentor_app/pubsub.py
+"""
+In-process fan-out of changed documents to GraphQL subscribers.
+
+Writers publish the raw documents they changed under their collection name;
+the collection's router (see `route`) names the channels each document goes
+to, e.g. one per user allowed to see it, and every subscriber of those
+channels gets it on its own bounded queue.
+
+Which writes reach a subscriber depends on SUBSCRIPTIONS['BROKER']:
+  'local' - only writes made by this process (fine for a single worker)
+  'mongo' - every write to a routed collection, read from a change stream
+            (needs a replica set), so any number of workers and nodes can
+            serve subscribers; publish() is then a no-op
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger('mentor_app.pubsub')
+
+_routes = {}
+
+
+def route(collection, channels):
+    """Send documents published under `collection` to the channels `channels(document)` names."""
+    _routes[collection] = channels
+
+
+class SubscriberOverflow(Exception):
+    """The subscriber fell QUEUE_SIZE documents behind; the ones it missed were dropped."""
+
+
+class Subscriber:
+    """
+    Async iterator over the documents published to some channels. Created on
+    the event loop; `offer` may be called from any thread.
+    """
+
+    def __init__(self, broker, channels, queue_size):
+        self.broker = broker
+        self.channels = tuple(channels)
+        self.queue_size = queue_size
+        self.overflowed = False
+        self._loop = asyncio.get_running_loop()
+        self._queue = deque()
+        self._ready = asyncio.Event()
+
+    def offer(self, document):
+        try:
+            self._loop.call_soon_threadsafe(self._put, document)
+        except RuntimeError:
+            self.close()  # its event loop is gone
+
+    def _put(self, document):
+        if self.overflowed:
+            return
+        if len(self._queue) >= self.queue_size:
+            # Never buffer without bound for a client that isn't reading
+            self.overflowed = True
+            self._queue.clear()
+        else:
+            self._queue.append(document)
+        self._ready.set()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self._queue:
+            if self.overflowed:
+                raise SubscriberOverflow()
+            self._ready.clear()
+            await self._ready.wait()
+        return self._queue.popleft()
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """Delivers what this process publishes to this process' subscribers."""
+
+    def __init__(self, options):
+        self.queue_size = options.get('QUEUE_SIZE', 100)
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channels):
+        subscriber = Subscriber(self, channels, self.queue_size)
+        with self._lock:
+            for channel in subscriber.channels:
+                self._channels.setdefault(channel, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            for channel in subscriber.channels:
+                subscribers = self._channels.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscriber)
+                    if not subscribers:
+                        del self._channels[channel]
+
+    def subscriber_count(self):
+        with self._lock:
+            return len({subscriber for subscribers in self._channels.values() for subscriber in subscribers})
+
+    def publish(self, collection, documents):
+        # `documents` may be a lazy cursor; it is only read if anyone listens
+        if self._channels:
+            for document in documents:
+                self.fan_out(collection, document)
+
+    def fan_out(self, collection, document):
+        with self._lock:
+            subscribers = {
+                subscriber
+                for channel in _routes[collection](document)
+                for subscriber in self._channels.get(channel, ())
+            }
+        for subscriber in subscribers:
+            subscriber.offer(document)
+
+
+class MongoChangeStreamBroker(LocalBroker):
+    """
+    Delivers every insert/update/replace on the routed collections, whichever
+    process made it, by watching a change stream from one background thread.
+    """
+
+    RETRY_DELAY = 1.0
+
+    def __init__(self, options):
+        super().__init__(options)
+        self._watcher = None
+
+    def subscribe(self, channels):
+        with self._lock:
+            if self._watcher is None or not self._watcher.is_alive():
+                self._watcher = threading.Thread(target=self._watch, name='pubsub-change-stream', daemon=True)
+                self._watcher.start()
+        return super().subscribe(channels)
+
+    def publish(self, collection, documents):
+        pass  # the change stream delivers the write itself
+
+    def _watch(self):
+        from mongoengine.connection import get_db
+
+        pipeline = [{'$match': {
+            'operationType': {'$in': ['insert', 'update', 'replace']},
+            'ns.coll': {'$in': list(_routes)},
+        }}]
+        resume_after = None
+        while True:
+            try:
+                with get_db().watch(pipeline, full_document='updateLookup', resume_after=resume_after) as stream:
+                    for change in stream:
+                        resume_after = change['_id']
+                        if change.get('fullDocument') is not None:
+                            self.fan_out(change['ns']['coll'], change['fullDocument'])
+            except Exception:
+                logger.exception('change stream failed, resuming in %ss', self.RETRY_DELAY)
+                time.sleep(self.RETRY_DELAY)
+
+
+BROKERS = {'local': LocalBroker, 'mongo': MongoChangeStreamBroker}
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        from django.conf import settings
+
+        options = getattr(settings, 'SUBSCRIPTIONS', {})
+        with _broker_lock:
+            if _broker is None:
+                _broker = BROKERS[options.get('BROKER', 'local')](options)
+    return _broker
+
+
+def publish(collection, documents):
+    """Publish raw documents (dicts as stored, with `_id`) of `collection` that just changed."""
+    get_broker().publish(collection, documents)
+
+
+def subscribe(channels):
+    return get_broker().subscribe(channels)
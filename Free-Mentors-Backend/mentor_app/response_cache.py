@@ -0,0 +1,137 @@
+# mentor_app/response_cache.py
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.core.cache import caches
+from graphql import FieldNode, OperationType
+
+# Public read queries whose whole response may be cached, and the tags a
+# mutation invalidates to drop them. A response is cached only when every
+# top-level field of the operation is listed here.
+CACHEABLE_FIELDS = {
+    'mentors': ('users',),
+    'mentor': ('users',),
+    'mentorReviews': ('reviews', 'sessions', 'users'),
+}
+
+KEY_PREFIX = 'graphql:response:'
+TAG_PREFIX = 'graphql:tag:'
+SETTLE_PREFIX = 'graphql:settling:'
+
+
+def response_cache_settings():
+    options = {
+        'ENABLED': True,
+        'CACHE': 'default',
+        'TTL': 60,
+        'WAIT_TIMEOUT': 5,
+        'SETTLE_TIME': 5,
+    }
+    options.update(getattr(settings, 'GRAPHQL_RESPONSE_CACHE', {}))
+    return options
+
+
+def _cache():
+    return caches[response_cache_settings()['CACHE']]
+
+
+def cacheable_tags(operation_ast):
+    """Tags of a cacheable query operation, or None if it must not be cached."""
+    if not response_cache_settings()['ENABLED']:
+        return None
+    if operation_ast is None or operation_ast.operation != OperationType.QUERY:
+        return None
+    tags = set()
+    for selection in operation_ast.selection_set.selections:
+        if not isinstance(selection, FieldNode):
+            return None
+        name = selection.name.value
+        if name == '__typename':
+            continue
+        if name not in CACHEABLE_FIELDS:
+            return None
+        tags.update(CACHEABLE_FIELDS[name])
+    return sorted(tags) or None
+
+
+def _tag_versions(tags):
+    # A tag's version changes on every invalidation, which orphans every key
+    # built from the old one. Missing versions (new or evicted) start from the
+    # clock, so an evicted tag can never make an old entry valid again.
+    # Also returns whether any tag is still settling (see `invalidate`).
+    cache = _cache()
+    keys = [TAG_PREFIX + tag for tag in tags]
+    settling = [SETTLE_PREFIX + tag for tag in tags]
+    versions = cache.get_many(keys + settling)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys], any(key in versions for key in settling)
+
+
+def invalidate(*tags):
+    """
+    Drop every cached response that depends on any of `tags`. For SETTLE_TIME
+    seconds after, responses depending on them are not stored again: read
+    from a secondary, they may not include the write yet, and would keep
+    serving it stale for a whole TTL.
+    """
+    cache = _cache()
+    for tag in tags:
+        try:
+            cache.incr(TAG_PREFIX + tag)
+        except ValueError:
+            cache.set(TAG_PREFIX + tag, time.time_ns(), timeout=None)
+    settle_time = response_cache_settings()['SETTLE_TIME']
+    if settle_time:
+        cache.set_many({SETTLE_PREFIX + tag: True for tag in tags}, timeout=settle_time)
+
+
+def cache_key(document_key, operation_name, variables, scope, tags):
+    """The cache key of a response, and whether the response may be stored now."""
+    versions, settling = _tag_versions(tags)
+    raw = json.dumps(
+        [document_key, operation_name, variables or {}, scope, versions],
+        sort_keys=True,
+        default=str,
+    )
+    return KEY_PREFIX + hashlib.sha256(raw.encode('utf-8')).hexdigest(), not settling
+
+
+def lookup(key):
+    return _cache().get(key)
+
+
+def store(key, data):
+    _cache().set(key, data, timeout=response_cache_settings()['TTL'])
+
+
+# In-flight fetches by key. The first request to miss a key becomes the
+# leader and executes the query; concurrent misses for the same key in this
+# process wait on the leader's future instead of hitting Mongo again.
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def join_flight(key):
+    """Returns (future, is_leader). The leader must call `land_flight`."""
+    with _flights_lock:
+        future = _flights.get(key)
+        if future is not None:
+            return future, False
+        future = _flights[key] = Future()
+        return future, True
+
+
+def land_flight(key, future, result=None, error=None):
+    with _flights_lock:
+        _flights.pop(key, None)
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
@@ -1,16 +1,117 @@
 # mentor_app/schema.py
+import datetime
 import graphene
 import users.schema
 import mentorship.schema
 # import reviews.schema\
 import reviews.schema
+from graphql import GraphQLError
 from graphql_auth import mutations
 from graphql_auth.schema import MeQuery
+from mongoengine.connection import get_db
+from users.models import User
+from users.schema import UserType
+from users.utils import get_principal
+from . import stats
+from .loaders import get_loader
+from .pagination import page_size
+from .projection import projected_fields, selected_fields
+
+class StatusCount(graphene.ObjectType):
+    status = graphene.String()
+    count = graphene.Int()
+
+class RatingCount(graphene.ObjectType):
+    stars = graphene.Int()
+    count = graphene.Int()
+
+class SessionCounts(graphene.ObjectType):
+    pending = graphene.Int()
+    approved = graphene.Int()
+    declined = graphene.Int()
+    completed = graphene.Int()
+    total = graphene.Int()
+    acceptance_rate = graphene.Float(description="Accepted share of the sessions decided on")
+    completion_rate = graphene.Float(description="Completed share of the accepted sessions")
+
+    def resolve_acceptance_rate(parent, info):
+        return stats.acceptance_rate(parent)
+
+    def resolve_completion_rate(parent, info):
+        return stats.completion_rate(parent)
+
+class DaySessions(SessionCounts):
+    day = graphene.String()
+
+class MentorSessions(SessionCounts):
+    mentor = graphene.Field(UserType)
+
+    def resolve_mentor(parent, info):
+        # Batched across the list, see resolve_admin_stats
+        fields = projected_fields(User, selected_fields(info))
+        return get_loader(info.context, User).load(parent['mentor'], group='admin_stats', fields=fields)
+
+class AdminStats(graphene.ObjectType):
+    sessions_by_status = graphene.List(StatusCount)
+    sessions_by_day = graphene.List(DaySessions, days=graphene.Int(default_value=30))
+    mentors = graphene.List(MentorSessions, first=graphene.Int())
+    rating_distribution = graphene.List(RatingCount)
+    acceptance_rate = graphene.Float()
+    completion_rate = graphene.Float()
+    refreshed_at = graphene.DateTime()
+
+    # Every field reads a rollup, never the sessions or reviews themselves
+    def session_totals(self):
+        if not hasattr(self, '_session_totals'):
+            self._session_totals = stats.totals(stats.SESSIONS_BY_MENTOR, stats.STATUSES)
+        return self._session_totals
+
+    def resolve_sessions_by_status(parent, info):
+        counts = parent.session_totals()
+        return [StatusCount(status=status, count=counts[status]) for status in stats.STATUSES]
+
+    def resolve_sessions_by_day(parent, info, days):
+        if days < 1:
+            raise GraphQLError('days must be positive')
+        since = (datetime.datetime.utcnow() - datetime.timedelta(days=days - 1)).strftime(stats.DAY_FORMAT)
+        rows = get_db()[stats.SESSIONS_BY_DAY].find({'_id': {'$gte': since}}).sort('_id', 1)
+        return [dict(row, day=row['_id']) for row in rows]
+
+    def resolve_mentors(parent, info, first=None):
+        # Busiest mentors first
+        rows = get_db()[stats.SESSIONS_BY_MENTOR].find({'_id': {'$ne': None}}).sort([('total', -1), ('_id', 1)]).limit(page_size(first))
+        rows = [dict(row, mentor=row['_id']) for row in rows]
+        get_loader(info.context, User).queue([row['mentor'] for row in rows], group='admin_stats')
+        return rows
+
+    def resolve_rating_distribution(parent, info):
+        counts = stats.totals(stats.REVIEWS_BY_MENTOR, [f'stars_{stars}' for stars in stats.STARS])
+        return [RatingCount(stars=stars, count=counts[f'stars_{stars}']) for stars in stats.STARS]
+
+    def resolve_acceptance_rate(parent, info):
+        return stats.acceptance_rate(parent.session_totals())
+
+    def resolve_completion_rate(parent, info):
+        return stats.completion_rate(parent.session_totals())
+
+    def resolve_refreshed_at(parent, info):
+        return stats.get_watermark()
+
+class AdminStatsQuery(graphene.ObjectType):
+    admin_stats = graphene.Field(AdminStats)
+
+    def resolve_admin_stats(self, info):
+        if not get_principal(info.context).is_staff:
+            raise GraphQLError('Not authorized')
+        # Catches the rollups up with recent writes, at most every ADMIN_STATS['REFRESH_INTERVAL']
+        stats.refresher.maybe_refresh()
+        return AdminStats()
 
 class Query(
     users.schema.Query, 
     mentorship.schema.Query,
     reviews.schema.Query,
+    AdminStatsQuery,
     graphene.ObjectType
 ):
     pass
@@ -23,4 +124,10 @@ class Mutation(
 ):
     pass
 
-schema = graphene.Schema(query=Query, mutation=Mutation)
\ No newline at end of file
+class Subscription(
+    mentorship.schema.Subscription,
+    graphene.ObjectType
+):
+    pass
+
+schema = graphene.Schema(query=Query, mutation=Mutation, subscription=Subscription)
\ No newline at end of file
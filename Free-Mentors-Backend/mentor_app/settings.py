@@ -1,7 +1,9 @@
 import os
 from pathlib import Path
 from dotenv import load_dotenv
-from mongoengine import connect
+from mentor_app import slow_ops
+from mentor_app.mongo import register_connections
+from mentor_app.metrics import MongoCommandMetrics
 from urllib.parse import quote_plus
 from datetime import timedelta
 
@@ -23,11 +25,58 @@ MONGO_PORT = int(os.environ.get('MONGO_PORT', 27017))  # Default MongoDB port
 # Construct the MongoDB URI
 MONGO_URI = f"mongodb://{username}:{password}@{MONGO_HOST}:{MONGO_PORT}/{MONGO_DB_NAME}?authSource=admin"
 
-# MongoEngine Connection
-connect(
+# Prometheus metrics at /metrics: resolver timings (GRAPHENE middleware below)
+# and Mongo command timings (this listener). Off means neither is installed.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True').lower() == 'true'
+
+# Slow Mongo command log (mentor_app/slow_ops.py): commands slower than
+# THRESHOLD_MS are logged with their GraphQL field and redacted filter, kept in
+# a RING_SIZE ring (/slow-ops/, `manage.py slow_ops`) and a sampled few are
+# explained in the background, at most EXPLAINS_PER_MINUTE.
+SLOW_OPS = {
+    'ENABLED': os.environ.get('SLOW_OPS_ENABLED', 'True').lower() == 'true',
+    'THRESHOLD_MS': int(os.environ.get('SLOW_OPS_THRESHOLD_MS', 100)),
+    'RING_SIZE': int(os.environ.get('SLOW_OPS_RING_SIZE', 200)),
+    'EXPLAIN_SAMPLE_RATE': float(os.environ.get('SLOW_OPS_EXPLAIN_SAMPLE_RATE', 0.1)),
+    'EXPLAINS_PER_MINUTE': int(os.environ.get('SLOW_OPS_EXPLAINS_PER_MINUTE', 6)),
+    'PLAN_TTL': 600,  # seconds an explained filter shape isn't explained again
+}
+
+# MongoClient pool, per process and per alias. WAIT_QUEUE_TIMEOUT_MS bounds
+# how long a request waits for a free connection once all MAX_POOL_SIZE are in
+# use. COMPRESSORS is a comma separated list (e.g. 'zstd,snappy,zlib'; zstd and
+# snappy need their python packages); empty sends uncompressed.
+MONGO_POOL = {
+    'MAX_POOL_SIZE': int(os.environ.get('MONGO_MAX_POOL_SIZE', 100)),
+    'MIN_POOL_SIZE': int(os.environ.get('MONGO_MIN_POOL_SIZE', 0)),
+    'WAIT_QUEUE_TIMEOUT_MS': int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', 5000)),
+    'SERVER_SELECTION_TIMEOUT_MS': int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 10000)),
+    'COMPRESSORS': os.environ.get('MONGO_COMPRESSORS', ''),
+}
+
+# Read-only public resolvers (mentors, mentorReviews, allReviews) read from a
+# secondaryPreferred alias. On a replica set their results may trail a write by
+# the replication lag; on a standalone server secondaryPreferred simply reads
+# the primary. The response cache doesn't store results for SETTLE_TIME seconds
+# after a write to what they depend on, so it never holds them stale for its TTL.
+MONGO_SECONDARY_READS = os.environ.get('MONGO_SECONDARY_READS', 'True').lower() == 'true'
+
+# MongoEngine connections. Only registered here: each client is created on
+# first use, and again in a forked worker (see mentor_app/mongo.py).
+register_connections(
     db=MONGO_DB_NAME,
     host=MONGO_URI,
     port=MONGO_PORT,
+    secondary_reads=MONGO_SECONDARY_READS,
+    maxPoolSize=MONGO_POOL['MAX_POOL_SIZE'],
+    minPoolSize=MONGO_POOL['MIN_POOL_SIZE'],
+    waitQueueTimeoutMS=MONGO_POOL['WAIT_QUEUE_TIMEOUT_MS'],
+    serverSelectionTimeoutMS=MONGO_POOL['SERVER_SELECTION_TIMEOUT_MS'],
+    **({'compressors': MONGO_POOL['COMPRESSORS']} if MONGO_POOL['COMPRESSORS'] else {}),
+    event_listeners=(
+        ([MongoCommandMetrics()] if METRICS_ENABLED else [])
+        + ([slow_ops.install(SLOW_OPS)] if SLOW_OPS['ENABLED'] else [])
+    ),
 )
 
 # Django settings
@@ -36,6 +85,32 @@ DEBUG = os.environ.get('DEBUG', 'False').lower() == 'true'  # Ensure DEBUG is a
 
 ALLOWED_HOSTS = ['localhost', '127.0.0.1', 'web']  # Add 'web' for Docker
 
+# Whole-response cache for the public read queries (mentors, mentor,
+# mentorReviews), see mentor_app/response_cache.py. Entries live in the CACHE
+# alias below and are dropped through tags by the mutations that change them.
+# With several server processes point it at a shared backend (e.g. memcached),
+# otherwise invalidations only reach the process that made the change.
+GRAPHQL_RESPONSE_CACHE = {
+    'ENABLED': os.environ.get('GRAPHQL_RESPONSE_CACHE', 'True').lower() == 'true',
+    'CACHE': 'graphql_responses',
+    'TTL': int(os.environ.get('GRAPHQL_RESPONSE_CACHE_TTL', 60)),
+    'WAIT_TIMEOUT': 5,  # seconds a concurrent miss waits for the first one
+    # Seconds after an invalidation during which results aren't stored, longer than the replication lag
+    'SETTLE_TIME': int(os.environ.get('GRAPHQL_RESPONSE_CACHE_SETTLE_TIME', 5 if MONGO_SECONDARY_READS else 0)),
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # locmem evicts least recently used entries past MAX_ENTRIES
+    'graphql_responses': {
+        'BACKEND': os.environ.get('GRAPHQL_RESPONSE_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('GRAPHQL_RESPONSE_CACHE_LOCATION', 'graphql-responses'),
+        'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('GRAPHQL_RESPONSE_CACHE_SIZE', 1000))},
+    },
+}
+
 # GraphQL JWT settings
 GRAPHQL_JWT = {
     'JWT_VERIFY_EXPIRATION': True,
@@ -76,7 +151,97 @@ GRAPHENE = {
     "SCHEMA": "mentor_app.schema.schema",
     "MIDDLEWARE": [
         "graphql_jwt.middleware.JSONWebTokenMiddleware",
-    ],
+    ]
+    + (["mentor_app.metrics.ResolverMetricsMiddleware"] if METRICS_ENABLED else [])
+    + (["mentor_app.slow_ops.SlowOperationMiddleware"] if SLOW_OPS['ENABLED'] else []),
+}
+
+# Parsed/validated documents kept per process, and how long automatic persisted
+# queries stay in the Django cache (None = until evicted)
+GRAPHQL_DOCUMENT_CACHE_SIZE = int(os.environ.get('GRAPHQL_DOCUMENT_CACHE_SIZE', 500))
+GRAPHQL_PERSISTED_QUERY_TTL = None
+
+# Static cost analysis (mentor_app/cost.py). Operations costing more than
+# MAX_COST are rejected before execution; BUDGET_PER_MINUTE, when set, caps the
+# total cost one client may spend per minute. WEIGHTS overrides per-field
+# weights, e.g. {'Query.allReviews': 3}.
+GRAPHQL_COST = {
+    'MAX_COST': int(os.environ.get('GRAPHQL_MAX_COST', 5000)),
+    'BUDGET_PER_MINUTE': int(os.environ['GRAPHQL_COST_BUDGET_PER_MINUTE']) if os.environ.get('GRAPHQL_COST_BUDGET_PER_MINUTE') else None,
+    'ASSUMED_LIST_SIZE': 50,
+    'WEIGHTS': {},
+}
+
+# Size of the thread pool the async /graphql/async/ endpoint runs resolvers in.
+# Keep it at or below MONGO_POOL['MAX_POOL_SIZE'].
+GRAPHQL_ASYNC_WORKERS = int(os.environ.get('GRAPHQL_ASYNC_WORKERS', 10))
+
+# JSON encoder of GraphQL responses and NDJSON exports (mentor_app.encoding):
+# 'orjson', 'json' (stdlib) or 'auto' (orjson if installed)
+GRAPHQL_JSON_ENCODER = os.environ.get('GRAPHQL_JSON_ENCODER', 'auto')
+
+# gzip/brotli compression of GraphQL and export responses (mentor_app.compression),
+# negotiated from Accept-Encoding. Bodies under MIN_SIZE bytes go out as they
+# are; brotli is only offered when the brotli package is installed.
+RESPONSE_COMPRESSION = {
+    'ENABLED': os.environ.get('RESPONSE_COMPRESSION', 'True').lower() == 'true',
+    'MIN_SIZE': int(os.environ.get('RESPONSE_COMPRESSION_MIN_SIZE', 1024)),
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 4,  # 0-11; higher is smaller but much slower on large bodies
+    'CONTENT_TYPES': ('application/json', 'application/x-ndjson', 'text/csv'),
+}
+
+# Both GraphQL endpoints also take a JSON array of operations and answer with
+# an array of results. MAX_SIZE operations per request at most; WORKERS is the
+# thread pool that runs the queries of a batch concurrently on /graphql/.
+GRAPHQL_BATCH = {
+    'MAX_SIZE': int(os.environ.get('GRAPHQL_BATCH_MAX_SIZE', 10)),
+    'WORKERS': int(os.environ.get('GRAPHQL_BATCH_WORKERS', 10)),
+}
+
+# GraphQL subscriptions over WebSocket (ASGI only, mentor_app/subscriptions.py).
+# BROKER 'local' only sees the writes of its own process, so with more than one
+# worker use 'mongo' (a change stream; needs a replica set). QUEUE_SIZE events
+# are buffered per subscription before a slow client is cut off.
+SUBSCRIPTIONS = {
+    'BROKER': os.environ.get('SUBSCRIPTIONS_BROKER', 'local'),
+    'MAX_CONNECTIONS': int(os.environ.get('SUBSCRIPTIONS_MAX_CONNECTIONS', 10000)),
+    'MAX_SUBSCRIPTIONS_PER_CONNECTION': 10,
+    'QUEUE_SIZE': 100,
+    'CONNECTION_INIT_TIMEOUT': 10,  # seconds to send connection_init
+    'REAUTH_INTERVAL': 30,  # seconds between token checks of an idle connection
+}
+
+# Cursor pagination for list queries (users, mentors, allSessions, allReviews)
+GRAPHQL_PAGE_SIZE = int(os.environ.get('GRAPHQL_PAGE_SIZE', 20))
+GRAPHQL_MAX_PAGE_SIZE = int(os.environ.get('GRAPHQL_MAX_PAGE_SIZE', 100))
+
+# Rows fetched per cursor round trip (and per reference lookup) by the
+# /export/ endpoints; memory use grows with it, not with the export size
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+
+# Most ids one bulk mutation (changeToMentorBulk, ...) accepts
+GRAPHQL_MAX_BULK_SIZE = int(os.environ.get('GRAPHQL_MAX_BULK_SIZE', 10000))
+
+# searchMentors ranking: 'text' uses the Mongo text index, 'python' ranks in
+# process (for mongomock), 'auto' picks 'python' only under mongomock
+MENTOR_SEARCH_BACKEND = os.environ.get('MENTOR_SEARCH_BACKEND', 'auto')
+
+# recommendedMentors (users.recommend): every worker keeps a hashed TF-IDF
+# index of all mentors in memory (roughly 12 bytes per distinct term per
+# mentor), built on the first query and caught up with mentors changed by
+# other workers every REFRESH_INTERVAL seconds. FEATURES is the number of hash
+# buckets and must be a power of two; TAIL_LIMIT is how many changed entries
+# are kept unsorted before they are merged into the index. Queries are cut to
+# their MAX_QUERY_TERMS most specific terms, which bounds their latency.
+MENTOR_RECOMMENDATIONS = {
+    'FEATURES': 2 ** 18,
+    'BATCH_SIZE': 5000,
+    'TAIL_LIMIT': 50000,
+    'MAX_QUERY_TERMS': 32,
+    'REFRESH_INTERVAL': int(os.environ.get('MENTOR_RECOMMENDATIONS_REFRESH_INTERVAL', 60)),
+    'CLOCK_SKEW': 5,
+    'SESSION_HISTORY': 20,  # recent sessions of the mentee whose topics count
 }
 
 GRAPHQL_JWT = {
@@ -86,6 +251,47 @@ GRAPHQL_JWT = {
     'JWT_ALLOW_REFRESH': True,
 }
 
+# Optional process-wide token -> user cache used by users.utils.get_authenticated_user.
+# Entries are evicted LRU past MAX_SIZE, expire after TTL seconds and are dropped
+# when UpdateUser/ChangeToMentor change the user.
+AUTH_USER_CACHE = {
+    'ENABLED': os.environ.get('AUTH_USER_CACHE', 'False').lower() == 'true',
+    'MAX_SIZE': int(os.environ.get('AUTH_USER_CACHE_SIZE', 1024)),
+    'TTL': int(os.environ.get('AUTH_USER_CACHE_TTL', 60)),
+}
+
+# adminStats reads rollup collections (mentor_app.stats). A query first catches
+# them up with sessions and reviews changed since the last refresh, at most
+# every REFRESH_INTERVAL seconds per process; BATCH_SIZE mentors or days are
+# re-aggregated per $merge. `manage.py rebuild_admin_stats` rebuilds them all.
+ADMIN_STATS = {
+    'REFRESH_INTERVAL': int(os.environ.get('ADMIN_STATS_REFRESH_INTERVAL', 60)),
+    'CLOCK_SKEW': 5,  # seconds of updated_at overlap between refreshes
+    'BATCH_SIZE': 500,
+}
+
+# Stateless authorization (users.utils.get_principal): tokens carry signed
+# user_type/is_staff/token version claims, and permission checks read them
+# without a Mongo round trip. Role changes and logouts reach other processes
+# within REFRESH_INTERVAL seconds (the process that made them at once).
+# MODE 'database' loads the user on every request instead.
+AUTH_CLAIMS = {
+    'MODE': os.environ.get('AUTH_MODE', 'claims'),
+    'REFRESH_INTERVAL': int(os.environ.get('AUTH_REFRESH_INTERVAL', 30)),
+    'CLOCK_SKEW': 5,  # seconds of updated_at overlap between refreshes
+}
+
+# bcrypt runs in a process pool so logins don't starve the request workers.
+# When MAX_PENDING operations are already queued new ones are rejected at once.
+# Stored hashes with a different cost are rehashed on the next successful login.
+PASSWORD_HASHING = {
+    'BCRYPT_ROUNDS': int(os.environ.get('BCRYPT_ROUNDS', 12)),
+    'WORKERS': int(os.environ.get('PASSWORD_HASHING_WORKERS', os.cpu_count() or 1)),
+    'MAX_PENDING': int(os.environ.get('PASSWORD_HASHING_MAX_PENDING', 64)),
+    'TIMEOUT': int(os.environ.get('PASSWORD_HASHING_TIMEOUT', 10)),
+    'USE_PROCESS_POOL': os.environ.get('PASSWORD_HASHING_POOL', 'True').lower() == 'true',
+}
+
 GRAPHQL_AUTH = {
     "USER_STATUS": False  # This prevents Django from registering the UserStatus model
 }
@@ -112,6 +318,7 @@ INSTALLED_APPS = [
 ]
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'mentor_app.compression.CompressionMiddleware',  # before anything that reads the body
     'django.contrib.sessions.middleware.SessionMiddleware',  # Correct placement here
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -0,0 +1,224 @@
+# mentor_app/slow_ops.py
+"""
+Slow Mongo command log.
+
+A pymongo listener notices commands slower than THRESHOLD_MS and records which
+GraphQL operation and field sent them, the shape of their filter with every
+value redacted, and (sampled and rate-limited) the winning plan from an
+explain run in the background. Records are logged to `mentor_app.slow_ops`
+and kept in a bounded in-memory ring, served at /slow-ops/ to staff and
+printed by `manage.py slow_ops`.
+
+Like mentor_app.metrics this is imported from settings, so nothing here may
+touch Django at import time.
+"""
+import json
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from graphql import get_named_type, is_leaf_type
+from pymongo import monitoring
+
+from .cache import LRUCache
+
+logger = logging.getLogger('mentor_app.slow_ops')
+
+# Commands that can be explained, and the field holding their filter
+EXPLAINABLE = {'find': 'filter', 'aggregate': 'pipeline', 'count': 'query', 'distinct': 'query'}
+FILTER_FIELDS = dict(EXPLAINABLE, findAndModify='query', update='updates', delete='deletes')
+
+_current = threading.local()
+
+
+def redact(value):
+    """The shape of a filter: keys and operators are kept, every value becomes '?'."""
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)) and value and all(isinstance(item, dict) for item in value):
+        return [redact(item) for item in value]  # $or/$and clauses, pipeline stages
+    return '?'
+
+
+def filter_shape(command_name, command):
+    field = FILTER_FIELDS.get(command_name)
+    if field is None or field not in command:
+        return None
+    value = command[field]
+    if command_name in ('update', 'delete'):
+        # Write commands carry a list of statements; their filters are under 'q'
+        value = [statement.get('q', {}) for statement in value]
+    return redact(value)
+
+
+def _find_winning_plan(explained):
+    if isinstance(explained, dict):
+        if 'winningPlan' in explained:
+            plan = explained['winningPlan']
+            return plan.get('queryPlan', plan)  # slot-based engine nests it once more
+        explained = list(explained.values())
+    if isinstance(explained, list):
+        for item in explained:
+            plan = _find_winning_plan(item)
+            if plan is not None:
+                return plan
+    return None
+
+
+def plan_summary(plan):
+    """e.g. 'FETCH <- IXSCAN mentor_1_status_1_created_at_-1' or 'COLLSCAN'."""
+    stages = []
+    while plan:
+        stage = plan.get('stage', '?')
+        if plan.get('indexName'):
+            stage += f" {plan['indexName']}"
+        stages.append(stage)
+        plan = plan.get('inputStage') or (plan.get('inputStages') or [None])[0]
+    return ' <- '.join(stages)
+
+
+def describe_field(info):
+    """(operation name, field path) of a resolver's info, or (None, None)."""
+    if info is None:
+        return None, None
+    operation = info.operation.name.value if info.operation.name else None
+    return operation, '.'.join(str(key) for key in info.path.as_list())
+
+
+class SlowOperationMiddleware:
+    """Graphene middleware remembering which field is resolving, for SlowCommandListener."""
+
+    def resolve(self, next, root, info, **kwargs):
+        # Scalars below the root never query Mongo themselves
+        if info.path.prev is not None and is_leaf_type(get_named_type(info.return_type)):
+            return next(root, info, **kwargs)
+
+        previous = getattr(_current, 'info', None)
+        _current.info = info
+        try:
+            return next(root, info, **kwargs)
+        finally:
+            _current.info = previous
+
+
+class SlowCommandListener(monitoring.CommandListener):
+    """
+    pymongo listener feeding the slow operation ring. Explains run on one
+    background thread, only for a SAMPLE_RATE share of slow commands, at most
+    EXPLAINS_PER_MINUTE, and once per filter shape every PLAN_TTL seconds.
+    """
+
+    def __init__(self, options):
+        self.threshold = options.get('THRESHOLD_MS', 100) / 1000.0
+        self.sample_rate = options.get('EXPLAIN_SAMPLE_RATE', 0.1)
+        self.explains_per_minute = options.get('EXPLAINS_PER_MINUTE', 6)
+        self.records = deque(maxlen=options.get('RING_SIZE', 200))
+        self._plans = LRUCache(maxsize=256, ttl=options.get('PLAN_TTL', 600))
+        self._pending = threading.local()
+        self._lock = threading.Lock()
+        self._tokens = self.explains_per_minute
+        self._refilled = time.monotonic()
+        self._executor = None
+
+    def started(self, event):
+        if event.command_name == 'explain':
+            return
+        # The command and field are only inspected if the command turns out to be slow
+        self._pending.__dict__[event.request_id] = (event.command, getattr(_current, 'info', None))
+
+    def succeeded(self, event):
+        self._finish(event, None)
+
+    def failed(self, event):
+        self._finish(event, str(event.failure.get('errmsg', event.failure)))
+
+    def _finish(self, event, failure):
+        pending = self._pending.__dict__.pop(event.request_id, None)
+        if pending is None or event.duration_micros < self.threshold * 1e6:
+            return
+        command, info = pending
+        operation, path = describe_field(info)
+        collection = command.get(event.command_name)
+        shape = filter_shape(event.command_name, command)
+        record = {
+            'time': datetime.now(timezone.utc).isoformat(),
+            'operation': operation,
+            'path': path,
+            'database': event.database_name,
+            'collection': collection if isinstance(collection, str) else None,
+            'command': event.command_name,
+            'duration_ms': round(event.duration_micros / 1000.0, 1),
+            'filter': shape,
+            'failure': failure,
+            'plan': None,
+            'explain': 'skipped',
+        }
+        self.records.append(record)
+        logger.warning('slow mongo command %s', json.dumps(record, default=str), extra={'slow_operation': record})
+
+        if event.command_name in EXPLAINABLE and failure is None:
+            self._explain(record, event.database_name, command)
+
+    def _explain(self, record, database, command):
+        key = json.dumps([record['collection'], record['command'], record['filter']], sort_keys=True)
+        plan = self._plans.get(key)
+        if plan is not None:
+            record.update(plan=plan, explain='cached')
+            return
+        if random.random() >= self.sample_rate or not self._take_token():
+            return
+
+        record['explain'] = 'pending'
+        explained = {
+            name: value for name, value in command.items()
+            if not name.startswith('$') and name not in ('lsid', 'txnNumber', 'autocommit', 'startTransaction')
+        }
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='slow-ops-explain')
+        self._executor.submit(self._run_explain, record, key, database, explained)
+
+    def _take_token(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.explains_per_minute,
+                self._tokens + (now - self._refilled) * self.explains_per_minute / 60.0,
+            )
+            self._refilled = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def _run_explain(self, record, key, database, command):
+        from mongoengine.connection import get_connection
+
+        try:
+            explained = get_connection()[database].command({'explain': command, 'verbosity': 'queryPlanner'})
+            plan = plan_summary(_find_winning_plan(explained))
+        except Exception as e:
+            record['explain'] = f'error: {e}'
+            return
+        self._plans.set(key, plan)
+        record.update(plan=plan, explain='done')
+        logger.info('explain for slow %s on %s: %s', record['command'], record['collection'], plan,
+                    extra={'slow_operation': record})
+
+    def recent(self, limit=None):
+        records = list(self.records)[::-1]
+        return [dict(record) for record in records[:limit]]
+
+
+# The listener installed by settings, if SLOW_OPS is enabled
+listener = None
+
+
+def install(options):
+    global listener
+    listener = SlowCommandListener(options)
+    return listener
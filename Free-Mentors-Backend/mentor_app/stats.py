@@ -0,0 +1,234 @@
+# mentor_app/stats.py
+"""
+Rollups behind the `adminStats` query, so dashboards read a few rows per
+mentor and per day instead of every session and review.
+
+Three rollup collections are kept:
+  stats_sessions_by_mentor - session counts per status, one row per mentor
+  stats_sessions_by_day    - session counts per status, one row per creation day
+  stats_reviews_by_mentor  - review counts per star rating, one row per mentor
+
+A status change moves a session from one count to another, so rows can't be
+maintained by adding up changes. Instead each refresh reads the sessions and
+reviews whose `updated_at` is past the last watermark, collects the mentors
+and days they belong to, and re-aggregates only those rows from the raw
+collections with `$merge`. A full rebuild (`manage.py rebuild_admin_stats`)
+re-aggregates everything, e.g. after writes that bypassed the API.
+"""
+import datetime
+import threading
+import time
+
+from django.conf import settings
+from mongoengine.connection import get_db
+from pymongo import ReplaceOne
+
+from mentorship.models import MentorshipSession
+from reviews.models import Review
+
+SESSIONS_BY_MENTOR = 'stats_sessions_by_mentor'
+SESSIONS_BY_DAY = 'stats_sessions_by_day'
+REVIEWS_BY_MENTOR = 'stats_reviews_by_mentor'
+WATERMARKS = 'stats_watermarks'
+
+STATUSES = [status for status, _ in MentorshipSession.STATUS_CHOICES]
+STARS = range(1, 6)
+DAY_FORMAT = '%Y-%m-%d'
+
+
+def stats_settings():
+    options = getattr(settings, 'ADMIN_STATS', {})
+    return {
+        'REFRESH_INTERVAL': options.get('REFRESH_INTERVAL', 60),
+        'CLOCK_SKEW': options.get('CLOCK_SKEW', 5),
+        'BATCH_SIZE': options.get('BATCH_SIZE', 500),
+    }
+
+
+def _count_where(field, value):
+    return {'$sum': {'$cond': [{'$eq': [field, value]}, 1, 0]}}
+
+
+def _status_counts():
+    return dict({status: _count_where('$status', status) for status in STATUSES}, total={'$sum': 1})
+
+
+def _day(field):
+    return {'$dateToString': {'format': DAY_FORMAT, 'date': field}}
+
+
+def _sessions_by_mentor(match):
+    return [{'$match': match}, {'$group': {'_id': '$mentor', **_status_counts()}}]
+
+
+def _sessions_by_day(match):
+    return [{'$match': match}, {'$group': {'_id': _day('$created_at'), **_status_counts()}}]
+
+
+def _reviews_by_mentor(session_match):
+    # From the sessions side, so a batch of mentors walks the mentor index and reviews.session
+    return [
+        {'$match': session_match},
+        {'$project': {'mentor': True}},
+        {'$lookup': {'from': Review._get_collection_name(), 'localField': '_id', 'foreignField': 'session', 'as': 'review'}},
+        {'$unwind': '$review'},
+        {'$group': {
+            '_id': '$mentor',
+            **{f'stars_{stars}': _count_where('$review.rating', stars) for stars in STARS},
+            'hidden': _count_where('$review.is_visible', False),
+            'total': {'$sum': 1},
+        }},
+    ]
+
+
+def _merge(source, pipeline, into):
+    """Replace the rows of `into` with the rows `pipeline` produces; returns their _ids."""
+    if type(source).__module__.startswith('mongomock'):
+        # mongomock has no $merge; write the rows the way it would
+        rows = list(source.aggregate(pipeline))
+        if rows:
+            get_db()[into].bulk_write([ReplaceOne({'_id': row['_id']}, row, upsert=True) for row in rows])
+        return {row['_id'] for row in rows}
+    source.aggregate(pipeline + [
+        {'$merge': {'into': into, 'on': '_id', 'whenMatched': 'replace', 'whenNotMatched': 'insert'}},
+    ], allowDiskUse=True)
+    # Every rollup pipeline ends in its $group; the keys alone skip the counting
+    keys_only = pipeline[:-1] + [{'$group': {'_id': pipeline[-1]['$group']['_id']}}]
+    return {row['_id'] for row in source.aggregate(keys_only, allowDiskUse=True)}
+
+
+def _drop_stale(into, produced, keys=None):
+    # Rows whose key has nothing left to count. Decided by what this run found
+    # in the raw collections, never by which run wrote a row last, so workers
+    # refreshing the same rows at once can't delete each other's
+    if keys is None:
+        keys = [row['_id'] for row in get_db()[into].find({}, {'_id': True})]
+    stale = [key for key in keys if key not in produced]
+    for chunk in _chunks(stale, stats_settings()['BATCH_SIZE']):
+        get_db()[into].delete_many({'_id': {'$in': chunk}})
+
+
+def _chunks(values, size):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _day_range(day):
+    start = datetime.datetime.strptime(day, DAY_FORMAT)
+    return {'created_at': {'$gte': start, '$lt': start + datetime.timedelta(days=1)}}
+
+
+def rebuild():
+    """Re-aggregate every rollup from scratch; returns the new watermark."""
+    started = datetime.datetime.utcnow()
+    sessions = MentorshipSession._get_collection()
+    for pipeline, into in (
+        (_sessions_by_mentor({}), SESSIONS_BY_MENTOR),
+        (_sessions_by_day({}), SESSIONS_BY_DAY),
+        (_reviews_by_mentor({}), REVIEWS_BY_MENTOR),
+    ):
+        _drop_stale(into, _merge(sessions, pipeline, into))
+    _set_watermark(started)
+    return started
+
+
+def refresh():
+    """
+    Bring the rollups up to date with what changed since the watermark; the
+    first refresh ever is a full rebuild. Returns the new watermark.
+    """
+    watermark = get_watermark()
+    if watermark is None:
+        return rebuild()
+
+    options = stats_settings()
+    batch_size = options['BATCH_SIZE']
+    skew = datetime.timedelta(seconds=options['CLOCK_SKEW'])
+    started = datetime.datetime.utcnow()
+    # updated_at is set by application clocks, overlap a little for their skew
+    changed = {'updated_at': {'$gte': watermark - skew}}
+    sessions = MentorshipSession._get_collection()
+
+    mentors, days = set(), set()
+    for row in sessions.aggregate([
+        {'$match': changed},
+        {'$group': {'_id': {'mentor': '$mentor', 'day': _day('$created_at')}}},
+    ]):
+        mentors.add(row['_id'].get('mentor'))
+        days.add(row['_id'].get('day'))
+    review_mentors = {
+        row['_id'] for row in Review._get_collection().aggregate([
+            {'$match': changed},
+            {'$lookup': {'from': sessions.name, 'localField': 'session', 'foreignField': '_id', 'as': 'session'}},
+            {'$unwind': '$session'},
+            {'$group': {'_id': '$session.mentor'}},
+        ])
+    }
+
+    for chunk in _chunks(mentors, batch_size):
+        produced = _merge(sessions, _sessions_by_mentor({'mentor': {'$in': chunk}}), SESSIONS_BY_MENTOR)
+        _drop_stale(SESSIONS_BY_MENTOR, produced, chunk)
+    for chunk in _chunks(sorted(day for day in days if day), batch_size):
+        produced = _merge(sessions, _sessions_by_day({'$or': [_day_range(day) for day in chunk]}), SESSIONS_BY_DAY)
+        _drop_stale(SESSIONS_BY_DAY, produced, chunk)
+    for chunk in _chunks(review_mentors, batch_size):
+        produced = _merge(sessions, _reviews_by_mentor({'mentor': {'$in': chunk}}), REVIEWS_BY_MENTOR)
+        _drop_stale(REVIEWS_BY_MENTOR, produced, chunk)
+
+    _set_watermark(started)
+    return started
+
+
+def get_watermark():
+    row = get_db()[WATERMARKS].find_one({'_id': 'admin_stats'})
+    return row['updated_at'] if row else None
+
+
+def _set_watermark(value):
+    # $max: a slow refresh finishing late never moves the watermark back
+    get_db()[WATERMARKS].update_one({'_id': 'admin_stats'}, {'$max': {'updated_at': value}}, upsert=True)
+
+
+class Refresher:
+    """
+    Refreshes the rollups at most every REFRESH_INTERVAL seconds per process,
+    from whichever adminStats request notices first; the others read the
+    rollups as they are rather than wait.
+    """
+
+    def __init__(self):
+        self._next_refresh = 0
+        self._lock = threading.Lock()
+
+    def maybe_refresh(self):
+        if time.monotonic() < self._next_refresh or not self._lock.acquire(blocking=False):
+            return
+        try:
+            refresh()
+            self._next_refresh = time.monotonic() + stats_settings()['REFRESH_INTERVAL']
+        finally:
+            self._lock.release()
+
+
+refresher = Refresher()
+
+
+def totals(into, fields):
+    """Sums of `fields` over every row of a rollup, computed by the server."""
+    rows = list(get_db()[into].aggregate([
+        {'$group': dict({'_id': None}, **{field: {'$sum': f'${field}'} for field in fields})},
+    ]))
+    return {field: rows[0][field] if rows else 0 for field in fields}
+
+
+def acceptance_rate(counts):
+    # Of the sessions a mentor decided on, the share they accepted
+    decided = counts['approved'] + counts['completed'] + counts['declined']
+    return round((counts['approved'] + counts['completed']) / decided, 4) if decided else None
+
+
+def completion_rate(counts):
+    # Of the accepted sessions, the share that were completed
+    accepted = counts['approved'] + counts['completed']
+    return round(counts['completed'] / accepted, 4) if accepted else None
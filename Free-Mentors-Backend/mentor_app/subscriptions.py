@@ -0,0 +1,320 @@
+# mentor_app/subscriptions.py
+"""
+GraphQL over WebSocket for the ASGI app, speaking the graphql-transport-ws
+protocol (the one of the `graphql-ws` client library).
+
+The client authenticates in the `connection_init` payload
+({"Authorization": "Bearer <token>"}). The token is checked again, through
+get_principal like any HTTP request, for every subscribe and every event, and
+every REAUTH_INTERVAL seconds on an idle connection: once it expires the
+connection is closed with 4401, once it's revoked with 4403. Only
+subscriptions are served; queries and mutations go to /graphql/. Subscription
+events are executed like the async endpoint executes queries, with the
+resolvers in its thread pool, so a slow Mongo lookup never blocks the event
+loop the other connections share.
+
+Limits (SUBSCRIPTIONS in settings): MAX_CONNECTIONS per process,
+MAX_SUBSCRIPTIONS_PER_CONNECTION, and QUEUE_SIZE events buffered per
+subscription; a subscriber that falls further behind gets an error and has to
+resubscribe. Subscribing is charged against the client's GRAPHQL_COST budget
+like an HTTP operation.
+"""
+import asyncio
+import inspect
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from graphql import (
+    ExecutionResult, GraphQLError, OperationType, execute, get_operation_ast, parse, validate,
+)
+from graphql.execution import create_source_event_stream
+
+from users.utils import get_principal, token_expiry
+from .cost import operation_cost
+from .pubsub import SubscriberOverflow
+from .schema import schema
+from .views import ThreadedRootExecutionContext, check_cost
+
+PROTOCOL = 'graphql-transport-ws'
+
+# Close codes of the protocol
+BAD_REQUEST = 4400
+UNAUTHORIZED = 4401
+FORBIDDEN = 4403
+SUBPROTOCOL_NOT_ACCEPTABLE = 4406
+INIT_TIMEOUT = 4408
+DUPLICATE_SUBSCRIBER = 4409
+TOO_MANY_INITS = 4429
+TRY_AGAIN_LATER = 1013
+
+
+def subscription_settings():
+    options = getattr(settings, 'SUBSCRIPTIONS', {})
+    return {
+        'MAX_CONNECTIONS': options.get('MAX_CONNECTIONS', 10000),
+        'MAX_SUBSCRIPTIONS_PER_CONNECTION': options.get('MAX_SUBSCRIPTIONS_PER_CONNECTION', 10),
+        'CONNECTION_INIT_TIMEOUT': options.get('CONNECTION_INIT_TIMEOUT', 10),
+        'REAUTH_INTERVAL': options.get('REAUTH_INTERVAL', 30),
+    }
+
+
+def role(user):
+    return user.user_type, bool(user.is_staff)
+
+
+class SubscriptionContext:
+    """Stands in for the request as `info.context`: the headers of connection_init."""
+
+    def __init__(self, headers):
+        self.headers = headers
+
+
+class CloseConnection(Exception):
+    def __init__(self, code, reason=''):
+        super().__init__(reason)
+        self.code = code
+        self.reason = reason
+
+
+class Connection:
+    def __init__(self, send, options, client=''):
+        self.send = send
+        self.options = options
+        self.client = client  # address, for the cost budget of connections without a token
+        self.headers = None
+        self.user = None
+        self.expires_at = None
+        self.deadline = None
+        self.closing = None
+        self.operations = {}
+
+    async def send_message(self, message):
+        await self.send({'type': 'websocket.send', 'text': json.dumps(message)})
+
+    async def run(self, receive):
+        loop = asyncio.get_running_loop()
+        self.closing = loop.create_future()  # set by operations that have to close the connection
+        self.deadline = loop.time() + self.options['CONNECTION_INIT_TIMEOUT']
+        reading = None
+        try:
+            while True:
+                if reading is None:
+                    reading = asyncio.ensure_future(self.receive_message(receive))
+                done, _ = await asyncio.wait(
+                    {reading, self.closing}, timeout=max(self.deadline - loop.time(), 0),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if self.closing.done():
+                    raise self.closing.result()
+                if not done:
+                    if self.user is None:
+                        raise CloseConnection(INIT_TIMEOUT, 'Connection initialisation timeout')
+                    await self.authorize()  # idle for a while, or the token just expired
+                    continue
+                message, reading = reading.result(), None
+                if message is None:
+                    return
+                await self.handle(message)
+        except CloseConnection as e:
+            await self.close(e.code, e.reason)
+        finally:
+            if reading is not None:
+                reading.cancel()
+            for task in self.operations.values():
+                task.cancel()
+
+    def abort(self, error):
+        # Close the connection from an operation's task, see run
+        if not self.closing.done():
+            self.closing.set_result(error)
+
+    async def receive_message(self, receive):
+        # The next protocol message, or None once the client has gone
+        while True:
+            event = await receive()
+            if event['type'] == 'websocket.disconnect':
+                return None
+            if event['type'] != 'websocket.receive':
+                continue
+            try:
+                message = json.loads(event.get('text') or event.get('bytes') or '')
+            except ValueError:
+                raise CloseConnection(BAD_REQUEST, 'Invalid message received')
+            if not isinstance(message, dict) or not isinstance(message.get('type'), str):
+                raise CloseConnection(BAD_REQUEST, 'Invalid message received')
+            return message
+
+    async def close(self, code, reason=''):
+        await self.send({'type': 'websocket.close', 'code': code, 'reason': reason})
+
+    async def handle(self, message):
+        kind = message['type']
+        if kind == 'connection_init':
+            await self.init(message.get('payload') or {})
+        elif kind == 'ping':
+            await self.send_message({'type': 'pong'})
+        elif kind == 'pong':
+            pass
+        elif self.user is None:
+            raise CloseConnection(UNAUTHORIZED, 'Unauthorized')
+        elif kind == 'subscribe':
+            await self.subscribe(message)
+        elif kind == 'complete':
+            task = self.operations.pop(message.get('id'), None)
+            if task is not None:
+                task.cancel()
+        else:
+            raise CloseConnection(BAD_REQUEST, f'Unexpected message of type {kind}')
+
+    async def init(self, payload):
+        if self.headers is not None:
+            raise CloseConnection(TOO_MANY_INITS, 'Too many initialisation requests')
+        authorization = payload.get('Authorization') or payload.get('authorization') or ''
+        self.headers = {'Authorization': authorization}
+        try:
+            self.expires_at = await sync_to_async(token_expiry, thread_sensitive=False)(SubscriptionContext(self.headers))
+        except GraphQLError as e:
+            raise CloseConnection(FORBIDDEN, e.message)
+        self.user = (await self.authorize()).user
+        await self.send_message({'type': 'connection_ack'})
+
+    async def authorize(self):
+        """
+        A fresh context for one execution, with the user resolved again from
+        the token (so reference loaders never serve stale documents either).
+        Raises CloseConnection once the token has expired or been revoked.
+        """
+        context = SubscriptionContext(self.headers)
+        try:
+            context.user = await sync_to_async(get_principal, thread_sensitive=False)(context)
+        except GraphQLError as e:
+            expired = self.expires_at is not None and time.time() >= self.expires_at
+            raise CloseConnection(UNAUTHORIZED if expired else FORBIDDEN, e.message)
+
+        loop = asyncio.get_running_loop()
+        self.deadline = loop.time() + self.options['REAUTH_INTERVAL']
+        if self.expires_at is not None:
+            self.deadline = min(self.deadline, loop.time() + self.expires_at - time.time())
+        return context
+
+    async def subscribe(self, message):
+        id = message.get('id')
+        payload = message.get('payload')
+        if not isinstance(id, str) or not isinstance(payload, dict) or not isinstance(payload.get('query'), str):
+            raise CloseConnection(BAD_REQUEST, 'Invalid subscribe message')
+        if id in self.operations:
+            raise CloseConnection(DUPLICATE_SUBSCRIBER, f'Subscriber for {id} already exists')
+        if len(self.operations) >= self.options['MAX_SUBSCRIPTIONS_PER_CONNECTION']:
+            await self.send_message({'type': 'error', 'id': id, 'payload': [{'message': 'Too many subscriptions'}]})
+            return
+
+        self.operations[id] = asyncio.ensure_future(self.operate(id, payload))
+        self.operations[id].add_done_callback(self.forget_operation(id))
+
+    def forget_operation(self, id):
+        def forget(task):
+            if self.operations.get(id) is task:
+                del self.operations[id]
+        return forget
+
+    async def operate(self, id, payload):
+        try:
+            await self.subscription(id, payload)
+        except CloseConnection as e:
+            self.abort(e)
+
+    async def subscription(self, id, payload):
+        try:
+            document = parse(payload['query'])
+        except GraphQLError as e:
+            await self.send_message({'type': 'error', 'id': id, 'payload': [e.formatted]})
+            return
+        errors = validate(schema.graphql_schema, document)
+        if errors:
+            await self.send_message({'type': 'error', 'id': id, 'payload': [error.formatted for error in errors]})
+            return
+
+        arguments = {
+            'document': document,
+            'variable_values': payload.get('variables'),
+            'operation_name': payload.get('operationName'),
+        }
+        operation = get_operation_ast(document, arguments['operation_name'])
+        if operation is None or operation.operation != OperationType.SUBSCRIPTION:
+            await self.send_message({'type': 'error', 'id': id, 'payload': [
+                {'message': 'Only subscriptions are served over WebSocket, send queries and mutations to /graphql/'},
+            ]})
+            return
+
+        context = await self.authorize()
+        cost = operation_cost(schema.graphql_schema, document, operation, arguments['variable_values'])
+        cost_error = await sync_to_async(check_cost, thread_sensitive=False)(self.headers['Authorization'] or self.client, cost)
+        if cost_error:
+            await self.send_message({'type': 'error', 'id': id, 'payload': [cost_error.formatted]})
+            return
+
+        stream = await create_source_event_stream(
+            schema.graphql_schema, context_value=context, **arguments
+        )
+        if isinstance(stream, ExecutionResult):
+            await self.send_message({'type': 'error', 'id': id, 'payload': [error.formatted for error in stream.errors]})
+            return
+        try:
+            async for event in stream:
+                fresh = await self.authorize()
+                if role(fresh.user) != role(context.user):
+                    # The events subscribed to were picked for the old role (e.g. staff see every session)
+                    await self.send_message({'type': 'error', 'id': id, 'payload': [
+                        {'message': 'Permissions changed; resubscribe'},
+                    ]})
+                    return
+                result = await self.execute(arguments, fresh, root_value=event)
+                await self.send_message({'type': 'next', 'id': id, 'payload': result.formatted})
+        except SubscriberOverflow:
+            await self.send_message({'type': 'error', 'id': id, 'payload': [
+                {'message': 'Subscriber fell behind and events were dropped; resubscribe'},
+            ]})
+            return
+        finally:
+            await stream.aclose()
+        await self.send_message({'type': 'complete', 'id': id})
+
+    async def execute(self, arguments, context, root_value=None):
+        result = execute(
+            schema.graphql_schema,
+            root_value=root_value,
+            context_value=context,
+            execution_context_class=ThreadedRootExecutionContext,
+            **arguments,
+        )
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+
+class GraphQLWebSocketApp:
+    """ASGI app for `websocket` scopes; see mentor_app/asgi.py."""
+
+    def __init__(self):
+        self.connections = 0
+
+    async def __call__(self, scope, receive, send):
+        event = await receive()
+        if event['type'] != 'websocket.connect':
+            return
+        options = subscription_settings()
+        if PROTOCOL not in scope.get('subprotocols', ()):
+            await send({'type': 'websocket.close', 'code': SUBPROTOCOL_NOT_ACCEPTABLE})
+            return
+        if self.connections >= options['MAX_CONNECTIONS']:
+            await send({'type': 'websocket.close', 'code': TRY_AGAIN_LATER})
+            return
+
+        self.connections += 1
+        try:
+            await send({'type': 'websocket.accept', 'subprotocol': PROTOCOL})
+            await Connection(send, options, (scope.get('client') or ('',))[0]).run(receive)
+        finally:
+            self.connections -= 1
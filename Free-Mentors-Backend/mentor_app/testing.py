@@ -0,0 +1,56 @@
+"""
+Base class for tests that run the GraphQL schema against an in-memory
+mongomock database; the apps' tests.py modules build on it.
+"""
+from unittest import skipIf
+
+import mongoengine
+from django.conf import settings
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from mentor_app.mongo import SECONDARY_ALIAS
+from mentor_app.schema import schema
+from users.models import User
+from users.utils import issue_token
+
+try:
+    import mongomock
+except ImportError:  # only needed by the tests
+    mongomock = None
+
+
+@skipIf(mongomock is None, 'mongomock is not installed')
+@override_settings(PASSWORD_HASHING=dict(settings.PASSWORD_HASHING, BCRYPT_ROUNDS=4, USE_PROCESS_POOL=False))
+class MongomockTestCase(SimpleTestCase):
+    documents = (User,)  # collections dropped before every test
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Separate mongomock clients don't share data, so read_only() falls back to the primary
+        mongoengine.disconnect(SECONDARY_ALIAS)
+        mongoengine.disconnect()
+        mongoengine.connect(db=settings.MONGO_DB_NAME, host='mongodb://localhost', mongo_client_class=mongomock.MongoClient)
+
+    def setUp(self):
+        for document in self.documents:
+            document.drop_collection()
+            document.ensure_indexes()  # the unique ones are part of what's tested
+
+    def user(self, email, user_type='mentee', **fields):
+        fields = dict({'first_name': 'Alex', 'last_name': 'Smith', 'address': 'Kigali', 'password': '-'}, **fields)
+        return User(email=email, user_type=user_type, **fields).save()
+
+    def request(self, token=None):
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        return RequestFactory().post('/graphql/', **headers)
+
+    def execute(self, document, token=None, **variables):
+        return schema.execute(document, variable_values=variables, context_value=self.request(token))
+
+    def execute_as(self, user, document, **variables):
+        return self.execute(document, issue_token(user), **variables)
+
+    def assertError(self, result, message):
+        self.assertIsNotNone(result.errors, 'expected an error')
+        self.assertEqual([error.message for error in result.errors], [message])
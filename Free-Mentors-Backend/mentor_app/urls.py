@@ -1,11 +1,15 @@
 from django.contrib import admin
 from django.urls import path
 from django.views.decorators.csrf import csrf_exempt
-from graphene_django.views import GraphQLView
 from . import views
 
 urlpatterns = [
     path('', views.home, name='home'),  # This will handle the root URL
     path('admin/', admin.site.urls),
-    path('graphql/', csrf_exempt(GraphQLView.as_view(graphiql=True))),
+    path('metrics', views.metrics, name='metrics'),  # Prometheus
+    path('slow-ops/', views.slow_operations, name='slow-operations'),
+    path('export/<str:name>/', views.export, name='export'),  # staff NDJSON/CSV dumps
+    path('graphql/', csrf_exempt(views.CachedGraphQLView.as_view(graphiql=True))),
+    # Native async endpoint for the ASGI app (mentor_app.asgi)
+    path('graphql/async/', views.AsyncGraphQLView.as_async_view()),
 ]
\ No newline at end of file
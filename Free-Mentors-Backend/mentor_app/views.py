@@ -1,5 +1,622 @@
 # In your app's views.py (e.g., mentor_app/views.py)
-from django.http import HttpResponse
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from graphene_django.settings import graphene_settings
+from graphene_django.views import GraphQLView, HttpError
+from graphql import ExecutionContext, ExecutionResult, FieldNode, GraphQLError, OperationType, execute, get_operation_ast, parse, print_ast, validate
+from users.utils import get_principal
+from . import encoding, export as exports, metrics as metrics_registry, response_cache, slow_ops
+from .cache import LRUCache
+from .cost import cost_settings, operation_cost
 
 def home(request):
     return HttpResponse("Welcome to the Free Mentors Backend!")
+
+
+def metrics(request):
+    # Prometheus scrape endpoint, see METRICS_ENABLED in settings
+    if not getattr(settings, 'METRICS_ENABLED', False):
+        raise Http404()
+    return HttpResponse(metrics_registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def slow_operations(request):
+    # Recent slow Mongo commands of this process, newest first; staff only
+    if slow_ops.listener is None:
+        raise Http404()
+    try:
+        user = get_principal(request)
+    except GraphQLError as e:
+        return HttpResponseForbidden(e.message)
+    if not user.is_staff:
+        return HttpResponseForbidden("Not authorized")
+    try:
+        limit = int(request.GET.get("limit", 50))
+    except ValueError:
+        return HttpResponseBadRequest("limit must be an integer")
+    # A negative limit would slice from the oldest end
+    limit = max(1, min(limit, slow_ops.listener.records.maxlen))
+    return JsonResponse({"records": slow_ops.listener.recent(limit)}, json_dumps_params={"default": str})
+
+
+def export(request, name):
+    # Staff only: /export/<sessions|reviews|users>/?format=ndjson|csv&updated_since=<ISO 8601>
+    if name not in exports.EXPORTS:
+        raise Http404()
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    try:
+        user = get_principal(request)
+    except GraphQLError as e:
+        return HttpResponseForbidden(e.message)
+    if not user.is_staff:
+        return HttpResponseForbidden("Not authorized")
+
+    output = request.GET.get("format", "ndjson")
+    if output not in ("ndjson", "csv"):
+        return HttpResponseBadRequest("format must be ndjson or csv")
+    updated_since = request.GET.get("updated_since")
+    if updated_since:
+        try:
+            updated_since = exports.parse_since(updated_since)
+        except ValueError:
+            return HttpResponseBadRequest("updated_since must be an ISO 8601 date or datetime")
+
+    rows = exports.export_rows(name, updated_since or None, getattr(settings, 'EXPORT_BATCH_SIZE', 1000))
+    if output == "csv":
+        response = StreamingHttpResponse(exports.csv_lines(rows, exports.EXPORTS[name][3]), content_type="text/csv; charset=utf-8")
+    else:
+        response = StreamingHttpResponse(exports.ndjson_lines(rows), content_type="application/x-ndjson")
+    response["Content-Disposition"] = f'attachment; filename="{name}.{output}"'
+    return response
+
+
+# Parsed and validated documents keyed by the sha256 of the query text. The
+# schema only changes on deploy, so entries never need to be invalidated.
+_document_cache = LRUCache(maxsize=getattr(settings, 'GRAPHQL_DOCUMENT_CACHE_SIZE', 500))
+_introspection_cache = LRUCache(maxsize=16)
+
+PERSISTED_QUERY_PREFIX = 'graphql:apq:'
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+def auth_scope(request):
+    # Cached responses are shared by everyone in a scope, never keyed per user
+    if not request.headers.get("Authorization"):
+        return "anonymous"
+    try:
+        user = get_principal(request)
+    except GraphQLError:
+        return "anonymous"
+    return "staff" if user.is_staff else "user"
+
+
+def check_cost(client, cost):
+    """
+    A GraphQLError if an operation of `cost` is over MAX_COST or over what
+    `client` (its Authorization header, else its address) may still spend this
+    minute, otherwise None. Shared by the HTTP views and the WebSocket endpoint.
+    """
+    options = cost_settings()
+    if cost > options['MAX_COST']:
+        return GraphQLError(f"Query cost {cost} exceeds the maximum of {options['MAX_COST']}")
+
+    budget = options['BUDGET_PER_MINUTE']
+    if budget is None or cost <= 0:
+        return None  # nothing to charge, and never a refund
+    # Per-client spend in the current minute, shared through the Django cache
+    key = "graphql:cost:{}:{}".format(hashlib.sha256(client.encode("utf-8")).hexdigest(), int(time.time() // 60))
+    cache.add(key, 0, timeout=60)
+    try:
+        spent = cache.incr(key, cost)
+    except ValueError:
+        spent = cost
+    if spent > budget:
+        return GraphQLError("Query cost budget exceeded, retry in a minute")
+    return None
+
+
+def _in_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def is_introspection(operation_ast):
+    return operation_ast is not None and all(
+        isinstance(selection, FieldNode) and selection.name.value.startswith('__')
+        for selection in operation_ast.selection_set.selections
+    )
+
+
+class ExecutionPlan:
+    """A validated operation that passed its cost check, see plan_execution."""
+
+    def __init__(self, key, document, operation_ast, variables, operation_name):
+        self.key = key
+        self.document = document
+        self.operation_ast = operation_ast
+        self.variables = variables
+        self.operation_name = operation_name
+        self.introspection_key = None
+        self.cost_extensions = None  # None for introspection, which is free
+        self.cache_key = None  # set for public read queries, see response_cache
+        self.store_result = False  # not while the data it depends on just changed
+
+
+class CachedGraphQLView(GraphQLView):
+    """
+    GraphQLView that skips parsing and validation for documents it has seen,
+    serves introspection from memory and supports automatic persisted queries
+    (`extensions.persistedQuery.sha256Hash`) on both GET and POST.
+    """
+
+    def get_graphql_params(self, request, data):
+        query, variables, operation_name, id = super().get_graphql_params(request, data)
+
+        extensions = request.GET.get("extensions") or data.get("extensions")
+        if extensions and isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+        persisted = (extensions or {}).get("persistedQuery")
+        if not persisted:
+            return query, variables, operation_name, id
+
+        sha256 = persisted.get("sha256Hash")
+        if query:
+            if query_hash(query) != sha256:
+                raise HttpError(HttpResponseBadRequest("provided sha does not match query"))
+            cache.set(PERSISTED_QUERY_PREFIX + sha256, query, timeout=getattr(settings, 'GRAPHQL_PERSISTED_QUERY_TTL', None))
+        else:
+            query = cache.get(PERSISTED_QUERY_PREFIX + str(sha256))
+            if query is None:
+                # Apollo clients retry with the full query when they see this message
+                raise HttpError(HttpResponse(status=200), "PersistedQueryNotFound")
+        return query, variables, operation_name, id
+
+    def get_document(self, query):
+        # Returns (key, document, errors); the key hashes the normalized query,
+        # so whitespace and comments don't split the response caches
+        key = query_hash(query)
+        cached = _document_cache.get(key)
+        if cached is None:
+            try:
+                document = parse(query)
+            except GraphQLError as e:
+                return key, None, [e]
+            errors = validate(
+                self.schema.graphql_schema,
+                document,
+                self.validation_rules,
+                graphene_settings.MAX_VALIDATION_ERRORS,
+            )
+            cached = (query_hash(print_ast(document)), document, errors)
+            _document_cache.set(key, cached)
+        return cached
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        plan = self.plan_execution(request, query, variables, operation_name, show_graphiql)
+        if not isinstance(plan, ExecutionPlan):
+            return plan
+        return self.run_plan(request, plan)
+
+    def plan_execution(self, request, query, variables, operation_name, show_graphiql=False):
+        """
+        Everything before execution: the document, the checks, the cost
+        budget and the response cache lookup. Returns an ExecutionPlan, or the
+        result (None for GraphiQL) when there is nothing to execute. This is
+        the blocking part (Django cache, authentication), the async view runs
+        it off the event loop.
+        """
+        if not query:
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        key, document, validation_errors = self.get_document(query)
+        if document is None:
+            return ExecutionResult(errors=validation_errors)
+
+        operation_ast = get_operation_ast(document, operation_name)
+
+        if (
+            request.method.lower() == "get"
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                return None
+
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ["POST"],
+                    "Can only perform a {} operation from a POST request.".format(
+                        operation_ast.operation.value
+                    ),
+                )
+            )
+
+        if validation_errors:
+            return ExecutionResult(data=None, errors=validation_errors)
+
+        plan = ExecutionPlan(key, document, operation_ast, variables, operation_name)
+        if is_introspection(operation_ast):
+            plan.introspection_key = (key, operation_name, json.dumps(variables, sort_keys=True))
+            cached = _introspection_cache.get(plan.introspection_key)
+            if cached is not None:
+                return cached
+        else:
+            cost = operation_cost(self.schema.graphql_schema, document, operation_ast, variables) if operation_ast else 0
+            plan.cost_extensions = {"cost": {"requested": cost, "maximum": cost_settings()['MAX_COST']}}
+            cost_error = self.check_cost(request, cost)
+            if cost_error:
+                return ExecutionResult(errors=[cost_error], extensions=plan.cost_extensions)
+
+        tags = response_cache.cacheable_tags(operation_ast)
+        if tags is not None:
+            plan.cache_key, plan.store_result = response_cache.cache_key(key, operation_name, variables, auth_scope(request), tags)
+            data = response_cache.lookup(plan.cache_key)
+            if data is not None:
+                return ExecutionResult(data=data, extensions=plan.cost_extensions)
+        return plan
+
+    def run_plan(self, request, plan):
+        # The result of executing `plan`, awaitable when its resolvers are
+        if plan.cache_key is not None:
+            result = self.execute_cached(request, plan)
+        else:
+            result = self.execute_document(request, plan.document, plan.variables, plan.operation_name)
+
+        if plan.cost_extensions is None:
+            if not inspect.isawaitable(result) and not result.errors:
+                _introspection_cache.set(plan.introspection_key, result)
+            return result
+
+        if inspect.isawaitable(result):
+            async def with_extensions(awaitable):
+                executed = await awaitable
+                executed.extensions = plan.cost_extensions
+                return executed
+            return with_extensions(result)
+
+        result.extensions = plan.cost_extensions
+        return result
+
+    def execute_document(self, request, document, variables, operation_name):
+        try:
+            execute_options = {
+                "root_value": self.get_root_value(request),
+                "context_value": self.get_context(request),
+                "variable_values": variables,
+                "operation_name": operation_name,
+                "middleware": self.get_middleware(request),
+            }
+            if self.execution_context_class:
+                execute_options["execution_context_class"] = self.execution_context_class
+
+            return execute(self.schema.graphql_schema, document, **execute_options)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+    def execute_cached(self, request, plan):
+        """
+        Execute a public read query that missed the response cache. Only one
+        request per key executes it; concurrent misses wait for its result.
+        """
+        cache_key = plan.cache_key
+        # Joined here rather than in plan_execution: a plan dropped before it
+        # runs (a client gone mid-await) must not leave a flight nobody lands
+        flight, leader = response_cache.join_flight(cache_key)
+        if not leader:
+            return self.wait_for_flight(request, plan.document, flight, plan.variables, plan.operation_name)
+
+        try:
+            result = self.execute_document(request, plan.document, plan.variables, plan.operation_name)
+            if not inspect.isawaitable(result) and not result.errors and plan.store_result:
+                response_cache.store(cache_key, result.data)
+        except BaseException as e:
+            response_cache.land_flight(cache_key, flight, error=e)
+            raise
+        if not inspect.isawaitable(result):
+            response_cache.land_flight(cache_key, flight, result)
+            return result
+
+        async def land_async(awaitable):
+            try:
+                executed = await awaitable
+                if not executed.errors and plan.store_result:
+                    # The Django cache blocks, keep it off the event loop
+                    await asyncio.get_running_loop().run_in_executor(
+                        _resolver_pool, response_cache.store, cache_key, executed.data
+                    )
+            except BaseException as e:
+                response_cache.land_flight(cache_key, flight, error=e)
+                raise
+            response_cache.land_flight(cache_key, flight, executed)
+            return executed
+        return land_async(result)
+
+    def wait_for_flight(self, request, document, flight, variables, operation_name):
+        # Followers get their own copy; if the leader fails or is too slow they execute themselves
+        timeout = response_cache.response_cache_settings()['WAIT_TIMEOUT']
+
+        if _in_event_loop():
+            # Awaits the leader's future, so waiting never holds up the event loop
+            async def wait():
+                try:
+                    shared = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(flight)), timeout)
+                except Exception:
+                    result = self.execute_document(request, document, variables, operation_name)
+                    return await result if inspect.isawaitable(result) else result
+                return ExecutionResult(data=shared.data, errors=shared.errors)
+            return wait()
+
+        try:
+            shared = flight.result(timeout)
+        except Exception:
+            return self.execute_document(request, document, variables, operation_name)
+        return ExecutionResult(data=shared.data, errors=shared.errors)
+
+    def check_cost(self, request, cost):
+        client = request.headers.get("Authorization") or request.META.get("REMOTE_ADDR", "")
+        return check_cost(client, cost)
+
+    def parse_body(self, request):
+        # Also accepts a JSON array of operations, see get_batch_response
+        if self.get_content_type(request) != "application/json":
+            return super().parse_body(request)
+        try:
+            data = json.loads(request.body.decode("utf-8"))
+        except (UnicodeDecodeError, ValueError):
+            raise HttpError(HttpResponseBadRequest("POST body sent invalid JSON."))
+        if isinstance(data, list):
+            check_batch(data)
+        elif not isinstance(data, dict):
+            raise HttpError(HttpResponseBadRequest("The received data is not a valid JSON query."))
+        return data
+
+    def get_response(self, request, data, show_graphiql=False):
+        if isinstance(data, list):
+            return self.get_batch_response(request, data)
+
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+
+        execution_result = self.execute_graphql_request(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+        return self.format_execution_result(request, execution_result, id, show_graphiql)
+
+    def get_batch_response(self, request, batch):
+        """
+        Execute a batch of operations and return a JSON array of their results,
+        in request order, each with its own errors. The operations share the
+        request as their context, so they authenticate once and batch their
+        reference loads together. Queries run concurrently, this thread plus
+        the bounded batch pool; a batch with a mutation runs in order.
+        """
+        operations = self.batch_operations(request, batch)
+        run = functools.partial(self.run_batch_operation, request)
+        if any(mutates for _, _, mutates in operations):
+            results = [run(data, params) for data, params, _ in operations]
+        else:
+            futures = [_batch_pool.submit(run, data, params) for data, params, _ in operations[1:]]
+            results = [run(*operations[0][:2])] + [future.result() for future in futures]
+        return b"[" + b",".join(results) + b"]", 200
+
+    def batch_operations(self, request, batch):
+        # (data, params, mutates) per entry, params being the HttpError of an entry that can't run
+        authenticate_once(request)
+        operations = []
+        for data in batch:
+            try:
+                params = self.get_graphql_params(request, data)
+            except HttpError as e:
+                operations.append((data, e, False))
+                continue
+            operations.append((data, params, self.is_mutation(params[0], params[2])))
+        return operations
+
+    def is_mutation(self, query, operation_name):
+        document = self.get_document(query)[1] if query else None
+        operation_ast = get_operation_ast(document, operation_name) if document else None
+        return operation_ast is not None and operation_ast.operation == OperationType.MUTATION
+
+    def run_batch_operation(self, request, data, params):
+        if isinstance(params, HttpError):
+            return self.json_encode(request, {"errors": [self.format_error(params)]})
+        query, variables, operation_name, id = params
+        try:
+            execution_result = self.execute_graphql_request(request, data, query, variables, operation_name)
+        except HttpError as e:
+            return self.json_encode(request, {"errors": [self.format_error(e)]})
+        return self.format_execution_result(request, execution_result, id)[0]
+
+    def json_encode(self, request, d, pretty=False):
+        # Bytes from the configured encoder, see GRAPHQL_JSON_ENCODER in settings
+        return encoding.dumps(d, pretty=self.pretty or pretty or bool(request.GET.get("pretty")))
+
+    def format_execution_result(self, request, execution_result, id=None, show_graphiql=False):
+        # Same shape as GraphQLView.get_response, plus the result's extensions
+        status_code = 200
+        if not execution_result:
+            return None, status_code
+
+        response = {}
+        if execution_result.errors:
+            response["errors"] = [self.format_error(e) for e in execution_result.errors]
+
+        if execution_result.errors and any(not getattr(e, "path", None) for e in execution_result.errors):
+            status_code = 400
+        else:
+            response["data"] = execution_result.data
+
+        if execution_result.extensions:
+            response["extensions"] = execution_result.extensions
+
+        if self.batch:
+            response["id"] = id
+            response["status"] = status_code
+
+        return self.json_encode(request, response, pretty=show_graphiql), status_code
+
+
+# Resolvers use MongoEngine/pymongo, which only has a blocking driver, so the
+# async endpoint runs them here. The pool is bounded so it can't open more
+# Mongo connections than the pymongo pool allows.
+_resolver_pool = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'GRAPHQL_ASYNC_WORKERS', 10),
+    thread_name_prefix='graphql-resolver',
+)
+
+
+def batch_settings():
+    options = getattr(settings, 'GRAPHQL_BATCH', {})
+    return {
+        'MAX_SIZE': options.get('MAX_SIZE', 10),
+        'WORKERS': options.get('WORKERS', 10),
+    }
+
+
+# Runs the operations of batched requests on the sync endpoint; bounded for the
+# same reason as the resolver pool
+_batch_pool = ThreadPoolExecutor(max_workers=batch_settings()['WORKERS'], thread_name_prefix='graphql-batch')
+
+
+def check_batch(batch):
+    if not batch:
+        raise HttpError(HttpResponseBadRequest("Received an empty list in the batch request."))
+    maximum = batch_settings()['MAX_SIZE']
+    if len(batch) > maximum:
+        raise HttpError(HttpResponseBadRequest(f"Batch of {len(batch)} operations exceeds the maximum of {maximum}."))
+    if not all(isinstance(entry, dict) for entry in batch):
+        raise HttpError(HttpResponseBadRequest("Every operation of a batch must be a JSON object."))
+
+
+def authenticate_once(request):
+    # Before the operations fan out, so they find the principal memoized on the request
+    if request.headers.get("Authorization"):
+        try:
+            get_principal(request)
+        except GraphQLError:
+            pass  # every operation that needs a user reports it
+
+
+class ThreadedRootExecutionContext(ExecutionContext):
+    """
+    Runs each top-level field, together with its whole sub-selection, in the
+    resolver pool. graphql-core gathers the resulting futures, so independent
+    top-level fields of a query run concurrently while mutations stay serial.
+    """
+
+    def execute_field(self, parent_type, source, field_nodes, path):
+        if path.prev is not None:
+            return super().execute_field(parent_type, source, field_nodes, path)
+
+        loop = asyncio.get_running_loop()
+        run_field = super().execute_field
+        future = loop.run_in_executor(_resolver_pool, run_field, parent_type, source, field_nodes, path)
+
+        async def await_field():
+            result = await future
+            if self.is_awaitable(result):
+                return await result
+            return result
+
+        return await_field()
+
+
+class AsyncGraphQLView(CachedGraphQLView):
+    """
+    GraphQL endpoint for the ASGI app; see ThreadedRootExecutionContext. The
+    persisted query lookup and plan_execution (authentication, cost budget,
+    response cache) also run in the resolver pool, only execution itself is on
+    the event loop.
+    """
+
+    execution_context_class = ThreadedRootExecutionContext
+
+    @classmethod
+    def as_async_view(cls, **initkwargs):
+        # Django 3.2 only runs plain coroutine functions natively under ASGI
+        instance = cls(**initkwargs)
+
+        async def view(request, *args, **kwargs):
+            return await instance.dispatch_async(request)
+
+        view.csrf_exempt = True
+        return view
+
+    async def dispatch_async(self, request):
+        try:
+            if request.method.lower() not in ("get", "post"):
+                raise HttpError(
+                    HttpResponseNotAllowed(["GET", "POST"], "GraphQL only supports GET and POST requests.")
+                )
+
+            data = self.parse_body(request)
+            result, status_code = await self.get_response_async(request, data)
+            return HttpResponse(status=status_code, content=result, content_type="application/json")
+
+        except HttpError as e:
+            response = e.response
+            response["Content-Type"] = "application/json"
+            response.content = self.json_encode(request, {"errors": [self.format_error(e)]})
+            return response
+
+    async def get_response_async(self, request, data):
+        if isinstance(data, list):
+            return await self.get_batch_response_async(request, data)
+
+        query, variables, operation_name, id = await asyncio.get_running_loop().run_in_executor(
+            _resolver_pool, self.get_graphql_params, request, data
+        )
+        execution_result = await self.execute_graphql_request_async(request, query, variables, operation_name)
+        return self.format_execution_result(request, execution_result, id)
+
+    async def execute_graphql_request_async(self, request, query, variables, operation_name):
+        plan = await asyncio.get_running_loop().run_in_executor(
+            _resolver_pool, self.plan_execution, request, query, variables, operation_name
+        )
+        if not isinstance(plan, ExecutionPlan):
+            return plan
+        result = self.run_plan(request, plan)
+        return await result if inspect.isawaitable(result) else result
+
+    async def get_batch_response_async(self, request, batch):
+        # Like get_batch_response, with the queries interleaved on the event loop
+        operations = await asyncio.get_running_loop().run_in_executor(
+            _resolver_pool, self.batch_operations, request, batch
+        )
+
+        async def run(data, params):
+            if isinstance(params, HttpError):
+                return self.json_encode(request, {"errors": [self.format_error(params)]})
+            query, variables, operation_name, id = params
+            try:
+                execution_result = await self.execute_graphql_request_async(request, query, variables, operation_name)
+            except HttpError as e:
+                return self.json_encode(request, {"errors": [self.format_error(e)]})
+            return self.format_execution_result(request, execution_result, id)[0]
+
+        if any(mutates for _, _, mutates in operations):
+            results = [await run(data, params) for data, params, _ in operations]
+        else:
+            results = await asyncio.gather(*(run(data, params) for data, params, _ in operations))
+        return b"[" + b",".join(results) + b"]", 200
@@ -18,4 +18,15 @@ class MentorshipSession(Document):
     created_at = DateTimeField(default=datetime.datetime.utcnow)
     updated_at = DateTimeField(default=datetime.datetime.utcnow)
 
-    meta = {'collection': 'mentorship_sessions'}
\ No newline at end of file
+    meta = {
+        'collection': 'mentorship_sessions',
+        # Indexes are built by `manage.py ensure_indexes`, never on first query
+        'auto_create_index': False,
+        'indexes': [
+            ('mentor', 'status', '-created_at'),  # userSessions ($or branch), mentorReviews
+            ('mentee', 'status', '-created_at'),  # userSessions ($or branch)
+            ('-created_at', '-id'),  # allSessions pages
+            ('status', '-created_at', '-id'),  # allSessions(status) pages
+            ('updated_at', 'id'),  # exports
+        ],
+    }
\ No newline at end of file
@@ -4,29 +4,69 @@ from graphene_mongo import MongoengineObjectType
 from graphql import GraphQLError
 from .models import MentorshipSession
 from users.models import User
-from users.utils import get_authenticated_user
+from users.utils import get_principal
+from mentor_app import pubsub, response_cache
+from mentor_app.bulk import BulkItemResult, bulk_write, parse_ids
+from pymongo import ReturnDocument, UpdateOne
+import datetime
+from mentor_app.loaders import load_reference, queue_references
+from mentor_app.pagination import CountableConnection, paginate
+from mentor_app.projection import project
 from bson import ObjectId
+from bson.errors import InvalidId
 
 class MentorshipSessionType(MongoengineObjectType):
     class Meta:
         model = MentorshipSession
 
+    # Batch mentor/mentee lookups across the whole list instead of one get() per row
+    def resolve_mentor(parent, info):
+        return load_reference(parent, info, 'mentor')
+
+    def resolve_mentee(parent, info):
+        return load_reference(parent, info, 'mentee')
+
+# Who is told about a changed session: its mentor, its mentee and the staff
+STAFF_CHANNEL = 'sessions:staff'
+
+
+def session_channels(session):
+    return [STAFF_CHANNEL] + [f"sessions:{session[party]}" for party in ('mentor', 'mentee') if session.get(party)]
+
+
+pubsub.route(MentorshipSession._get_collection_name(), session_channels)
+
+
+class MentorshipSessionConnection(CountableConnection):
+    class Meta:
+        node = MentorshipSessionType
+
+# Newest sessions first; _id breaks ties between equal timestamps
+SESSION_SORT = (('created_at', -1), ('_id', -1))
+
 class Query(graphene.ObjectType):
-    all_sessions = graphene.List(MentorshipSessionType)
+    all_sessions = graphene.relay.ConnectionField(MentorshipSessionConnection, status=graphene.String())
     user_sessions = graphene.List(MentorshipSessionType)
     
-    def resolve_all_sessions(self, info):
+    def resolve_all_sessions(self, info, status=None, **kwargs):
         # Authenticate the user
-        user = get_authenticated_user(info.context)
+        user = get_principal(info.context)
         
         # Ensure the authenticated user is staff (admin)
         if not user.is_staff:
             raise GraphQLError('Not authorized')
         
-        return MentorshipSession.objects.all()
+        sessions = MentorshipSession.objects.all()
+        if status is not None:
+            sessions = sessions.filter(status=status)
+
+        sessions = project(sessions, info, path=('edges', 'node'), always=('created_at',))
+        connection = paginate(MentorshipSessionConnection, sessions, sort=SESSION_SORT, **kwargs)
+        queue_references(info.context, [edge.node for edge in connection.edges], 'mentor', 'mentee')
+        return connection
     
     def resolve_user_sessions(self, info):
-        user = get_authenticated_user(info.context)
+        user = get_principal(info.context)
         user_id = ObjectId(user.id)
     
         query = {
@@ -36,8 +76,9 @@ class Query(graphene.ObjectType):
         ]
         }
     
-        print(f"Query: {query}")  # Debugging
-        return MentorshipSession.objects.filter(__raw__=query)
+        sessions = list(project(MentorshipSession.objects.filter(__raw__=query), info))
+        queue_references(info.context, sessions, 'mentor', 'mentee')
+        return sessions
 
 class CreateSession(graphene.Mutation):
     session = graphene.Field(MentorshipSessionType)
@@ -49,7 +90,7 @@ class CreateSession(graphene.Mutation):
     
     def mutate(self, info, mentor_id, topic, questions):
         # Authenticate the user
-        user = get_authenticated_user(info.context)
+        user = get_principal(info.context)
         
         try:
             mentor = User.objects.get(id=mentor_id, user_type='mentor')
@@ -58,11 +99,12 @@ class CreateSession(graphene.Mutation):
         
         session = MentorshipSession(
             mentor=mentor,
-            mentee=user,
+            mentee=user.id,
             topic=topic,
             questions=questions
         )
         session.save()
+        pubsub.publish(MentorshipSession._get_collection_name(), [session.to_mongo()])
         return CreateSession(session=session)
 
 class UpdateSessionStatus(graphene.Mutation):
@@ -74,7 +116,7 @@ class UpdateSessionStatus(graphene.Mutation):
     
     def mutate(self, info, session_id, status):
     # Authenticate the user
-        user = get_authenticated_user(info.context)
+        user = get_principal(info.context)
     
     # Get the full list of valid status values
         valid_statuses = [s[0] for s in MentorshipSession.STATUS_CHOICES]
@@ -82,20 +124,93 @@ class UpdateSessionStatus(graphene.Mutation):
             raise GraphQLError(f'Invalid status. Choose from {", ".join(valid_statuses)}')
     
         try:
-            session = MentorshipSession.objects.get(id=session_id)
-        except MentorshipSession.DoesNotExist:
+            object_id = ObjectId(session_id)
+        except (InvalidId, TypeError):
             raise GraphQLError('Session not found')
     
-    # Only mentor can update status
-        if session.mentor.id != user.id:
-            raise GraphQLError('Not authorized')
-    
-        session.status = status
-        session.save()
-        return UpdateSessionStatus(session=session)
+    # Only mentor can update status: the check is part of the update's filter
+        collection = MentorshipSession._get_collection()
+        session = collection.find_one_and_update(
+            {'_id': object_id, 'mentor': user.id},
+            {'$set': {'status': status, 'updated_at': datetime.datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if session is None:
+            # Only failures pay for a second look, to tell why
+            if collection.count_documents({'_id': object_id}, limit=1):
+                raise GraphQLError('Not authorized')
+            raise GraphQLError('Session not found')
+
+        response_cache.invalidate('sessions')  # mentorReviews embeds the session
+        pubsub.publish(collection.name, [session])
+        return UpdateSessionStatus(session=MentorshipSession._from_son(session))
+
+class UpdateSessionStatusBulk(graphene.Mutation):
+    results = graphene.List(BulkItemResult)
+
+    class Arguments:
+        session_ids = graphene.List(graphene.ID, required=True)
+        status = graphene.String(required=True)
+
+    def mutate(self, info, session_ids, status):
+    # Authenticate the user
+        user = get_principal(info.context)
+
+        valid_statuses = [s[0] for s in MentorshipSession.STATUS_CHOICES]
+        if status not in valid_statuses:
+            raise GraphQLError(f'Invalid status. Choose from {", ".join(valid_statuses)}')
+
+        object_ids, errors = parse_ids(session_ids)
+
+    # Check the mentor of every session in one query
+        collection = MentorshipSession._get_collection()
+        mentors = {
+            session['_id']: session.get('mentor')
+            for session in collection.find({'_id': {'$in': list(object_ids.values())}}, {'mentor': True})
+        }
+
+        now = datetime.datetime.utcnow()
+        operations = {}
+        for session_id, object_id in object_ids.items():
+            if object_id not in mentors:
+                errors[session_id] = 'Session not found'
+            elif mentors[object_id] != user.id:
+                errors[session_id] = 'Not authorized'
+            else:
+                operations[session_id] = UpdateOne(
+                    {'_id': object_id, 'mentor': user.id},
+                    {'$set': {'status': status, 'updated_at': now}},
+                )
+
+        results, modified = bulk_write(collection, session_ids, operations, errors, object_ids, {'updated_at': now}, 'Session not found')
+        if modified:
+            response_cache.invalidate('sessions')
+            # A lazy cursor: only read if this process has subscribers to tell
+            updated = [object_ids[result.id] for result in results if result.success]
+            pubsub.publish(collection.name, collection.find({'_id': {'$in': updated}}))
+        return UpdateSessionStatusBulk(results=results)
+
+class Subscription(graphene.ObjectType):
+    session_updated = graphene.Field(
+        MentorshipSessionType,
+        session_id=graphene.ID(),
+        description="Sessions of the current user (every session for staff) as they are created or change status",
+    )
+
+    async def subscribe_session_updated(root, info, session_id=None):
+        # The WebSocket endpoint resolved the principal on this context already, this doesn't query
+        user = get_principal(info.context)
+        subscriber = pubsub.subscribe([STAFF_CHANNEL if user.is_staff else f"sessions:{user.id}"])
+        try:
+            async for session in subscriber:
+                if session_id is None or str(session['_id']) == session_id:
+                    yield MentorshipSession._from_son(session)
+        finally:
+            subscriber.close()
 
 class Mutation(graphene.ObjectType):
     create_session = CreateSession.Field()
     update_session_status = UpdateSessionStatus.Field()
+    update_session_status_bulk = UpdateSessionStatusBulk.Field()
 
-schema = graphene.Schema(query=Query, mutation=Mutation)
\ No newline at end of file
+schema = graphene.Schema(query=Query, mutation=Mutation, subscription=Subscription)
\ No newline at end of file
@@ -1,3 +1,47 @@
-from django.test import TestCase
+from mentor_app.testing import MongomockTestCase
+from users.models import User
+from .models import MentorshipSession
 
-# Create your tests here.
+
+UPDATE_STATUS = '''
+mutation($id: ID!, $status: String!) {
+  updateSessionStatus(sessionId: $id, status: $status) { session { status } }
+}
+'''
+
+
+class UpdateSessionStatusTests(MongomockTestCase):
+    documents = (User, MentorshipSession)
+
+    def setUp(self):
+        super().setUp()
+        self.mentor = self.user('mentor@example.com', 'mentor')
+        self.mentee = self.user('mentee@example.com')
+        self.session = MentorshipSession(mentor=self.mentor, mentee=self.mentee, topic='Career').save()
+
+    def update(self, user, status, session_id=None):
+        return self.execute_as(user, UPDATE_STATUS, id=session_id or str(self.session.id), status=status)
+
+    def status(self):
+        return MentorshipSession.objects.get(id=self.session.id).status
+
+    def test_mentor_updates_the_status(self):
+        result = self.update(self.mentor, 'approved')
+
+        self.assertEqual(result.data, {'updateSessionStatus': {'session': {'status': 'approved'}}})
+        self.assertEqual(self.status(), 'approved')
+
+    def test_only_the_sessions_mentor_may_update_it(self):
+        other_mentor = self.user('other@example.com', 'mentor')
+
+        self.assertError(self.update(other_mentor, 'approved'), 'Not authorized')
+        self.assertError(self.update(self.mentee, 'completed'), 'Not authorized')
+        self.assertEqual(self.status(), 'pending')
+
+    def test_unknown_status_is_rejected(self):
+        self.assertError(self.update(self.mentor, 'archived'), 'Invalid status. Choose from pending, approved, declined, completed')
+        self.assertEqual(self.status(), 'pending')
+
+    def test_unknown_session(self):
+        self.assertError(self.update(self.mentor, 'approved', '0' * 24), 'Session not found')
+        self.assertError(self.update(self.mentor, 'approved', 'not-an-id'), 'Session not found')
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from mentor_app import stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the adminStats rollups from every session and review"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help='only re-aggregate what changed since the last refresh, like adminStats does',
+        )
+
+    def handle(self, *args, **options):
+        if options['incremental']:
+            watermark = stats.refresh()
+        else:
+            watermark = stats.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'adminStats rollups are up to date as of {watermark.isoformat()}Z'))
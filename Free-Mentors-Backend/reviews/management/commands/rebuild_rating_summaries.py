@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+from mentor_app import response_cache
+from reviews.models import Review
+from reviews.ratings import SUMMARY_PIPELINE, row_summary, summary_fields
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Recompute every mentor's rating summary from the reviews collection"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        users = User._get_collection()
+        updates = []
+        summarized = []
+
+        for row in Review._get_collection().aggregate(SUMMARY_PIPELINE, allowDiskUse=True):
+            summarized.append(row['_id'])
+            updates.append(UpdateOne({'_id': row['_id']}, {'$set': row_summary(row)}))
+            if len(updates) >= options['batch_size']:
+                users.bulk_write(updates, ordered=False)
+                updates = []
+        if updates:
+            users.bulk_write(updates, ordered=False)
+
+        # Mentors without any visible review, and every legacy document without
+        # the fields, mentee or not, so a later promotion starts out summarized
+        reset = users.update_many(
+            {'_id': {'$nin': summarized}, '$or': [{'user_type': 'mentor'}, {'average_rating': {'$exists': False}}]},
+            {'$set': summary_fields()},
+        )
+        response_cache.invalidate('users')
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {len(summarized)} rating summaries, reset {reset.modified_count} users without reviews'
+        ))
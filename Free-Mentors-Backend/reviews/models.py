@@ -11,4 +11,14 @@ class Review(Document):
     created_at = DateTimeField(default=datetime.datetime.utcnow)
     updated_at = DateTimeField(default=datetime.datetime.utcnow)
 
-    meta = {'collection': 'reviews'}  # Explicitly define the collection name
+    meta = {
+        'collection': 'reviews',  # Explicitly define the collection name
+        # Indexes are built by `manage.py ensure_indexes`, never on first query
+        'auto_create_index': False,
+        'indexes': [
+            ('session', 'is_visible'),  # mentorReviews
+            ('-created_at', '-id'),  # allReviews pages
+            ('is_visible', '-created_at', '-id'),  # allReviews(isVisible) pages
+            ('updated_at', 'id'),  # exports
+        ],
+    }
@@ -0,0 +1,139 @@
+from pymongo import ReturnDocument, UpdateOne
+from mentorship.models import MentorshipSession
+from users.models import User
+
+STARS = range(1, 6)
+
+
+def average(rating_total, review_count):
+    return round(rating_total / review_count, 4) if review_count else 0
+
+
+def record_rating(mentor_id, rating, delta=1):
+    """
+    Add (delta=1) or remove (delta=-1) one visible review from a mentor's
+    rating summary. Counters move with a single atomic $inc; the average is
+    then set only if no other review changed the counters in between, in
+    which case that review's own update sets it.
+    """
+    collection = User._get_collection()
+    summary = collection.find_one_and_update(
+        {'_id': mentor_id},
+        {'$inc': {
+            'review_count': delta,
+            'rating_total': delta * rating,
+            f'rating_histogram.{rating}': delta,
+        }},
+        projection={'review_count': True, 'rating_total': True},
+        return_document=ReturnDocument.AFTER,
+    )
+    if summary is None:
+        return
+    collection.update_one(
+        {'_id': mentor_id, 'review_count': summary['review_count'], 'rating_total': summary['rating_total']},
+        {'$set': {'average_rating': average(summary['rating_total'], summary['review_count'])}},
+    )
+
+
+def record_ratings(changes):
+    """
+    Bulk version of record_rating for an iterable of (mentor_id, rating, delta).
+    Changes are summed per mentor and applied with one unordered bulk_write of
+    $inc; averages are then set with the same guard as record_rating.
+    """
+    increments = {}
+    for mentor_id, rating, delta in changes:
+        inc = increments.setdefault(mentor_id, {'review_count': 0, 'rating_total': 0})
+        inc['review_count'] += delta
+        inc['rating_total'] += delta * rating
+        inc[f'rating_histogram.{rating}'] = inc.get(f'rating_histogram.{rating}', 0) + delta
+    if not increments:
+        return
+
+    collection = User._get_collection()
+    collection.bulk_write([UpdateOne({'_id': mentor_id}, {'$inc': inc}) for mentor_id, inc in increments.items()], ordered=False)
+    summaries = collection.find(
+        {'_id': {'$in': list(increments)}},
+        {'review_count': True, 'rating_total': True},
+    )
+    collection.bulk_write([
+        UpdateOne(
+            {'_id': summary['_id'], 'review_count': summary['review_count'], 'rating_total': summary['rating_total']},
+            {'$set': {'average_rating': average(summary['rating_total'], summary['review_count'])}},
+        )
+        for summary in summaries
+    ], ordered=False)
+
+
+def resync_summaries(mentor_ids):
+    """
+    Recompute the summaries of a few mentors from their reviews, for when an
+    incremental update can't be trusted (e.g. a bulk write raced another one).
+    """
+    mentor_ids = list(mentor_ids)
+    pipeline = [
+        {'$match': {'mentor': {'$in': mentor_ids}}},
+        {'$project': {'mentor': True}},
+        {'$lookup': {
+            'from': 'reviews',
+            'localField': '_id',
+            'foreignField': 'session',
+            'as': 'review',
+        }},
+        {'$unwind': '$review'},
+        {'$match': {'review.is_visible': True}},
+        {'$project': {'session': {'mentor': '$mentor'}, 'rating': '$review.rating'}},
+        SUMMARY_PIPELINE[-1],
+    ]
+    rows = {row['_id']: row for row in MentorshipSession._get_collection().aggregate(pipeline)}
+    User._get_collection().bulk_write([
+        UpdateOne({'_id': mentor_id}, {'$set': row_summary(rows[mentor_id]) if mentor_id in rows else summary_fields()})
+        for mentor_id in mentor_ids
+    ], ordered=False)
+
+
+# Per-mentor summaries of every visible review, in one pass over `reviews`
+SUMMARY_PIPELINE = [
+    {'$match': {'is_visible': True}},
+    {'$lookup': {
+        'from': 'mentorship_sessions',
+        'localField': 'session',
+        'foreignField': '_id',
+        'as': 'session',
+    }},
+    {'$unwind': '$session'},
+    {'$group': {
+        '_id': '$session.mentor',
+        'review_count': {'$sum': 1},
+        'rating_total': {'$sum': '$rating'},
+        **{
+            f'stars_{stars}': {'$sum': {'$cond': [{'$eq': ['$rating', stars]}, 1, 0]}}
+            for stars in STARS
+        },
+    }},
+]
+
+
+def summary_fields(review_count=0, rating_total=0, histogram=None):
+    return {
+        'review_count': review_count,
+        'rating_total': rating_total,
+        'average_rating': average(rating_total, review_count),
+        'rating_histogram': histogram or {},
+    }
+
+
+def ensure_summaries(user_ids):
+    # Documents from before rating summaries existed have none; mentors(orderBy:
+    # RATING) pages by average_rating, so a mentor without one would be skipped
+    if user_ids:
+        User._get_collection().update_many(
+            {'_id': {'$in': list(user_ids)}, 'average_rating': {'$exists': False}},
+            {'$set': summary_fields()},
+        )
+
+
+def row_summary(row):
+    # Summary fields from one row grouped by SUMMARY_PIPELINE's $group
+    histogram = {str(stars): row[f'stars_{stars}'] for stars in STARS if row[f'stars_{stars}']}
+    return summary_fields(row['review_count'], row['rating_total'], histogram)
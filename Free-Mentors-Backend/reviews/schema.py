@@ -4,10 +4,20 @@ from graphene_mongo import MongoengineObjectType
 from graphql import GraphQLError
 from django.contrib.auth import get_user_model
 from .models import Review
-from users.utils import get_authenticated_user
+from users.utils import get_principal
 from mentorship.models import MentorshipSession
+from mentor_app.loaders import load_reference, queue_references, reference_id
+from mentor_app.mongo import read_only
+from mentor_app import response_cache
+from mentor_app.bulk import BulkItemResult, bulk_write, parse_ids
+from mentor_app.pagination import CountableConnection, paginate
+from mentor_app.projection import project
 from bson import ObjectId
-import traceback
+from bson.errors import InvalidId
+from mongoengine.errors import NotUniqueError
+from .ratings import record_rating, record_ratings, resync_summaries
+from pymongo import UpdateOne
+import datetime
 User = get_user_model()
 
 class ReviewType(MongoengineObjectType):
@@ -16,41 +26,55 @@ class ReviewType(MongoengineObjectType):
         fields = ("id", "rating", "content", "is_visible", "session")
 
         id = graphene.String()
-        
+
+    # Batch session lookups across the whole list instead of one get() per row
+    def resolve_session(parent, info):
+        return load_reference(parent, info, 'session')
+
+class ReviewConnection(CountableConnection):
+    class Meta:
+        node = ReviewType
+
+# Newest reviews first; _id breaks ties between equal timestamps
+REVIEW_SORT = (('created_at', -1), ('_id', -1))
 
 class Query(graphene.ObjectType):
-    all_reviews = graphene.List(ReviewType)
+    all_reviews = graphene.relay.ConnectionField(ReviewConnection, is_visible=graphene.Boolean())
     mentor_reviews = graphene.List(ReviewType, mentor_id=graphene.String(required=True))
     
-    def resolve_all_reviews(self, info):
-        user = get_authenticated_user(info.context)  # Ensure authentication
+    def resolve_all_reviews(self, info, is_visible=None, **kwargs):
+        user = get_principal(info.context)  # Ensure authentication
 
         if not user.is_staff:  # Assuming `is_staff` is used for admin users
-            return Review.objects.filter(is_visible=True)  # Only return visible reviews
-        
-        return Review.objects.all()  # Admin can see all reviews
+            reviews = read_only(Review).filter(is_visible=True)  # Only return visible reviews
+        elif is_visible is not None:
+            reviews = read_only(Review).filter(is_visible=is_visible)
+        else:
+            reviews = read_only(Review).all()  # Admin can see all reviews
+
+        reviews = project(reviews, info, path=('edges', 'node'), always=('created_at',))
+        connection = paginate(ReviewConnection, reviews, sort=REVIEW_SORT, **kwargs)
+        queue_references(info.context, [edge.node for edge in connection.edges], 'session')
+        return connection
     
     def resolve_mentor_reviews(self, info, mentor_id):
     # Skip the authentication check for simplicity
     # user = get_authenticated_user(info.context)
     
         try:
-        # Convert string ID to ObjectId
             mentor_obj_id = ObjectId(mentor_id)
-        
+        except (InvalidId, TypeError):
+            raise GraphQLError('Invalid mentor ID')
+
         # Find sessions directly by mentor ObjectId without loading the User model
         # This uses the internal MongoDB reference that mongoengine creates
-            sessions = MentorshipSession.objects.filter(mentor=mentor_obj_id)
-        
+        sessions = read_only(MentorshipSession).filter(mentor=mentor_obj_id).only('id')
+
         # Get reviews for these sessions
-            reviews = Review.objects.filter(session__in=sessions, is_visible=True)
-            return reviews
-        
-        except Exception as e:
-        # Print more detailed error information
-            
-            print(f"Error details: {traceback.format_exc()}")
-            raise GraphQLError(f'Error retrieving reviews: {str(e)}')
+        reviews = list(project(read_only(Review).filter(session__in=sessions, is_visible=True), info))
+        queue_references(info.context, reviews, 'session')
+        return reviews
+
 class CreateReview(graphene.Mutation):
     review = graphene.Field(ReviewType)
     
@@ -61,35 +85,42 @@ class CreateReview(graphene.Mutation):
     
     def mutate(self, info, session_id, rating, content):
         # Authenticate the user
-        user = get_authenticated_user(info.context)
-        if not user:
-            raise GraphQLError('You must be logged in to create a review')
-        
-        try:
-            # Fetch the session
-            session = MentorshipSession.objects.get(id=ObjectId(session_id))
-        except (MentorshipSession.DoesNotExist, ValueError):
-            raise GraphQLError('Invalid or non-existent session ID')
+        user = get_principal(info.context)
         
         # Validate the rating
         if rating < 1 or rating > 5:
             raise GraphQLError('Rating must be between 1 and 5')
-        
-        # Only mentee can review the session
-        if session.mentee != user:
-            raise GraphQLError('Not authorized')
-        
-        # Session must be completed
-        if session.status != 'completed':
+
+        try:
+            session_object_id = ObjectId(session_id)
+        except (InvalidId, TypeError):
+            raise GraphQLError('Invalid or non-existent session ID')
+
+        # Only the mentee of a completed session can review it; the happy path
+        # reads the session once with both checks in the filter
+        sessions = MentorshipSession._get_collection()
+        session = sessions.find_one(
+            {'_id': session_object_id, 'mentee': user.id, 'status': 'completed'},
+            {'mentor': True, 'mentee': True, 'status': True},
+        )
+        if session is None:
+            session = sessions.find_one({'_id': session_object_id}, {'mentee': True})
+            if session is None:
+                raise GraphQLError('Invalid or non-existent session ID')
+            if session.get('mentee') != user.id:
+                raise GraphQLError('Not authorized')
             raise GraphQLError('Cannot review an incomplete session')
-        
-        # Check if review already exists
-        if Review.objects.filter(session=session).count() > 0:
+
+        # Create the review; the unique index on session rejects a second one
+        review = Review(session=session_object_id, rating=rating, content=content)
+        try:
+            review.save(force_insert=True)
+        except NotUniqueError:
             raise GraphQLError('Review already exists for this session')
-        
-        # Create the review
-        review = Review(session=session, rating=rating, content=content)
-        review.save()
+
+        # New reviews are visible, so they count towards the mentor's summary
+        record_rating(session.get('mentor'), rating)
+        response_cache.invalidate('reviews', 'users')
         
         return CreateReview(review=review)
 
@@ -101,19 +132,88 @@ class UpdateReviewVisibility(graphene.Mutation):
         is_visible = graphene.Boolean(required=True)
     
     def mutate(self, info, review_id, is_visible):
-        user = get_authenticated_user(info.context)  # Use the helper function
+        user = get_principal(info.context)  # Use the helper function
 
         if not user.is_staff:
             raise GraphQLError('Not authorized')
 
         try:
             review = Review.objects.get(id=review_id)
-            review.is_visible = is_visible
-            review.save()
-            return UpdateReviewVisibility(review=review)
         except Review.DoesNotExist:
             raise GraphQLError('Review not found')
 
+        # Only flip it if it's not already in that state, so concurrent calls
+        # adjust the mentor's rating summary exactly once
+        changed = Review.objects(id=review.id, is_visible=not is_visible).update_one(
+            set__is_visible=is_visible,
+            set__updated_at=datetime.datetime.utcnow(),
+        )
+        review.is_visible = is_visible
+        if changed:
+            mentor_id = reference_id(review.session._data['mentor'])
+            record_rating(mentor_id, review.rating, 1 if is_visible else -1)
+            response_cache.invalidate('reviews', 'users')
+        return UpdateReviewVisibility(review=review)
+
+class UpdateReviewVisibilityBulk(graphene.Mutation):
+    results = graphene.List(BulkItemResult)
+
+    class Arguments:
+        review_ids = graphene.List(graphene.String, required=True)
+        is_visible = graphene.Boolean(required=True)
+
+    def mutate(self, info, review_ids, is_visible):
+        user = get_principal(info.context)
+
+        if not user.is_staff:
+            raise GraphQLError('Not authorized')
+
+        object_ids, errors = parse_ids(review_ids)
+
+        # Load the reviews and the mentors of their sessions in two queries
+        reviews = {
+            review['_id']: review
+            for review in Review._get_collection().find(
+                {'_id': {'$in': list(object_ids.values())}},
+                {'is_visible': True, 'rating': True, 'session': True},
+            )
+        }
+        mentors = {
+            session['_id']: session.get('mentor')
+            for session in MentorshipSession._get_collection().find(
+                {'_id': {'$in': [review['session'] for review in reviews.values()]}},
+                {'mentor': True},
+            )
+        }
+
+        now = datetime.datetime.utcnow()
+        operations, changes = {}, []
+        for review_id, object_id in object_ids.items():
+            review = reviews.get(object_id)
+            if review is None:
+                errors[review_id] = 'Review not found'
+            elif review.get('is_visible', True) != is_visible:
+                # Same guard as UpdateReviewVisibility: only flip reviews still in the other state
+                operations[review_id] = UpdateOne(
+                    {'_id': object_id, 'is_visible': not is_visible},
+                    {'$set': {'is_visible': is_visible, 'updated_at': now}},
+                )
+                changes.append((mentors.get(review['session']), review['rating'], 1 if is_visible else -1))
+
+        results, modified = bulk_write(
+            Review._get_collection(), review_ids, operations, errors, object_ids, {'updated_at': now}, 'Review not found'
+        )
+        changes = [change for change in changes if change[0] is not None]
+        if modified == len(operations):
+            record_ratings(changes)
+        else:
+            # Some reviews changed under us, so the deltas are unreliable; recount those mentors
+            resync_summaries({mentor_id for mentor_id, _, _ in changes})
+        if modified:
+            response_cache.invalidate('reviews', 'users')
+        return UpdateReviewVisibilityBulk(results=results)
+
 class Mutation(graphene.ObjectType):
     create_review = CreateReview.Field()
-    update_review_visibility = UpdateReviewVisibility.Field()
\ No newline at end of file
+    update_review_visibility = UpdateReviewVisibility.Field()
+    update_review_visibility_bulk = UpdateReviewVisibilityBulk.Field()
\ No newline at end of file
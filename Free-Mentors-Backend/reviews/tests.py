@@ -1,3 +1,52 @@
-from django.test import TestCase
+from mentor_app.testing import MongomockTestCase
+from mentorship.models import MentorshipSession
+from users.models import User
+from .models import Review
 
-# Create your tests here.
+
+CREATE_REVIEW = '''
+mutation($id: String!, $rating: Int!) {
+  createReview(sessionId: $id, rating: $rating, content: "Helpful") { review { rating } }
+}
+'''
+
+
+class CreateReviewTests(MongomockTestCase):
+    documents = (User, MentorshipSession, Review)
+
+    def setUp(self):
+        super().setUp()
+        self.mentor = self.user('mentor@example.com', 'mentor')
+        self.mentee = self.user('mentee@example.com')
+        self.session = MentorshipSession(mentor=self.mentor, mentee=self.mentee, topic='Career', status='completed').save()
+
+    def review(self, user, session=None, rating=4):
+        return self.execute_as(user, CREATE_REVIEW, id=str((session or self.session).id), rating=rating)
+
+    def test_mentee_reviews_a_completed_session(self):
+        self.assertEqual(self.review(self.mentee).data, {'createReview': {'review': {'rating': 4}}})
+
+        mentor = User.objects.get(id=self.mentor.id)
+        self.assertEqual((mentor.review_count, mentor.average_rating, mentor.rating_histogram), (1, 4, {'4': 1}))
+
+    def test_only_the_sessions_mentee_may_review_it(self):
+        other_mentee = self.user('other@example.com')
+
+        self.assertError(self.review(other_mentee), 'Not authorized')
+        self.assertError(self.review(self.mentor), 'Not authorized')
+        self.assertEqual(Review.objects.count(), 0)
+
+    def test_sessions_that_are_not_completed_cannot_be_reviewed(self):
+        for status in ('pending', 'approved', 'declined'):
+            session = MentorshipSession(mentor=self.mentor, mentee=self.mentee, topic=status, status=status).save()
+            self.assertError(self.review(self.mentee, session), 'Cannot review an incomplete session')
+        self.assertEqual(Review.objects.count(), 0)
+
+    def test_a_session_is_reviewed_once(self):
+        self.review(self.mentee, rating=5)
+
+        self.assertError(self.review(self.mentee, rating=1), 'Review already exists for this session')
+        self.assertEqual(User.objects.get(id=self.mentor.id).review_count, 1)
+
+    def test_rating_out_of_range(self):
+        self.assertError(self.review(self.mentee, rating=6), 'Rating must be between 1 and 5')
@@ -0,0 +1,86 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import bcrypt
+from django.conf import settings
+
+
+class PasswordHasherBusy(Exception):
+    """Raised instead of queueing when the hashing pool is saturated."""
+
+
+def _hashing_settings():
+    options = {
+        'BCRYPT_ROUNDS': 12,
+        'WORKERS': os.cpu_count() or 1,
+        'MAX_PENDING': 64,
+        'TIMEOUT': 10,
+        'USE_PROCESS_POOL': True,
+    }
+    options.update(getattr(settings, 'PASSWORD_HASHING', {}))
+    return options
+
+
+# Run in the pool's worker processes, so they must stay module-level functions
+def _hashpw(raw_password, rounds):
+    return bcrypt.hashpw(raw_password, bcrypt.gensalt(rounds=rounds))
+
+
+def _checkpw(raw_password, hashed):
+    return bcrypt.checkpw(raw_password, hashed)
+
+
+class _HashingPool:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+
+    def reset(self):
+        # A forked child must not reuse the parent's executor or its slot count
+        self._executor = None
+        self._slots = None
+
+    def run(self, func, *args):
+        options = _hashing_settings()
+        if not options['USE_PROCESS_POOL']:
+            return func(*args)
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=options['WORKERS'])
+                self._slots = threading.BoundedSemaphore(options['MAX_PENDING'])
+            executor, slots = self._executor, self._slots
+
+        if not slots.acquire(blocking=False):
+            raise PasswordHasherBusy('Too many concurrent password operations, please retry')
+        try:
+            future = executor.submit(func, *args)
+        except BaseException:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        return future.result(timeout=options['TIMEOUT'])
+
+
+_pool = _HashingPool()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_pool.reset)
+
+
+def hash_password(raw_password):
+    rounds = _hashing_settings()['BCRYPT_ROUNDS']
+    return _pool.run(_hashpw, raw_password.encode('utf-8'), rounds).decode('utf-8')
+
+
+def check_password(raw_password, hashed):
+    return _pool.run(_checkpw, raw_password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+def needs_rehash(hashed):
+    # bcrypt hashes look like $2b$<cost>$<salt+hash>
+    try:
+        cost = int(hashed.split('$')[2])
+    except (IndexError, ValueError):
+        return True
+    return cost != _hashing_settings()['BCRYPT_ROUNDS']
@@ -0,0 +1,75 @@
+from django.core.management.base import BaseCommand
+from mongoengine import Document
+from mongoengine.base.common import _document_registry
+from pymongo.errors import OperationFailure
+
+
+def indexed_documents():
+    # Every concrete Document registered by the installed apps' models
+    for document in _document_registry.values():
+        if issubclass(document, Document) and not document._meta.get('abstract'):
+            yield document
+
+
+def index_key(fields):
+    # Mongo stores the fields of a text index as a single `_fts`/`_ftsx` pair
+    key = []
+    for field, direction in fields:
+        if field == '_ftsx':
+            continue
+        if direction != 'text':
+            key.append((field, int(direction)))
+        elif ('_fts', 'text') not in key:
+            key += [('_fts', 'text'), ('_ftsx', 1)]
+    return tuple(key)
+
+
+def index_usage(collection):
+    # $indexStats needs MongoDB 3.2+ and the clusterMonitor role; usage is optional
+    try:
+        return {
+            stats['name']: stats['accesses']['ops']
+            for stats in collection.aggregate([{'$indexStats': {}}])
+        }
+    except (OperationFailure, NotImplementedError):
+        return {}
+
+
+class Command(BaseCommand):
+    help = 'Build the declared MongoDB indexes in the background and report missing, undeclared or unused ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report the differences, do not build missing indexes',
+        )
+
+    def handle(self, *args, **options):
+        for document in indexed_documents():
+            collection = document._get_collection()
+            self.stdout.write(self.style.MIGRATE_HEADING(collection.name))
+
+            declared = {index_key(spec['fields']): spec for spec in document._meta['index_specs']}
+            live = {
+                index_key(info['key']): name
+                for name, info in collection.index_information().items()
+                if name != '_id_'
+            }
+            usage = index_usage(collection)
+
+            for key, spec in declared.items():
+                if key in live:
+                    self.stdout.write(f'  ok       {live[key]}')
+                    continue
+                if options['dry_run']:
+                    self.stdout.write(self.style.WARNING(f'  missing  {key}'))
+                    continue
+                kwargs = {option: value for option, value in spec.items() if option != 'fields'}
+                name = collection.create_index(spec['fields'], background=True, **kwargs)
+                self.stdout.write(self.style.SUCCESS(f'  created  {name}'))
+
+            for key, name in live.items():
+                if key not in declared:
+                    self.stdout.write(self.style.WARNING(f'  extra    {name} (not declared in meta)'))
+                if usage.get(name) == 0:
+                    self.stdout.write(self.style.WARNING(f'  unused   {name} (no ops since last restart)'))
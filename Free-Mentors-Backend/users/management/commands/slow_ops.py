@@ -0,0 +1,47 @@
+import json
+import os
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Print the slow Mongo commands recorded by a running server. The ring lives in the '
+        'server process, so this fetches it from /slow-ops/ with a staff token.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default=os.environ.get('SLOW_OPS_URL', 'http://localhost:8000'))
+        parser.add_argument('--token', default=os.environ.get('SLOW_OPS_TOKEN'), help='JWT of a staff user')
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--json', action='store_true', help='print the raw records')
+
+    def handle(self, *args, **options):
+        if not options['token']:
+            raise CommandError('A staff token is required (--token or SLOW_OPS_TOKEN)')
+
+        request = Request(
+            f"{options['url'].rstrip('/')}/slow-ops/?limit={options['limit']}",
+            headers={'Authorization': f"Bearer {options['token']}"},
+        )
+        try:
+            with urlopen(request, timeout=10) as response:
+                records = json.load(response)['records']
+        except HTTPError as e:
+            raise CommandError(f'{e.code} {e.read().decode(errors="replace")}')
+
+        if options['json']:
+            self.stdout.write(json.dumps(records, indent=2))
+            return
+        if not records:
+            self.stdout.write(self.style.SUCCESS('No slow commands recorded'))
+            return
+        for record in records:
+            self.stdout.write(self.style.WARNING(
+                f"{record['time']}  {record['duration_ms']:>8} ms  {record['command']} {record['collection']}"
+            ))
+            self.stdout.write(f"  operation {record['operation'] or '-'}  field {record['path'] or '-'}")
+            self.stdout.write(f"  filter    {json.dumps(record['filter'])}")
+            self.stdout.write(f"  plan      {record['plan'] or '-'} ({record['explain']})")
@@ -1,10 +1,25 @@
-from mongoengine import Document, StringField, EmailField, BooleanField
-import bcrypt
+from mongoengine import Document, StringField, EmailField, BooleanField, IntField, FloatField, DictField, DateTimeField
+import datetime
+from . import hashing
 
 class User(Document):
     meta = {
-        'collection': 'user'  # Explicitly set the collection name
-    }   
+        'collection': 'user',  # Explicitly set the collection name
+        # Indexes are built by `manage.py ensure_indexes`, never on first query
+        'auto_create_index': False,
+        'indexes': [
+            ('user_type', 'id'),  # mentors listing, users(userType) pages
+            ('user_type', '-average_rating', '-id'),  # mentors(orderBy: RATING) pages
+            ('updated_at', 'id'),  # exports
+            {
+                # searchMentors; the user_type prefix keeps mentees out of the text index scan
+                'fields': ['user_type', '$first_name', '$last_name', '$expertise', '$occupation', '$bio'],
+                'name': 'mentor_search',
+                'weights': {'first_name': 10, 'last_name': 10, 'expertise': 8, 'occupation': 5, 'bio': 1},
+                'default_language': 'english',
+            },
+        ],
+    }
     first_name = StringField(required=True)
     last_name = StringField(required=True)
     email = EmailField(required=True, unique=True)
@@ -16,21 +31,39 @@ class User(Document):
     USERNAME_FIELD = 'email'
     user_type = StringField(choices=[('mentor', 'Mentor'), ('mentee', 'Mentee'), ('admin', 'Admin')], default='mentee')
     is_staff = BooleanField(default=False)  
+    updated_at = DateTimeField(default=datetime.datetime.utcnow)  # profile changes, not rating summaries
+    token_version = IntField(default=0)  # bumped to revoke every token issued so far
+
+    # Denormalized summary of a mentor's visible reviews, kept up to date by
+    # reviews.ratings and rebuilt by `manage.py rebuild_rating_summaries`
+    review_count = IntField(default=0)
+    rating_total = IntField(default=0)
+    average_rating = FloatField(default=0)
+    rating_histogram = DictField(default=dict)  # {"1".."5": count}
 
     def set_password(self, raw_password):
-        # Hash the password using bcrypt
-        hashed = bcrypt.hashpw(raw_password.encode('utf-8'), bcrypt.gensalt())
-        self.password = hashed.decode('utf-8')
+        # Hash the password using bcrypt (in the hashing pool, off the request thread)
+        self.password = hashing.hash_password(raw_password)
 
     def check_password(self, raw_password):
         # Verify the password
-        return bcrypt.checkpw(
-            raw_password.encode('utf-8'),
-            self.password.encode('utf-8')
-        )
+        return hashing.check_password(raw_password, self.password)
+
+    def rehash_password_if_needed(self, raw_password):
+        # Called after a successful login: upgrade hashes made with another bcrypt cost
+        if hashing.needs_rehash(self.password):
+            self.set_password(raw_password)
+            User.objects(id=self.id).update_one(set__password=self.password)
 
     def get_username(self):
         return self.email
     
 class AdminCreationFlag(Document):
+    meta = {
+        'auto_create_index': False,
+        'indexes': [
+            # At most one set flag, so concurrent CreateAdmin calls can't both claim it
+            {'fields': ['admin_created'], 'unique': True, 'partialFilterExpression': {'admin_created': True}},
+        ],
+    }
     admin_created = BooleanField(default=False)
\ No newline at end of file
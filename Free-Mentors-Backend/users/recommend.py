@@ -0,0 +1,335 @@
+# users/recommend.py
+"""
+Content-based mentor recommendations, computed in process with NumPy.
+
+Every mentor is a sparse vector of hashed tokens from expertise (weighted x3),
+occupation (x2) and bio, with sublinear term frequencies and unit length. The
+vectors are stored as an inverted index: (term, row, weight) entries sorted by
+term, so a query only touches the entries of its own terms. A request's query
+vector comes from the mentee's profile and the topics and questions of their
+recent sessions, and mentors are ranked by
+
+    score(mentor) = sum over shared terms t of  q_t * idf_t * d_t * idf_t
+
+with idf computed from the live document frequencies, so changing one mentor
+never requires reweighting the others. Only the MAX_QUERY_TERMS heaviest query
+terms are scored: the light ones are common terms with the longest entry lists. A dense mentors x features matrix would
+not fit in memory for useful feature counts, hence the sparse layout.
+
+Changed mentors are appended to a small unsorted tail (their old rows are
+tombstoned) and merged into the sorted entries once the tail grows past
+TAIL_LIMIT. See MENTOR_RECOMMENDATIONS in settings.
+"""
+import datetime
+import threading
+import time
+import zlib
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+
+from .models import User
+from .search import _TOKEN, _stem
+
+# Field weights, as term frequency multipliers
+FIELD_WEIGHTS = {'expertise': 3, 'occupation': 2, 'bio': 1}
+
+STOPWORDS = frozenset(
+    'a an and are as at be but by for from has have i in is it its me my of on or our so that the '
+    'their them this to was we were what when which who will with you your'.split()
+)
+
+
+def recommendation_settings():
+    options = getattr(settings, 'MENTOR_RECOMMENDATIONS', {})
+    return {
+        'FEATURES': options.get('FEATURES', 2 ** 18),
+        'BATCH_SIZE': options.get('BATCH_SIZE', 5000),
+        'TAIL_LIMIT': options.get('TAIL_LIMIT', 50000),
+        'MAX_QUERY_TERMS': options.get('MAX_QUERY_TERMS', 32),
+        'REFRESH_INTERVAL': options.get('REFRESH_INTERVAL', 60),
+        'CLOCK_SKEW': options.get('CLOCK_SKEW', 5),
+        'SESSION_HISTORY': options.get('SESSION_HISTORY', 20),
+    }
+
+
+def term_counts(fields, features):
+    """Hashed term -> weighted count for [(text, weight), ...]."""
+    counts = Counter()
+    for text, weight in fields:
+        for token in _TOKEN.findall(text or ''):
+            token = _stem(token)
+            if len(token) > 1 and token not in STOPWORDS:
+                counts[zlib.crc32(token.encode()) & (features - 1)] += weight
+    return counts
+
+
+def mentor_fields(document):
+    return [(document.get(field), weight) for field, weight in FIELD_WEIGHTS.items()]
+
+
+def vectorize(documents, features, first_row=0):
+    """
+    Unit-length sublinear tf vectors of mentor documents as (rows, terms,
+    weights) arrays, one entry per distinct term of each document.
+    """
+    rows, terms, counts = [], [], []
+    for offset, document in enumerate(documents):
+        for term, count in term_counts(mentor_fields(document), features).items():
+            rows.append(first_row + offset)
+            terms.append(term)
+            counts.append(count)
+    rows = np.array(rows, dtype=np.int32)
+    terms = np.array(terms, dtype=np.int32)
+    weights = 1 + np.log(np.array(counts, dtype=np.float32))
+
+    if len(rows):
+        norms = np.sqrt(np.bincount(rows - first_row, weights=weights * weights))
+        weights = (weights / norms[rows - first_row]).astype(np.float32)
+    return rows, terms, weights
+
+
+def _no_entries():
+    return np.zeros(0, np.int32), np.zeros(0, np.int32), np.zeros(0, np.float32)
+
+
+class MentorIndex:
+    """
+    The inverted index of one set of mentors. Readers use whatever state is
+    current when they start; writers build the next state and swap it in
+    whole, so searches never take the lock.
+    """
+
+    def __init__(self, features=2 ** 18, tail_limit=50000, max_query_terms=32):
+        if features & (features - 1):
+            raise ValueError('features must be a power of two')
+        self.features = features
+        self.tail_limit = tail_limit
+        self.max_query_terms = max_query_terms
+        self._lock = threading.Lock()
+        self._rows = {}  # mentor _id -> row, only used by writers
+        self._state = self._indexed([], *_no_entries())
+
+    def _indexed(self, ids, terms, rows, weights):
+        # A state of just sorted entries; `rows` must be ascending
+        order = np.argsort(terms, kind='stable')
+        self._rows = {id: row for row, id in enumerate(ids)}
+        return {
+            'main': (terms[order], rows[order], weights[order]),  # (terms, rows, weights), sorted by term
+            'tail': _no_entries(),  # same, unsorted, for rows added since
+            'live': np.ones(len(ids), dtype=bool),
+            'ids': ids,  # row -> mentor _id, only appended to until the next compaction
+            'count': len(ids),
+            'df': np.bincount(terms, minlength=self.features).astype(np.int32),
+            # Terms of the sorted rows in row order, to take a replaced row out of df
+            'row_terms': terms,
+            'row_starts': np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=len(ids)))]),
+        }
+
+    @classmethod
+    def build(cls, batches, features=2 ** 18, tail_limit=50000, max_query_terms=32):
+        """An index of the mentor documents in `batches`, an iterable of lists."""
+        index = cls(features, tail_limit, max_query_terms)
+        ids, parts = [], [_no_entries()]
+        for batch in batches:
+            rows, terms, weights = vectorize(batch, features, first_row=len(ids))
+            parts.append((terms, rows, weights))
+            ids.extend(document['_id'] for document in batch)
+        index._state = index._indexed(ids, *(np.concatenate(column) for column in zip(*parts)))
+        return index
+
+    def __len__(self):
+        return self._state['count']
+
+    def upsert(self, documents):
+        """Add or replace the vectors of mentor documents."""
+        with self._lock:
+            new_ids = [document['_id'] for document in documents]
+            state = self._without(self._state, new_ids)
+            first_row = len(state['ids'])
+            rows, terms, weights = vectorize(documents, self.features, first_row=first_row)
+
+            # Searches that started earlier only look at rows they know of, so appending is safe
+            state['ids'].extend(new_ids)
+            self._rows.update((id, first_row + offset) for offset, id in enumerate(new_ids))
+            state.update(
+                tail=tuple(np.concatenate(pair) for pair in zip(state['tail'], (terms, rows, weights))),
+                live=np.concatenate([state['live'], np.ones(len(new_ids), dtype=bool)]),
+                count=state['count'] + len(new_ids),
+                df=state['df'] + np.bincount(terms, minlength=self.features).astype(np.int32),
+            )
+            if len(state['tail'][0]) > self.tail_limit:
+                state = self._compacted(state)
+            self._state = state
+
+    def remove(self, ids):
+        """Drop mentors, e.g. ones that are no longer mentors."""
+        with self._lock:
+            self._state = self._without(self._state, ids)
+
+    def _without(self, state, ids):
+        # A copy of `state` with the rows of `ids` tombstoned and out of the document frequencies
+        rows = [self._rows.pop(id) for id in ids if id in self._rows]
+        if not rows:
+            return dict(state)
+        live = state['live'].copy()
+        live[rows] = False
+
+        sorted_rows = len(state['row_starts']) - 1
+        starts, removed = state['row_starts'], [state['tail'][0][np.isin(state['tail'][1], rows)]]
+        removed.extend(state['row_terms'][starts[row]:starts[row + 1]] for row in rows if row < sorted_rows)
+        df = state['df'].copy()
+        np.subtract.at(df, np.concatenate(removed), 1)
+        return dict(state, live=live, count=state['count'] - len(rows), df=df)
+
+    def _compacted(self, state):
+        # Merge the tail into the sorted entries, dropping tombstoned rows and renumbering the rest
+        terms, rows, weights = (np.concatenate(pair) for pair in zip(state['main'], state['tail']))
+        keep = state['live'][rows]
+        terms, rows, weights = terms[keep], rows[keep], weights[keep]
+        rows = (np.cumsum(state['live'], dtype=np.int32) - 1)[rows]
+        by_row = np.argsort(rows, kind='stable')
+
+        ids = [id for id, live in zip(state['ids'], state['live']) if live]
+        return self._indexed(ids, terms[by_row], rows[by_row], weights[by_row])
+
+    def search(self, fields, first, exclude=()):
+        """
+        Mentor ids ranked against the query [(text, weight), ...], best first;
+        at most `first`, and only mentors sharing at least one term with it.
+        """
+        state = self._state
+        query = term_counts(fields, self.features)
+        if not query or not state['count'] or first <= 0:
+            return []
+
+        query_terms = np.fromiter(query.keys(), dtype=np.int32, count=len(query))
+        query_weights = 1 + np.log(np.fromiter(query.values(), dtype=np.float32, count=len(query)))
+        idf = np.log((1 + state['count']) / (1 + state['df'][query_terms])) + 1
+        query_weights = (query_weights * idf * idf).astype(np.float32)
+        if len(query_terms) > self.max_query_terms:
+            # The heaviest terms decide the ranking; the light ones are the common
+            # terms, whose long entry lists would cost most of the time
+            heaviest = np.argpartition(-query_weights, self.max_query_terms - 1)[:self.max_query_terms]
+            query_terms, query_weights = query_terms[heaviest], query_weights[heaviest]
+
+        scores = np.zeros(len(state['live']), dtype=np.float32)
+        terms, rows, weights = state['main']
+        starts = np.searchsorted(terms, query_terms, side='left')
+        ends = np.searchsorted(terms, query_terms, side='right')
+        for start, end, weight in zip(starts.tolist(), ends.tolist(), query_weights.tolist()):
+            # A term occurs at most once per row, so the fancy-indexed add never collides
+            scores[rows[start:end]] += weights[start:end] * weight
+
+        tail_terms, tail_rows, tail_weights = state['tail']
+        if len(tail_terms):
+            matched = np.isin(tail_terms, query_terms)
+            lookup = dict(zip(query_terms.tolist(), query_weights.tolist()))
+            coefficients = np.array([lookup[term] for term in tail_terms[matched].tolist()], dtype=np.float32)
+            np.add.at(scores, tail_rows[matched], tail_weights[matched] * coefficients)
+
+        scores[~state['live']] = 0
+        candidates = np.flatnonzero(scores)
+        wanted = first + len(exclude)
+        if len(candidates) > wanted:
+            candidates = candidates[np.argpartition(-scores[candidates], wanted - 1)[:wanted]]
+        ranked = candidates[np.argsort(-scores[candidates], kind='stable')]
+        ids = (state['ids'][row] for row in ranked.tolist())
+        return [id for id in ids if id not in exclude][:first]
+
+
+def _mentor_batches(query, batch_size):
+    fields = dict({field: True for field in FIELD_WEIGHTS}, _id=True)
+    cursor = User._get_collection().find(query, fields).batch_size(batch_size)
+    batch = []
+    for document in cursor:
+        batch.append(document)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class MentorRecommender:
+    """
+    The process-wide MentorIndex: built from Mongo by the first request that
+    needs it, then caught up with mentors changed by other processes (by
+    `updated_at`) at most every REFRESH_INTERVAL seconds. Changes made by this
+    process are applied at once through `mentors_changed`.
+    """
+
+    def __init__(self, options):
+        self.options = options
+        self.skew = datetime.timedelta(seconds=options['CLOCK_SKEW'])
+        self.index = None
+        self._since = None
+        self._next_refresh = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        if time.monotonic() >= self._next_refresh:
+            self.refresh()
+        return self.index
+
+    def refresh(self):
+        # Only the very first build makes requests wait
+        if not self._lock.acquire(blocking=self.index is None):
+            return
+        try:
+            if time.monotonic() < self._next_refresh:
+                return
+            started = datetime.datetime.utcnow()
+            if self.index is None:
+                self.index = MentorIndex.build(
+                    _mentor_batches({'user_type': 'mentor'}, self.options['BATCH_SIZE']),
+                    self.options['FEATURES'], self.options['TAIL_LIMIT'], self.options['MAX_QUERY_TERMS'],
+                )
+            else:
+                # updated_at is set by application clocks, overlap a little for their skew
+                self._apply({'updated_at': {'$gte': self._since - self.skew}})
+            self._since = started
+            self._next_refresh = time.monotonic() + self.options['REFRESH_INTERVAL']
+        finally:
+            self._lock.release()
+
+    def mentors_changed(self, user_ids):
+        # Users that just changed in this process; a no-op until the index is built
+        if self.index is not None and user_ids:
+            self._apply({'_id': {'$in': list(user_ids)}})
+
+    def _apply(self, query):
+        fields = dict({field: True for field in FIELD_WEIGHTS}, user_type=True)
+        mentors, others = [], []
+        for document in User._get_collection().find(query, fields):
+            (mentors if document.get('user_type') == 'mentor' else others).append(document)
+        if others:
+            self.index.remove([document['_id'] for document in others])
+        if mentors:
+            self.index.upsert(mentors)
+
+
+recommender = MentorRecommender(recommendation_settings())
+
+
+def mentee_query(user_id, profile):
+    """The query fields for a user: their own profile and recent session topics and questions."""
+    from mentorship.models import MentorshipSession
+
+    fields = mentor_fields(profile)
+    sessions = MentorshipSession._get_collection().find(
+        {'mentee': user_id}, {'topic': True, 'questions': True},
+    ).sort('created_at', -1).limit(recommendation_settings()['SESSION_HISTORY'])
+    for session in sessions:
+        fields.append((session.get('topic'), 2))
+        fields.append((session.get('questions'), 1))
+    return fields
+
+
+def recommend_mentors(user_id, first):
+    """Ids of the mentors that best match `user_id`'s profile and sessions."""
+    profile = User._get_collection().find_one({'_id': user_id}, {field: True for field in FIELD_WEIGHTS})
+    if profile is None:
+        return []
+    return recommender.get().search(mentee_query(user_id, profile), first, exclude=(user_id,))
@@ -13,7 +13,20 @@ from django.contrib.auth import authenticate
 from graphql_jwt.shortcuts import get_token, get_payload, get_user_by_payload, get_refresh_token
 from datetime import timedelta , datetime , timezone
 from django.conf import settings
-from users.utils import get_authenticated_user
+from users.utils import get_authenticated_user, get_principal, forget_user, issue_token, revoke_tokens
+from mentor_app.pagination import CountableConnection, page_size, paginate
+from mentor_app import response_cache
+from mentor_app.mongo import read_only
+from mentor_app.bulk import BulkItemResult, bulk_write, parse_ids
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from mongoengine.errors import NotUniqueError, ValidationError
+from bson import ObjectId
+from bson.errors import InvalidId
+from mentor_app.projection import project, projected_fields, selected_fields
+from .search import search_mentors
+from reviews.ratings import ensure_summaries
+from .recommend import recommend_mentors, recommender
 import jwt
 
 
@@ -31,12 +44,9 @@ class ObtainJSONWebTokenWithEmail(graphene.Mutation):
             raise GraphQLError('Invalid credentials')
         
         if user.check_password(password):
-            # Generate a JWT token with the user's ID in the payload
-            payload = {
-                "id": str(user.id),
-                "exp": datetime.now(timezone.utc) + timedelta(days=1)  # Token expires in 1 day
-            }
-            token = jwt.encode(payload, settings.SECRET_KEY, algorithm="HS256")
+            user.rehash_password_if_needed(password)
+            # Generate a JWT token with the user's ID and role claims
+            token = issue_token(user)
             return ObtainJSONWebTokenWithEmail(token=token)
         else:
             raise GraphQLError("Invalid email or Password")
@@ -47,15 +57,12 @@ class MongoEngineBackend(BaseBackend):
     def authenticate(self, request, email=None, password=None, **kwargs):
         try:
             user = User.objects.get(email=email)
-            print("User Found:", user.email)  # Debugging statement
-            if user.check_password(password):
-                print("Password Verified")  # Debugging statement
-                return user
-            else:
-                print("Invalid Password")  # Debugging statement
         except User.DoesNotExist:
-            print("User Not Found")  # Debugging statement
             return None
+        if user.check_password(password):
+            user.rehash_password_if_needed(password)
+            return user
+        return None
 
     def get_user(self, user_id):
         try:
@@ -67,12 +74,44 @@ class UserType(MongoengineObjectType):
     class Meta:
         model = User
         fields = ("id", "first_name", "last_name", "email", "address", "bio", "occupation", "expertise", "user_type")
+        # graphene-mongo doesn't apply `fields`, so secrets have to be excluded explicitly
+        exclude_fields = ("password", "token_version")
+
+    rating_histogram = graphene.List(lambda: RatingBucket, description="Visible reviews per star rating")
+
+    def resolve_rating_histogram(parent, info):
+        histogram = parent.rating_histogram or {}
+        return [RatingBucket(stars=stars, count=histogram.get(str(stars), 0)) for stars in range(1, 6)]
+
+class RatingBucket(graphene.ObjectType):
+    stars = graphene.Int()
+    count = graphene.Int()
+
+class MentorOrder(graphene.Enum):
+    NEWEST = 'newest'
+    RATING = 'rating'
+
+MENTOR_SORTS = {
+    MentorOrder.NEWEST: (('_id', 1),),
+    MentorOrder.RATING: (('average_rating', -1), ('_id', -1)),
+}
+
+class UserConnection(CountableConnection):
+    class Meta:
+        node = UserType
 
 # Queries
 class Query(graphene.ObjectType):
-    users = graphene.List(UserType)
-    mentors = graphene.List(UserType)
+    users = graphene.relay.ConnectionField(UserConnection, user_type=graphene.String())
+    mentors = graphene.relay.ConnectionField(UserConnection, order_by=MentorOrder(default_value=MentorOrder.NEWEST))
+    search_mentors = graphene.relay.ConnectionField(
+        UserConnection,
+        query=graphene.String(required=True),
+        expertise=graphene.String(),
+        occupation=graphene.String(),
+    )
     mentor = graphene.Field(UserType, id=graphene.ID(required=True))
+    recommended_mentors = graphene.List(UserType, first=graphene.Int())
     me = graphene.Field(UserType)
 
     def resolve_me(self, info):
@@ -80,30 +119,56 @@ class Query(graphene.ObjectType):
         user = get_authenticated_user(info.context)
         return user
 
-    def resolve_users(self, info):
+    def resolve_users(self, info, user_type=None, **kwargs):
     # Authenticate the user
-        authenticated_user = get_authenticated_user(info.context)
+        authenticated_user = get_principal(info.context)
     
     # Ensure the authenticated user is staff
         if not authenticated_user.is_staff:
             raise GraphQLError('Not authorized')
     
-    # Return all users
-        return User.objects.all()
+    # Return one page of users, filtered in Mongo
+        users = User.objects.all()
+        if user_type is not None:
+            users = users.filter(user_type=user_type)
+        return paginate(UserConnection, project(users, info, path=('edges', 'node')), **kwargs)
 
 
-    def resolve_mentors(self, info):
+    def resolve_mentors(self, info, order_by=MentorOrder.NEWEST, **kwargs):
     
-    # Return all mentors
-        return User.objects.filter(user_type='mentor')
+    # Return one page of mentors; rating order walks the (user_type, average_rating, _id) index
+        sort = MENTOR_SORTS[order_by]
+        mentors = project(read_only(User).filter(user_type='mentor'), info, path=('edges', 'node'), always=[field for field, _ in sort if field != '_id'])
+        return paginate(UserConnection, mentors, sort=sort, **kwargs)
     
+    def resolve_search_mentors(self, info, query, expertise=None, occupation=None, first=None, after=None, last=None, before=None):
+
+    # Relevance-ranked mentors from the text index; only forward pagination
+        if last is not None or before is not None:
+            raise GraphQLError('searchMentors only pages forwards, use first and after')
+        fields = projected_fields(User, selected_fields(info, ('edges', 'node')))
+        return search_mentors(UserConnection, query, expertise, occupation, first=first, after=after, fields=fields)
+
+    def resolve_recommended_mentors(self, info, first=None):
+
+    # Mentors ranked against the user's profile and past sessions by the in-memory index
+        authenticated_user = get_principal(info.context)
+        limit = page_size(first)
+        ids = recommend_mentors(authenticated_user.id, limit)
+        if not ids:
+            # Nothing to match on yet, so suggest the best rated mentors
+            mentors = read_only(User).filter(user_type='mentor', id__ne=authenticated_user.id).order_by('-average_rating', '-id')
+            return list(project(mentors, info)[:limit])
+        mentors = {mentor.id: mentor for mentor in project(User.objects, info).filter(id__in=ids)}
+        return [mentors[id] for id in ids if id in mentors]
+
     def resolve_mentor(self, info, id):
     # Authenticate the user
-        authenticated_user = get_authenticated_user(info.context)
+        authenticated_user = get_principal(info.context)
     
         try:
         # Fetch the mentor by ID
-            return User.objects.get(id=id, user_type='mentor')
+            return project(User.objects, info).get(id=id, user_type='mentor')
         except User.DoesNotExist:
             raise GraphQLError('Mentor not found')
 
@@ -122,10 +187,6 @@ class CreateUser(graphene.Mutation):
         expertise = graphene.String()
 
     def mutate(self, info, first_name, last_name, email, password, address, bio='', occupation='', expertise=''):
-        existing_user = User.objects(email=email).first()
-        if existing_user:
-            raise Exception('User with this email already exists')
-
         user = User(
             first_name=first_name,
             last_name=last_name,
@@ -136,7 +197,12 @@ class CreateUser(graphene.Mutation):
             expertise=expertise
         )
         user.set_password(password)
-        user.save()
+        try:
+            # The unique index on email rejects duplicates, no lookup first
+            user.save(force_insert=True)
+        except NotUniqueError:
+            raise GraphQLError('User with this email already exists')
+        response_cache.invalidate('users')
         return CreateUser(user=user)
 
 class ChangeToMentor(graphene.Mutation):
@@ -147,28 +213,78 @@ class ChangeToMentor(graphene.Mutation):
 
     def mutate(self, info, user_id):
         # Authenticate the user
-        authenticated_user = get_authenticated_user(info.context)
+        authenticated_user = get_principal(info.context)
         
         # Ensure the authenticated user is staff
         if not authenticated_user.is_staff:
             raise GraphQLError('Not authorized')
 
         try:
-            # Fetch the user to be updated
-            user = User.objects.get(id=user_id)
-            
-            # Ensure the user is currently a mentee
-            if user.user_type != 'mentee':
+            object_id = ObjectId(user_id)
+        except (InvalidId, TypeError):
+            raise GraphQLError('User not found')
+
+        # Only a mentee is promoted, checked and changed in one atomic update
+        collection = User._get_collection()
+        user = collection.find_one_and_update(
+            {'_id': object_id, 'user_type': 'mentee'},
+            {'$set': {'user_type': 'mentor', 'updated_at': datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if user is None:
+            # Only failures pay for a second look, to tell why
+            if collection.count_documents({'_id': object_id}, limit=1):
                 raise GraphQLError('User is not a mentee')
-            
-            # Update the user_type to mentor
-            user.user_type = 'mentor'
-            user.save()
-            
-            return ChangeToMentor(user=user)
-        except User.DoesNotExist:
             raise GraphQLError('User not found')
+
+        ensure_summaries([object_id])
+        forget_user(object_id)
+        recommender.mentors_changed([object_id])
+        response_cache.invalidate('users')
+        return ChangeToMentor(user=User._from_son(user))
         
+class ChangeToMentorBulk(graphene.Mutation):
+    results = graphene.List(BulkItemResult)
+
+    class Arguments:
+        user_ids = graphene.List(graphene.ID, required=True)
+
+    def mutate(self, info, user_ids):
+        # Authenticate the user
+        authenticated_user = get_principal(info.context)
+
+        # Ensure the authenticated user is staff
+        if not authenticated_user.is_staff:
+            raise GraphQLError('Not authorized')
+
+        object_ids, errors = parse_ids(user_ids)
+
+        # Check every user in one query
+        collection = User._get_collection()
+        user_types = {
+            user['_id']: user.get('user_type')
+            for user in collection.find({'_id': {'$in': list(object_ids.values())}}, {'user_type': True})
+        }
+
+        now = datetime.utcnow()
+        operations = {}
+        for user_id, object_id in object_ids.items():
+            if object_id not in user_types:
+                errors[user_id] = 'User not found'
+            elif user_types[object_id] != 'mentee':
+                errors[user_id] = 'User is not a mentee'
+            else:
+                operations[user_id] = UpdateOne({'_id': object_id, 'user_type': 'mentee'}, {'$set': {'user_type': 'mentor', 'updated_at': now}})
+
+        results, modified = bulk_write(collection, user_ids, operations, errors, object_ids, {'updated_at': now}, 'User not found')
+        promoted = [object_ids[result.id] for result in results if result.success]
+        ensure_summaries(promoted)
+        forget_user(*promoted)
+        recommender.mentors_changed(promoted)
+        if modified:
+            response_cache.invalidate('users')
+        return ChangeToMentorBulk(results=results)
+
 class UpdateUser(graphene.Mutation):
     user = graphene.Field(UserType)
 
@@ -185,13 +301,32 @@ class UpdateUser(graphene.Mutation):
         user = get_authenticated_user(info.context)
 
         # Update user fields
-        for key, value in kwargs.items():
-            if value is not None:
-                setattr(user, key, value)
-        
-        user.save()
+        changes = {key: value for key, value in kwargs.items() if value is not None}
+        changes['updated_at'] = datetime.utcnow()
+        for key, value in changes.items():
+            setattr(user, key, value)
+        try:
+            user.validate()
+        except ValidationError as e:
+            raise GraphQLError(str(e))
+
+        # Only the changed fields; save() would upsert a user deleted meanwhile
+        User._get_collection().update_one({'_id': user.id}, {'$set': changes})
+        forget_user(user.id)
+        if user.user_type == 'mentor':
+            recommender.mentors_changed([user.id])
+        response_cache.invalidate('users')
         return UpdateUser(user=user)
 
+class Logout(graphene.Mutation):
+    success = graphene.Boolean()
+
+    def mutate(self, info):
+        # Revokes every token of the user, on all devices
+        user = get_principal(info.context)
+        revoke_tokens(user.id)
+        return Logout(success=True)
+
 class CreateAdmin(graphene.Mutation):
     success = graphene.Boolean()
 
@@ -205,12 +340,7 @@ class CreateAdmin(graphene.Mutation):
         expertise = graphene.String(required=True)
 
     def mutate(self, info, email, password, first_name, last_name, bio, address, expertise):
-        # Check if the admin has already been created
-        flag = AdminCreationFlag.objects.first()
-        if flag and flag.admin_created:
-            raise GraphQLError("Admin user has already been created.")
-
-        # Create the admin user
+        # Everything that can fail on bad input runs before the flag is claimed
         admin = User(
             first_name=first_name,
             last_name=last_name,
@@ -222,21 +352,44 @@ class CreateAdmin(graphene.Mutation):
             is_staff=True,  # Assuming you have an `is_staff` field for admin users
         )
         admin.set_password(password)
-        admin.save()
+        try:
+            admin.validate()
+        except ValidationError as e:
+            raise GraphQLError(str(e))
+
+        # Claim the flag: the upsert matches an existing set flag, and the
+        # partial unique index stops two concurrent first claims both inserting
+        flags = AdminCreationFlag._get_collection()
+        try:
+            claimed = flags.find_one_and_update(
+                {'admin_created': True},
+                {'$setOnInsert': {'admin_created': True}},
+                upsert=True,
+                return_document=ReturnDocument.BEFORE,
+            )
+        except DuplicateKeyError:
+            claimed = True
+        if claimed:
+            raise GraphQLError("Admin user has already been created.")
 
-        # Update the flag to indicate the admin has been created
-        if not flag:
-            flag = AdminCreationFlag()
-        flag.admin_created = True
-        flag.save()
+        try:
+            admin.save(force_insert=True)
+        except BaseException as e:
+            # Give the claim back so a failed attempt never blocks creating the admin
+            flags.delete_one({'admin_created': True})
+            if isinstance(e, NotUniqueError):
+                raise GraphQLError('User with this email already exists')
+            raise
 
         return CreateAdmin(success=True)
 class Mutation(graphene.ObjectType):
     create_user = CreateUser.Field()
     update_user = UpdateUser.Field()    
     change_to_mentor = ChangeToMentor.Field()
+    change_to_mentor_bulk = ChangeToMentorBulk.Field()
     token_auth = ObtainJSONWebTokenWithEmail.Field()  # Use the custom mutatio
     create_admin = CreateAdmin.Field()  
+    logout = Logout.Field()
     verify_token = Verify.Field()  # Add this to verify tokens
     refresh_token = Refresh.Field()  # Add this to refresh tokens
 
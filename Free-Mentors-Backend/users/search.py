@@ -0,0 +1,162 @@
+# users/search.py
+import math
+import re
+
+import graphene
+from django.conf import settings
+from graphql import GraphQLError
+
+from mentor_app.pagination import decode_cursor, encode_cursor_values, keyset_filter, page_size
+from .models import User
+
+# Relevance first; _id breaks ties between equal scores
+SEARCH_SORT = (('_score', -1), ('_id', -1))
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def _text_index():
+    for spec in User._meta['index_specs']:
+        if any(direction == 'text' for _, direction in spec['fields']):
+            return spec
+    raise LookupError('User has no text index')
+
+
+def search_backend(collection):
+    """
+    'text' ranks with the Mongo text index, 'python' ranks in-process. The
+    Python ranking exists for mongomock, which has no $text support; it reads
+    every matching mentor so it is not meant for production data sizes.
+    """
+    backend = getattr(settings, 'MENTOR_SEARCH_BACKEND', 'auto')
+    if backend == 'auto':
+        return 'python' if type(collection).__module__.startswith('mongomock') else 'text'
+    return backend
+
+
+def _filters(expertise, occupation):
+    # Case-insensitive substring match, applied after the text index lookup
+    query = {'user_type': 'mentor'}
+    if expertise:
+        query['expertise'] = {'$regex': re.escape(expertise), '$options': 'i'}
+    if occupation:
+        query['occupation'] = {'$regex': re.escape(occupation), '$options': 'i'}
+    return query
+
+
+def _stem(token):
+    # Crude plural folding so "developers" finds "developer", like Mongo's stemmer would
+    token = token.lower()
+    return token[:-1] if len(token) > 3 and token.endswith('s') and not token.endswith('ss') else token
+
+
+def parse_search(query):
+    """Split a $text-style search string into (terms, phrases, negated terms)."""
+    phrases = [phrase.lower() for phrase in re.findall(r'"([^"]+)"', query)]
+    rest = re.sub(r'"[^"]*"', ' ', query)
+    terms, negated = set(), set()
+    for word in rest.split():
+        target = negated if word.startswith('-') else terms
+        target.update(_stem(token) for token in _TOKEN.findall(word))
+    for phrase in phrases:
+        terms.update(_stem(token) for token in _TOKEN.findall(phrase))
+    return terms, phrases, negated
+
+
+def python_score(document, terms, phrases, negated, weights):
+    """
+    Approximates Mongo's text score: each field contributes its weight for
+    every matching token, scaled down for long fields.
+    """
+    texts = {field: (document.get(field) or '') for field in weights}
+    tokens = {field: [_stem(token) for token in _TOKEN.findall(text)] for field, text in texts.items()}
+
+    every_token = {token for field_tokens in tokens.values() for token in field_tokens}
+    if every_token & negated:
+        return 0
+    if any(all(phrase not in text.lower() for text in texts.values()) for phrase in phrases):
+        return 0
+
+    score = 0.0
+    for field, field_tokens in tokens.items():
+        hits = sum(1 for token in field_tokens if token in terms)
+        if hits:
+            score += weights[field] * hits / math.sqrt(len(field_tokens))
+    return score
+
+
+def _text_search(collection, match, after, limit, fields):
+    pipeline = [
+        {'$match': match},
+        {'$addFields': {'_score': {'$meta': 'textScore'}}},
+    ]
+    if after:
+        pipeline.append({'$match': keyset_filter(list(SEARCH_SORT), decode_cursor(after, SEARCH_SORT), forward=True)})
+    pipeline += [
+        {'$sort': dict(SEARCH_SORT)},
+        {'$limit': limit + 1},
+        {'$project': dict({field: True for field in fields}, _score=True)},
+    ]
+    return list(collection.aggregate(pipeline))
+
+
+def _python_search(collection, query, filters, after, limit, fields):
+    weights = _text_index().get('weights', {})
+    terms, phrases, negated = parse_search(query)
+    projection = dict({field: True for field in fields}, **{field: True for field in weights})
+
+    ranked = []
+    for document in collection.find(filters, projection):
+        score = python_score(document, terms, phrases, negated, weights)
+        if score > 0:
+            document['_score'] = score
+            ranked.append(document)
+    ranked.sort(key=lambda document: (document['_score'], document['_id']), reverse=True)
+
+    matched_ids = [document['_id'] for document in ranked]
+    if after:
+        score, id = decode_cursor(after, SEARCH_SORT)
+        ranked = [document for document in ranked if (document['_score'], document['_id']) < (score, id)]
+    return ranked[:limit + 1], matched_ids
+
+
+def search_mentors(connection_type, query, expertise=None, occupation=None, first=None, after=None, fields=()):
+    """
+    One page of mentors matching `query`, most relevant first, as a
+    `connection_type` whose cursors carry (score, _id).
+    """
+    if not query or not query.strip():
+        raise GraphQLError('Search query must not be empty')
+
+    limit = page_size(first)
+    collection = User._get_collection()
+    filters = _filters(expertise, occupation)
+    fields = [User._fields[name].db_field for name in fields]
+
+    if search_backend(collection) == 'python':
+        documents, matched_ids = _python_search(collection, query, filters, after, limit, fields)
+        queryset = User.objects(id__in=matched_ids)
+    else:
+        match = dict(filters, **{'$text': {'$search': query}})
+        documents = _text_search(collection, match, after, limit, fields)
+        queryset = User.objects(__raw__=match)
+
+    has_more = len(documents) > limit
+    edges = []
+    for document in documents[:limit]:
+        score = document.pop('_score')
+        edges.append(connection_type.Edge(
+            node=User._from_son(document),
+            cursor=encode_cursor_values([score, document['_id']]),
+        ))
+
+    page_info = graphene.relay.PageInfo(
+        start_cursor=edges[0].cursor if edges else None,
+        end_cursor=edges[-1].cursor if edges else None,
+        has_previous_page=bool(after),
+        has_next_page=has_more,
+    )
+    connection = connection_type(edges=edges, page_info=page_info)
+    # totalCount is the size of the whole result, not just what follows the cursor
+    connection.queryset = queryset
+    return connection
@@ -1,3 +1,198 @@
-from django.test import TestCase
+from django.test import override_settings
 
-# Create your tests here.
+from mentor_app.testing import MongomockTestCase
+from .models import AdminCreationFlag, User
+from .utils import forget_user, get_principal, issue_token
+
+
+SEARCH = '''
+query($query: String!, $first: Int, $after: String, $expertise: String) {
+  searchMentors(query: $query, first: $first, after: $after, expertise: $expertise) {
+    edges { cursor node { email } }
+    pageInfo { hasNextPage endCursor }
+  }
+}
+'''
+
+
+@override_settings(MENTOR_SEARCH_BACKEND='python')
+class SearchMentorsTests(MongomockTestCase):
+    """searchMentors through the in-process ranking used when there is no $text support."""
+
+    def mentor(self, email, user_type='mentor', **fields):
+        fields = dict({'bio': '', 'occupation': '', 'expertise': ''}, **fields)
+        return self.user(email, user_type, **fields)
+
+    def search(self, query, **variables):
+        result = self.execute(SEARCH, query=query, **variables)
+        self.assertIsNone(result.errors)
+        return result.data['searchMentors']
+
+    def emails(self, query, **variables):
+        return [edge['node']['email'] for edge in self.search(query, **variables)['edges']]
+
+    def test_ranks_by_field_weight(self):
+        self.mentor('bio@example.com', bio='I sometimes write python scripts for my team at work')
+        self.mentor('occupation@example.com', occupation='Python developer')
+        self.mentor('expertise@example.com', expertise='Python')
+        self.mentor('unrelated@example.com', expertise='Design')
+        self.mentor('mentee@example.com', user_type='mentee', expertise='Python')
+
+        self.assertEqual(
+            self.emails('python'),
+            ['expertise@example.com', 'occupation@example.com', 'bio@example.com'],
+        )
+
+    def test_negated_terms_exclude_mentors(self):
+        self.mentor('django@example.com', expertise='Python Django')
+        self.mentor('flask@example.com', expertise='Python Flask')
+
+        self.assertEqual(self.emails('python -django'), ['flask@example.com'])
+
+    def test_quoted_phrases_must_match_in_order(self):
+        self.mentor('phrase@example.com', expertise='Machine learning')
+        self.mentor('scattered@example.com', expertise='Learning to repair a machine')
+
+        self.assertEqual(self.emails('"machine learning"'), ['phrase@example.com'])
+        self.assertCountEqual(self.emails('machine learning'), ['phrase@example.com', 'scattered@example.com'])
+
+    def test_filters_apply_to_ranked_results(self):
+        self.mentor('cloud@example.com', expertise='Cloud', occupation='Engineer')
+        self.mentor('data@example.com', expertise='Data', occupation='Engineer')
+
+        self.assertEqual(self.emails('engineer', expertise='clo'), ['cloud@example.com'])
+
+    def test_cursor_pages_walk_every_match_once(self):
+        # Equal scores for most of them, so the walk also relies on the _id tie break
+        for i in range(5):
+            self.mentor(f'tie{i}@example.com', expertise='Kubernetes')
+        self.mentor('best@example.com', expertise='Kubernetes', first_name='Kubernetes')
+        self.mentor('other@example.com', expertise='Marketing')
+
+        first_page = self.search('kubernetes', first=4)
+        self.assertTrue(first_page['pageInfo']['hasNextPage'])
+        second_page = self.search('kubernetes', first=4, after=first_page['pageInfo']['endCursor'])
+        self.assertFalse(second_page['pageInfo']['hasNextPage'])
+
+        walked = [edge['node']['email'] for page in (first_page, second_page) for edge in page['edges']]
+        self.assertEqual(walked[0], 'best@example.com')
+        self.assertEqual(len(walked), len(set(walked)))
+        self.assertCountEqual(walked, ['best@example.com'] + [f'tie{i}@example.com' for i in range(5)])
+
+
+ME = '{ me { email } }'
+USERS = '{ users(first: 10) { edges { node { email } } } }'
+
+
+class TokenTests(MongomockTestCase):
+    """Revocation and role changes reaching tokens issued before them."""
+
+    def test_logout_revokes_every_token_of_the_user(self):
+        user = self.user('user@example.com')
+        token, other_device = issue_token(user), issue_token(user)
+
+        self.assertIsNone(self.execute('mutation { logout { success } }', token).errors)
+
+        self.assertError(self.execute(ME, token), 'Token has been revoked')
+        self.assertError(self.execute(ME, other_device), 'Token has been revoked')
+        fresh = issue_token(User.objects.get(id=user.id))
+        self.assertEqual(self.execute(ME, fresh).data, {'me': {'email': 'user@example.com'}})
+
+    def test_revoked_token_is_rejected_without_loading_the_user(self):
+        # users() authorizes from the token's claims and the in-memory user states
+        staff = self.user('staff@example.com', 'admin', is_staff=True)
+        token = issue_token(staff)
+        self.assertIsNone(self.execute(USERS, token).errors)
+
+        self.execute('mutation { logout { success } }', token)
+
+        self.assertError(self.execute(USERS, token), 'Token has been revoked')
+
+    def test_promotion_overrides_the_claims_of_an_older_token(self):
+        staff = self.user('staff@example.com', 'admin', is_staff=True)
+        mentee = self.user('mentee@example.com')
+        token = issue_token(mentee)
+
+        result = self.execute_as(staff, 'mutation($id: ID!) { changeToMentor(userId: $id) { user { userType } } }', id=str(mentee.id))
+        self.assertIsNone(result.errors)
+
+        self.assertEqual(get_principal(self.request(token)).user_type, 'mentor')
+
+    def test_demotion_overrides_the_claims_of_an_older_token(self):
+        staff = self.user('staff@example.com', 'admin', is_staff=True)
+        token = issue_token(staff)
+        self.assertIsNone(self.execute(USERS, token).errors)
+
+        User.objects(id=staff.id).update_one(set__is_staff=False, set__user_type='mentee')
+        forget_user(staff.id)  # what the mutations call after changing a user
+
+        self.assertError(self.execute(USERS, token), 'Not authorized')
+
+
+CREATE_ADMIN = '''
+mutation($email: String!) {
+  createAdmin(email: $email, password: "secret", firstName: "Ada", lastName: "Admin",
+              bio: "-", address: "Kigali", expertise: "-") { success }
+}
+'''
+
+
+class CreateAdminTests(MongomockTestCase):
+    documents = (User, AdminCreationFlag)
+
+    def test_only_one_admin_is_created(self):
+        self.assertEqual(self.execute(CREATE_ADMIN, email='first@example.com').data, {'createAdmin': {'success': True}})
+
+        self.assertError(self.execute(CREATE_ADMIN, email='second@example.com'), 'Admin user has already been created.')
+        self.assertEqual(User.objects(user_type='admin').count(), 1)
+
+    def test_failed_save_gives_the_claim_back(self):
+        self.user('taken@example.com')
+
+        self.assertError(self.execute(CREATE_ADMIN, email='taken@example.com'), 'User with this email already exists')
+        self.assertEqual(AdminCreationFlag.objects.count(), 0)
+
+        self.assertEqual(self.execute(CREATE_ADMIN, email='admin@example.com').data, {'createAdmin': {'success': True}})
+        self.assertTrue(User.objects.get(email='admin@example.com').is_staff)
+
+    def test_invalid_input_never_claims(self):
+        self.assertIsNotNone(self.execute(CREATE_ADMIN, email='not an email').errors)
+
+        self.assertEqual(AdminCreationFlag.objects.count(), 0)
+
+
+USERS_PAGE = '''
+query($first: Int, $last: Int, $after: String) {
+  users(first: $first, last: $last, after: $after) {
+    edges { cursor node { email } }
+    pageInfo { hasPreviousPage hasNextPage endCursor }
+  }
+}
+'''
+
+
+class PaginationTests(MongomockTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(4):
+            self.user(f'user{i}@example.com')
+        self.staff = self.user('staff@example.com', 'admin', is_staff=True)
+
+    def page(self, **variables):
+        result = self.execute_as(self.staff, USERS_PAGE, **variables)
+        self.assertIsNone(result.errors)
+        return result.data['users']
+
+    def test_first_and_last_together_are_rejected(self):
+        self.assertError(self.execute_as(self.staff, USERS_PAGE, first=2, last=2), 'Pass either first or last, not both')
+
+    def test_previous_page_only_when_rows_precede_the_cursor(self):
+        first_page = self.page(first=2)
+        second_page = self.page(first=2, after=first_page['pageInfo']['endCursor'])
+        self.assertEqual(second_page['pageInfo'], dict(second_page['pageInfo'], hasPreviousPage=True, hasNextPage=True))
+
+        # The cursor's own row is gone and nothing sorts before it any more
+        User.objects(email='user0@example.com').delete()
+        again = self.page(first=2, after=first_page['edges'][0]['cursor'])
+        self.assertFalse(again['pageInfo']['hasPreviousPage'])
+        self.assertEqual(len(again['edges']), 2)
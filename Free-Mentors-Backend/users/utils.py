@@ -1,27 +1,229 @@
+import datetime
+import threading
+import time
 import jwt
+from bson import ObjectId
+from bson.errors import InvalidId
 from graphql import GraphQLError
 from django.conf import settings
+from mentor_app.cache import LRUCache
 from .models import User
 
-def get_authenticated_user(context):
-    auth_header = context.headers.get("Authorization")
+# Optional process-wide token -> user cache, see AUTH_USER_CACHE in settings
+_auth_cache_settings = getattr(settings, 'AUTH_USER_CACHE', {})
+_token_cache = LRUCache(
+    maxsize=_auth_cache_settings.get('MAX_SIZE', 1024),
+    ttl=_auth_cache_settings.get('TTL', 60),
+) if _auth_cache_settings.get('ENABLED', False) else None
 
-    if not auth_header or not auth_header.startswith("Bearer "):
-        raise GraphQLError("Authentication required")
 
-    token = auth_header.split("Bearer ")[1]
+def forget_user(*user_ids):
+    # Drop every cached token of users whose documents just changed, and make
+    # this process see their new role/token version right away
+    if _token_cache is not None:
+        user_ids = set(user_ids)
+        _token_cache.delete_where(lambda token, entry: entry[0]['_id'] in user_ids)
+    if user_ids and _claim_settings['MODE'] == 'claims':
+        user_states.reload(user_ids)
+
+
+def token_lifetime():
+    return getattr(settings, 'GRAPHQL_JWT', {}).get('JWT_EXPIRATION_DELTA', datetime.timedelta(days=1))
+
 
+def issue_token(user):
+    # Signed claims let get_principal authorize without loading the user
+    now = datetime.datetime.now(datetime.timezone.utc)
+    payload = {
+        "id": str(user.id),
+        "user_type": user.user_type,
+        "is_staff": bool(user.is_staff),
+        "ver": user.token_version,
+        "iat": now,
+        "exp": now + token_lifetime(),
+    }
+    return jwt.encode(payload, settings.SECRET_KEY, algorithm="HS256")
+
+
+def _decode(token):
     try:
         # Decode the token using the SECRET_KEY from settings
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-        
-        # Fetch the user from the database using the ID in the token payload
-        user = User.objects(id=payload["id"]).first()
-        if not user:
-            raise GraphQLError("Invalid token")
-        
-        return user
+        return jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
     except jwt.ExpiredSignatureError:
         raise GraphQLError("Token has expired")
     except jwt.DecodeError:
-        raise GraphQLError("Invalid token")
\ No newline at end of file
+        raise GraphQLError("Invalid token")
+
+
+def _load_user(token):
+    if _token_cache is not None:
+        entry = _token_cache.get(token)
+        if entry is not None and entry[1] > time.time():
+            # Each request gets its own document so mutations never leak across requests
+            return User._from_son(entry[0])
+
+    payload = _decode(token)
+
+    # Fetch the user from the database using the ID in the token payload
+    user = User.objects(id=payload["id"]).first()
+    if not user:
+        raise GraphQLError("Invalid token")
+    if "ver" in payload and payload["ver"] != user.token_version:
+        raise GraphQLError("Token has been revoked")
+
+    if _token_cache is not None:
+        _token_cache.set(token, (user.to_mongo().to_dict(), payload.get("exp", 0)))
+    return user
+
+
+def get_authenticated_user(context):
+    # Memoized on the request so one HTTP request decodes and fetches at most once
+    if hasattr(context, '_authenticated_user'):
+        if isinstance(context._authenticated_user, GraphQLError):
+            raise GraphQLError(context._authenticated_user.message)
+        return context._authenticated_user
+
+    auth_header = context.headers.get("Authorization")
+
+    try:
+        if not auth_header or not auth_header.startswith("Bearer "):
+            raise GraphQLError("Authentication required")
+
+        user = _load_user(auth_header.split("Bearer ")[1])
+    except GraphQLError as error:
+        context._authenticated_user = error
+        raise
+
+    context._authenticated_user = user
+    return user
+
+
+# Stateless authorization, see AUTH_CLAIMS in settings
+_claim_settings = {
+    'MODE': 'claims',
+    'REFRESH_INTERVAL': 30,
+    'CLOCK_SKEW': 5,
+    **getattr(settings, 'AUTH_CLAIMS', {}),
+}
+
+
+class Principal:
+    """Who a request acts as, from the token's claims: enough for permission checks."""
+
+    def __init__(self, id, user_type, is_staff):
+        self.id = self.pk = id
+        self.user_type = user_type
+        self.is_staff = is_staff
+
+    def __repr__(self):
+        return f'<Principal {self.id} {self.user_type}>'
+
+
+class UserStates:
+    """
+    Role and token version of every user changed within the token lifetime,
+    refreshed from the `user` collection at most every REFRESH_INTERVAL
+    seconds (by whichever request notices first, the others don't wait). A
+    user that changed longer ago than that can only hold tokens issued after
+    the change, whose claims are current.
+    """
+
+    def __init__(self, options):
+        self.interval = options['REFRESH_INTERVAL']
+        self.skew = datetime.timedelta(seconds=options['CLOCK_SKEW'])
+        self._states = {}  # user id -> (token_version, user_type, is_staff, updated_at)
+        self._since = None
+        self._next_refresh = 0
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        if time.monotonic() >= self._next_refresh:
+            self.refresh()
+        return self._states.get(user_id)
+
+    def refresh(self):
+        if not self._lock.acquire(blocking=self._since is None):
+            return
+        try:
+            if time.monotonic() < self._next_refresh:
+                return
+            started = datetime.datetime.utcnow()
+            oldest = started - token_lifetime()
+            since = self._since or oldest
+            # updated_at is set by application clocks, overlap a little for their skew
+            self._load({'updated_at': {'$gte': since - self.skew}})
+            self._states = {
+                user_id: state for user_id, state in self._states.items()
+                if state[3] is None or state[3] >= oldest
+            }
+            self._since = started
+            self._next_refresh = time.monotonic() + self.interval
+        finally:
+            self._lock.release()
+
+    def reload(self, user_ids):
+        self._load({'_id': {'$in': list(user_ids)}})
+
+    def _load(self, query):
+        fields = {'token_version': True, 'user_type': True, 'is_staff': True, 'updated_at': True}
+        states = dict(self._states)
+        for user in User._get_collection().find(query, fields):
+            states[user['_id']] = (
+                user.get('token_version', 0), user.get('user_type', 'mentee'),
+                bool(user.get('is_staff', False)), user.get('updated_at'),
+            )
+        self._states = states  # swapped whole, readers never see it half updated
+
+
+user_states = UserStates(_claim_settings)
+
+
+def get_principal(context):
+    """
+    The requesting user's id, user_type and is_staff. In 'claims' mode this
+    reads the token's signed claims plus the in-memory UserStates, without a
+    Mongo round trip; tokens without claims, and 'database' mode, load the user.
+    """
+    if hasattr(context, '_principal'):
+        return context._principal
+    if hasattr(context, '_authenticated_user'):
+        return get_authenticated_user(context)
+
+    auth_header = context.headers.get("Authorization")
+    if not auth_header or not auth_header.startswith("Bearer "):
+        return get_authenticated_user(context)  # raises and memoizes the error
+
+    payload = _decode(auth_header.split("Bearer ")[1])
+    if _claim_settings['MODE'] != 'claims' or "ver" not in payload:
+        return get_authenticated_user(context)
+
+    try:
+        user_id = ObjectId(payload["id"])
+    except (InvalidId, TypeError):
+        raise GraphQLError("Invalid token")
+    user_type, is_staff = payload["user_type"], payload["is_staff"]
+    state = user_states.get(user_id)
+    if state is not None:
+        if state[0] != payload["ver"]:
+            raise GraphQLError("Token has been revoked")
+        user_type, is_staff = state[1], state[2]  # a role change newer than the token
+
+    context._principal = Principal(user_id, user_type, is_staff)
+    return context._principal
+
+
+def token_expiry(context):
+    # Unix time the context's bearer token expires at, None if it never does
+    auth_header = context.headers.get("Authorization") or ""
+    if not auth_header.startswith("Bearer "):
+        raise GraphQLError("Authentication required")
+    return _decode(auth_header.split("Bearer ")[1]).get("exp")
+
+
+def revoke_tokens(user_id):
+    # Every token issued so far stops working (within REFRESH_INTERVAL in other processes)
+    User._get_collection().update_one(
+        {'_id': user_id},
+        {'$inc': {'token_version': 1}, '$set': {'updated_at': datetime.datetime.utcnow()}},
+    )
+    forget_user(user_id)
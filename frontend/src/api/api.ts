@@ -2,6 +2,7 @@ import { gql, GraphQLClient } from "graphql-request";
 import {
   ApiResponse,
   AuthResponse,
+  Connection,
   LoginInput,
   Mentor,
   Review,
@@ -350,28 +351,32 @@ export const api = {
   getUsers: async (): Promise<ApiResponse<User[]>> => {
     const query = gql`
       query {
-        users {
-          id
-          firstName
-          lastName
-          email
-          bio
-          address
-          expertise
-          occupation
-          isStaff
-          password
-          userType
+        users(first: 100) {
+          edges {
+            node {
+              id
+              firstName
+              lastName
+              email
+              bio
+              address
+              expertise
+              occupation
+              isStaff
+              password
+              userType
+            }
+          }
         }
       }
     `;
 
     try {
       interface UsersResponse {
-        users: User[];
+        users: Connection<User>;
       }
       const { users } = await graphQLClient.request<UsersResponse>(query);
-      return { data: users };
+      return { data: users.edges.map((edge) => edge.node) };
     } catch (error) {
       return {
         error: {
@@ -385,27 +390,31 @@ export const api = {
   getMentors: async (): Promise<ApiResponse<Mentor[]>> => {
     const query = gql`
       query {
-        mentors {
-          id
-          firstName
-          lastName
-          email
-          bio
-          expertise
-          address
-          occupation
-          password
-          userType
+        mentors(first: 100) {
+          edges {
+            node {
+              id
+              firstName
+              lastName
+              email
+              bio
+              expertise
+              address
+              occupation
+              password
+              userType
+            }
+          }
         }
       }
     `;
 
     try {
       interface MentorsResponse {
-        mentors: Mentor[];
+        mentors: Connection<Mentor>;
       }
       const { mentors } = await graphQLClient.request<MentorsResponse>(query);
-      return { data: mentors };
+      return { data: mentors.edges.map((edge) => edge.node) };
     } catch (error) {
       return {
         error: {
@@ -681,23 +690,27 @@ export const api = {
   getAllReviews: async (): Promise<ApiResponse<Review[]>> => {
     const query = gql`
       query {
-        allReviews {
-          content
-          createdAt
-          id
-          isVisible
-          rating
-          session {
-            id
-            mentee {
-              firstName
-              lastName
+        allReviews(first: 100) {
+          edges {
+            node {
+              content
+              createdAt
               id
-            }
-            mentor {
-              id
-              firstName
-              lastName
+              isVisible
+              rating
+              session {
+                id
+                mentee {
+                  firstName
+                  lastName
+                  id
+                }
+                mentor {
+                  id
+                  firstName
+                  lastName
+                }
+              }
             }
           }
         }
@@ -705,12 +718,12 @@ export const api = {
     `;
     try {
       interface AllReviewsResponse {
-        allReviews: Review[];
+        allReviews: Connection<Review>;
       }
       const { allReviews } = await graphQLClient.request<AllReviewsResponse>(
         query
       );
-      return { data: allReviews };
+      return { data: allReviews.edges.map((edge) => edge.node) };
     } catch (error) {
       return {
         error: {
@@ -114,6 +114,19 @@ export interface ApiResponse<T> {
   error?: ApiError;
 }
 
+export interface PageInfo {
+  hasNextPage: boolean;
+  hasPreviousPage: boolean;
+  startCursor: string | null;
+  endCursor: string | null;
+}
+
+export interface Connection<T> {
+  edges: { cursor?: string; node: T }[];
+  pageInfo?: PageInfo;
+  totalCount?: number;
+}
+
 export type UpdateUserInput = Partial<
   Pick<
     User,